@@ -0,0 +1,47 @@
+import argparse
+import json
+import sys
+
+
+def compare_results(baseline, current, threshold):
+    regressions = []
+    for stage, new in current["stages"].items():
+        old = baseline["stages"].get(stage)
+        if old is None:
+            continue
+
+        for key in ["seconds", "peak_rss_bytes"]:
+            if not old.get(key) or not new.get(key):
+                continue
+            change = new[key] / old[key] - 1
+            print(f"{stage:>14} {key:>15}: {old[key]:14.3f} -> "
+                  f"{new[key]:14.3f} ({change:+.1%})", file=sys.stderr)
+            if change > threshold:
+                regressions.append((stage, key, change))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown treated as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    regressions = compare_results(baseline, current, args.threshold)
+    for stage, key, change in regressions:
+        print(f"REGRESSION: {stage} {key} {change:+.1%}", file=sys.stderr)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
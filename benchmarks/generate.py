@@ -0,0 +1,198 @@
+import argparse
+import random
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+LANGUAGES = [
+    ("english", "EN-GB"),
+    ("swedish", "SV-SE"),
+    ("german", "DE-DE"),
+    ("french", "FR-FR"),
+    ("finnish", "FI-FI"),
+    ("norwegian", "NB-NO"),
+    ("danish", "DA-DK"),
+    ("spanish", "ES-ES"),
+]
+
+WORDS = [
+    "valve", "pressure", "ventil", "tryck", "Überdruck", "soupape",
+    "paine", "kåpa", "lock", "hölje", "måttband", "R&D", "<draft>",
+    "filter", "pump", "axel", "Kupplung", "embrayage", "öljy", "bolt",
+]
+
+SOURCES = ["super", "local", "import", "Example User", "Terminologist"]
+
+DESCRIPTION_TYPES = ["Kommentar", "Definition", "Källa", "Note"]
+
+
+@dataclass(frozen=True)
+class CorpusOptions:
+    concepts: int = 1000
+    languages: int = 2
+    synonyms: int = 1
+    transaction_rate: float = 1.0
+    description_rate: float = 0.1
+    encoding: str = "utf-8"
+    seed: int = 0
+    size: int = 0
+    # Consecutive concepts imported, and later edited, together, sharing
+    # their transaction dates.
+    import_batch: int = 1
+
+
+def generate_trados_file(stream, options: CorpusOptions) -> int:
+    if options.encoding == "utf-8":
+        codec = "utf-8"
+        header = '<?xml version="1.0" encoding="utf-8"?>\n<mtf>\n'
+        newline = "\n"
+        stream.write(header.encode(codec))
+    elif options.encoding == "utf-16":
+        # Real exports are UTF-16LE with a BOM and no line breaks.
+        codec = "utf-16-le"
+        header = "\ufeff<?xml version='1.0' encoding='UTF-16' ?><mtf>"
+        newline = ""
+        stream.write(header.encode(codec))
+    else:
+        raise ValueError(f"Unsupported encoding {options.encoding!r}")
+
+    rng = random.Random(options.seed)
+    languages = LANGUAGES[:max(1, min(options.languages, len(LANGUAGES)))]
+    base_date = datetime(2000, 1, 1)
+    written = len(header.encode(codec))
+    count = 0
+    batch: list[str] = []
+
+    def indent(level):
+        return "  " * level if newline else ""
+
+    def transactions(level, source, date, edit_date):
+        created = date.isoformat(timespec="seconds")
+        if edit_date is None:
+            edit_date = date + timedelta(seconds=rng.randrange(10**8))
+        modified = edit_date.isoformat(timespec="seconds")
+        for trans_type, trans_date in [("origination", created),
+                                       ("modification", modified)]:
+            batch.append(
+                f"{indent(level)}<transacGrp>{newline}"
+                f"{indent(level + 1)}<transac type={quoteattr(trans_type)}>"
+                f"{escape(source)}</transac>{newline}"
+                f"{indent(level + 1)}<date>{trans_date}</date>{newline}"
+                f"{indent(level)}</transacGrp>{newline}")
+
+    def term_text():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+
+    while count < options.concepts or written < options.size:
+        concept_id = count + 1
+        # Whole batches of terms typically share one import timestamp.
+        if count % options.import_batch == 0:
+            import_date = base_date + timedelta(days=rng.randrange(8000))
+            edit_date = None
+            if options.import_batch > 1:
+                edit_date = import_date + timedelta(
+                    seconds=rng.randrange(10**8))
+
+        batch.append(f"{indent(1)}<conceptGrp>{newline}"
+                     f'{indent(2)}<concept alternativeId="">'
+                     f"{concept_id}</concept>{newline}")
+        transactions(2, rng.choice(SOURCES[:2]), import_date, edit_date)
+
+        for name, code in languages:
+            batch.append(f"{indent(2)}<languageGrp>{newline}"
+                         f"{indent(3)}<language type={quoteattr(name)} "
+                         f"lang={quoteattr(code)}/>{newline}")
+
+            for _ in range(1 + rng.randint(0, options.synonyms)):
+                batch.append(f"{indent(3)}<termGrp>{newline}"
+                             f"{indent(4)}<term>{escape(term_text())}"
+                             f"</term>{newline}")
+                if rng.random() < options.transaction_rate:
+                    transactions(4, rng.choice(SOURCES), import_date,
+                                 edit_date)
+                if rng.random() < options.description_rate:
+                    desc_type = rng.choice(DESCRIPTION_TYPES)
+                    batch.append(
+                        f"{indent(4)}<descripGrp>{newline}"
+                        f"{indent(5)}<descrip type={quoteattr(desc_type)}>"
+                        f"{escape(term_text())}</descrip>{newline}"
+                        f"{indent(4)}</descripGrp>{newline}")
+                batch.append(f"{indent(3)}</termGrp>{newline}")
+
+            batch.append(f"{indent(2)}</languageGrp>{newline}")
+
+        batch.append(f"{indent(1)}</conceptGrp>{newline}")
+        count += 1
+
+        if len(batch) >= 4096:
+            written += stream.write("".join(batch).encode(codec))
+            batch.clear()
+
+    batch.append(f"</mtf>{newline}")
+    stream.write("".join(batch).encode(codec))
+
+    return count
+
+
+def parse_size(text: str) -> int:
+    units = {"k": 10**3, "m": 10**6, "g": 10**9}
+    suffix = text[-1:].lower()
+    if suffix in units:
+        return int(float(text[:-1]) * units[suffix])
+    return int(text)
+
+
+def add_corpus_arguments(parser):
+    defaults = CorpusOptions()
+    parser.add_argument("--concepts", type=int, default=defaults.concepts,
+                        help="minimum number of concepts")
+    parser.add_argument("--size", type=parse_size, default=defaults.size,
+                        help="minimum file size, e.g. 500M or 2G")
+    parser.add_argument("--languages", type=int, default=defaults.languages,
+                        help="languages per concept")
+    parser.add_argument("--synonyms", type=int, default=defaults.synonyms,
+                        help="maximum synonyms per language")
+    parser.add_argument("--transaction-rate", type=float,
+                        default=defaults.transaction_rate,
+                        help="share of terms with transacGrp elements")
+    parser.add_argument("--description-rate", type=float,
+                        default=defaults.description_rate,
+                        help="share of terms with a descripGrp element")
+    parser.add_argument("--import-batch", type=int,
+                        default=defaults.import_batch,
+                        help="consecutive concepts sharing transaction "
+                        "dates")
+    parser.add_argument("--encoding", choices=["utf-8", "utf-16"],
+                        default=defaults.encoding)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def corpus_options(args) -> CorpusOptions:
+    return CorpusOptions(
+        concepts=args.concepts,
+        languages=args.languages,
+        synonyms=args.synonyms,
+        transaction_rate=args.transaction_rate,
+        description_rate=args.description_rate,
+        encoding=args.encoding,
+        seed=args.seed,
+        size=args.size,
+        import_batch=args.import_batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic MultiTerm XML export.")
+    parser.add_argument("output")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.output, "wb") as f:
+        count = generate_trados_file(f, corpus_options(args))
+
+    print(f"Wrote {count} concepts to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import dataclasses
+import json
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from io import BytesIO
+
+from tbxconverter import converter, trados_reader
+from tbxconverter.trados_reader import InternPool, read_trados_file
+from tbxconverter.converter import DEFAULT_NOTE_CACHE_SIZE, TermNoteCache
+from tbxconverter.converter import trados_to_tbx
+
+from .generate import generate_trados_file, add_corpus_arguments
+from .generate import corpus_options
+
+# The slotted record types, by the modules that construct them.
+RECORD_TYPES = [
+    (trados_reader, ["Transaction", "Term", "Language", "Concept"]),
+    (converter, ["TermNote", "Term", "LangSet", "Descrip", "TermEntry"]),
+]
+
+
+def _without_slots(cls):
+    # The same dataclass with an instance __dict__, as before the record
+    # types were slotted.
+    fields = []
+    for f in dataclasses.fields(cls):
+        kwargs = {}
+        if f.default is not dataclasses.MISSING:
+            kwargs["default"] = f.default
+        if f.default_factory is not dataclasses.MISSING:
+            kwargs["default_factory"] = f.default_factory
+        fields.append((f.name, f.type, dataclasses.field(**kwargs)))
+    return dataclasses.make_dataclass(cls.__name__, fields, frozen=True)
+
+
+@contextmanager
+def record_types(slots: bool):
+    if slots:
+        yield
+        return
+
+    saved = []
+    for module, names in RECORD_TYPES:
+        for name in names:
+            cls = getattr(module, name)
+            saved.append((module, name, cls))
+            setattr(module, name, _without_slots(cls))
+    try:
+        yield
+    finally:
+        for module, name, cls in saved:
+            setattr(module, name, cls)
+
+
+def measure_buffered(data: bytes, backend, intern_size, convert=False,
+                     note_cache_size=DEFAULT_NOTE_CACHE_SIZE, slots=True):
+    pool = InternPool(intern_size)
+    note_cache = TermNoteCache(note_cache_size)
+    with record_types(slots):
+        tracemalloc.start()
+        try:
+            concepts = read_trados_file(BytesIO(data), backend, pool)
+            items = list(trados_to_tbx(concepts, note_cache=note_cache)
+                         if convert else concepts)
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "backend": backend,
+        "slots": slots,
+        "intern_pool_size": intern_size,
+        "converted": convert,
+        "note_cache_size": note_cache_size if convert else None,
+        "concepts": len(items),
+        "bytes": size,
+        "bytes_per_concept": size / len(items) if items else None,
+        "intern_hit_rate": pool.hit_rate,
+        "note_cache_hit_rate": note_cache.hit_rate if convert else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure memory used by buffered concepts.")
+    parser.add_argument("--backend", default="iterparse",
+                        choices=["iterparse", "expat"])
+    parser.add_argument("-o", "--output",
+                        help="JSON results file (default: stdout)")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    buf = BytesIO()
+    generate_trados_file(buf, corpus_options(args))
+    data = buf.getvalue()
+
+    results = []
+    intern_size = InternPool().maxsize
+    runs = [(False, 0, None, True), (False, intern_size, None, True),
+            (False, intern_size, None, False)]
+    runs += [(True, size, note_cache_size, True)
+             for size in [0, intern_size]
+             for note_cache_size in [0, DEFAULT_NOTE_CACHE_SIZE]]
+    runs += [(True, intern_size, 0, False)]
+    for convert, size, note_cache_size, slots in runs:
+        result = measure_buffered(data, args.backend, size, convert,
+                                  note_cache_size, slots)
+        results.append(result)
+        notes = (f" notes={note_cache_size:<5}"
+                 if note_cache_size is not None else " " * 12)
+        print(f"{'entries' if convert else 'concepts':>8} "
+              f"intern={size:<6}{notes} "
+              f"slots={'on ' if slots else 'off'}"
+              f"{result['bytes_per_concept'] or 0:10.0f} bytes/concept",
+              file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+
+from tbxconverter.trados_reader import ConceptFilter, read_trados_file
+from tbxconverter.tbx_writer import write_tbx_file
+from tbxconverter.record_writer import write_records
+from tbxconverter.converter import TermNoteCache, trados_to_tbx
+from tbxconverter.converter import convert_file
+from tbxconverter.pipeline import Pipeline
+
+from .generate import generate_trados_file, add_corpus_arguments
+from .generate import corpus_options
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+
+class NullSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def stage_read(input_path, output_dir, backend="iterparse"):
+    with open(input_path, "rb") as f:
+        return sum(1 for _ in read_trados_file(f, backend)), None
+
+
+def stage_read_expat(input_path, output_dir):
+    return stage_read(input_path, output_dir, backend="expat")
+
+
+def stage_convert(input_path, output_dir, note_cache=None):
+    with open(input_path, "rb") as f:
+        return sum(1 for _ in trados_to_tbx(read_trados_file(f),
+                                            note_cache=note_cache)), None
+
+
+def stage_convert_note_cache(input_path, output_dir):
+    return stage_convert(input_path, output_dir, TermNoteCache())
+
+
+def stage_serialize(input_path, output_dir, engine="template"):
+    sink = NullSink()
+    with open(input_path, "rb") as f:
+        count = write_tbx_file(sink, trados_to_tbx(read_trados_file(f)),
+                               engine=engine)
+    return count, sink.size
+
+
+def stage_serialize_etree(input_path, output_dir):
+    return stage_serialize(input_path, output_dir, engine="etree")
+
+
+def stage_records(input_path, output_dir, output_format):
+    sink = NullSink()
+    with open(input_path, "rb") as f:
+        count = write_records(sink, trados_to_tbx(read_trados_file(f)),
+                              output_format)
+    return count, sink.size
+
+
+def stage_serialize_jsonl(input_path, output_dir):
+    return stage_records(input_path, output_dir, "jsonl")
+
+
+def stage_serialize_jsonl_terms(input_path, output_dir):
+    return stage_records(input_path, output_dir, "jsonl-terms")
+
+
+def stage_serialize_tsv(input_path, output_dir):
+    return stage_records(input_path, output_dir, "tsv")
+
+
+def stage_filtered(input_path, output_dir, concept_filter,
+                   backend="iterparse"):
+    sink = NullSink()
+    with open(input_path, "rb") as f:
+        concepts = read_trados_file(f, backend,
+                                    concept_filter=concept_filter)
+        count = write_tbx_file(sink, trados_to_tbx(concepts))
+    return count, sink.size
+
+
+# Selective runs to compare with the serialize stage. The generated
+# corpus has EN-GB and SV-SE by default, and dates from 2000 to 2025.
+FILTERS = {
+    "languages": ConceptFilter(languages=frozenset(["en"])),
+    "ids": ConceptFilter(id_ranges=((1, 1000),)),
+    "modified": ConceptFilter(modified_since=datetime(2022, 1, 1)),
+}
+
+
+def stage_filter_languages(input_path, output_dir):
+    return stage_filtered(input_path, output_dir, FILTERS["languages"])
+
+
+def stage_filter_ids(input_path, output_dir):
+    return stage_filtered(input_path, output_dir, FILTERS["ids"])
+
+
+def stage_filter_modified(input_path, output_dir):
+    return stage_filtered(input_path, output_dir, FILTERS["modified"])
+
+
+def stage_filter_modified_expat(input_path, output_dir):
+    return stage_filtered(input_path, output_dir, FILTERS["modified"],
+                          backend="expat")
+
+
+def stage_convert_file(input_path, output_dir):
+    output_path = Path(output_dir) / "output.tbx"
+    count = convert_file(input_path, output_path)
+    return count, output_path.stat().st_size
+
+
+def stage_convert_pipelined(input_path, output_dir):
+    output_path = Path(output_dir) / "output.tbx"
+    count = convert_file(input_path, output_path, pipeline=Pipeline())
+    return count, output_path.stat().st_size
+
+
+# Each pipeline stage includes the ones before it, since the pipeline is
+# lazy, so incremental_seconds is reported for the chained ones.
+INCREMENTAL_STAGES = {"convert", "serialize"}
+
+STAGES = {
+    "read": stage_read,
+    "convert": stage_convert,
+    "serialize": stage_serialize,
+    "convert_file": stage_convert_file,
+    "convert_pipelined": stage_convert_pipelined,
+    "convert_note_cache": stage_convert_note_cache,
+    "serialize_etree": stage_serialize_etree,
+    "read_expat": stage_read_expat,
+    "serialize_jsonl": stage_serialize_jsonl,
+    "serialize_jsonl_terms": stage_serialize_jsonl_terms,
+    "serialize_tsv": stage_serialize_tsv,
+    "filter_languages": stage_filter_languages,
+    "filter_ids": stage_filter_ids,
+    "filter_modified": stage_filter_modified,
+    "filter_modified_expat": stage_filter_modified_expat,
+}
+
+
+def measure(stage_name, input_path, output_dir):
+    start = time.perf_counter()
+    count, output_size = STAGES[stage_name](input_path, output_dir)
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "concepts": count,
+        "output_bytes": output_size,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def run_stage(stage_name, input_path, output_dir, repeat):
+    # A fresh process per run gives every stage its own peak RSS.
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            runs.append(pool.apply(measure,
+                                   (stage_name, input_path, output_dir)))
+
+    best = min(runs, key=lambda r: r["seconds"])
+    input_size = os.path.getsize(input_path)
+    seconds = best["seconds"]
+    return {
+        **best,
+        "runs": [r["seconds"] for r in runs],
+        "concepts_per_s": best["concepts"] / seconds if seconds else None,
+        "mb_per_s": input_size / 1e6 / seconds if seconds else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(input_path, stages, repeat=1, corpus=None):
+    results = {}
+    previous = None
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name in stages:
+            result = run_stage(name, str(input_path), output_dir, repeat)
+            if previous in results and name in INCREMENTAL_STAGES:
+                result["incremental_seconds"] = (
+                    result["seconds"] - results[previous]["seconds"])
+            results[name] = result
+            previous = name
+            print(f"{name:>21}: {result['seconds']:8.3f} s "
+                  f"{result['concepts_per_s'] or 0:12.0f} concepts/s "
+                  f"{result['mb_per_s'] or 0:8.2f} MB/s "
+                  f"{(result['peak_rss_bytes'] or 0) / 2**20:8.1f} MiB",
+                  file=sys.stderr)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "input": {
+            "path": str(input_path),
+            "bytes": os.path.getsize(input_path),
+            "corpus": corpus,
+        },
+        "stages": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the conversion stages and write JSON results.")
+    parser.add_argument("--input", type=Path,
+                        help="existing MultiTerm export instead of a "
+                        "generated corpus")
+    parser.add_argument("--keep", type=Path,
+                        help="write the generated corpus to this path")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="comma-separated stages to run")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per stage, the fastest is reported")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="JSON results file (default: stdout)")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = None
+        input_path = args.input
+        if input_path is None:
+            options = corpus_options(args)
+            input_path = args.keep or Path(tmp) / "corpus.xml"
+            with open(input_path, "wb") as f:
+                generate_trados_file(f, options)
+            corpus = asdict(options)
+
+        results = run_benchmarks(input_path, stages, args.repeat, corpus)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
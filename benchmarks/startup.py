@@ -0,0 +1,133 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Cumulative import time, in seconds, allowed for each entry point. They
+# are several times the measured times, to leave room for slower
+# machines, so that only real regressions trip them.
+BUDGETS = {
+    "tbxconverter.gui_model": 0.075,
+    "tbxconverter.converter": 0.150,
+}
+
+# Modules that each entry point must leave to be imported when they are
+# needed: the GUI model loads the conversion machinery in the
+# background once the window is shown, and the command line loads
+# compression codecs, the expat backend, the etree writer engine, the
+# record writers, the pipeline, checkpoints and the profiler only when
+# they are asked for.
+DEFERRED = {
+    "tbxconverter.gui_model": [
+        "tbxconverter.converter",
+        "tbxconverter.trados_reader",
+        "tbxconverter.tbx_writer",
+        "xml.etree.ElementTree",
+        "pyexpat",
+        "datetime",
+    ],
+    "tbxconverter.converter": [
+        "xml.etree.ElementTree",
+        "pyexpat",
+        "gzip",
+        "bz2",
+        "lzma",
+        "zipfile",
+        "json",
+        "tbxconverter.profiling",
+        "tbxconverter.record_writer",
+        "tbxconverter.pipeline",
+        "tbxconverter.checkpoint",
+    ],
+}
+
+
+def measure_imports(module: str) -> dict[str, float]:
+    # Runs a fresh interpreter with -X importtime and returns the
+    # cumulative import time of every module it loaded, in seconds.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1e6
+    return times
+
+
+def measure_startup(module: str, repeat=5) -> dict:
+    runs = [measure_imports(module) for _ in range(repeat)]
+    best = min(runs, key=lambda times: times[module])
+    return {
+        "seconds": best[module],
+        "runs": [times[module] for times in runs],
+        "modules": len(best),
+        "budget_seconds": BUDGETS.get(module),
+        "deferred_loaded": sorted(set(DEFERRED.get(module, [])) & set(best)),
+        "slowest": dict(sorted(
+            ((name, seconds) for name, seconds in best.items()
+             if name != module),
+            key=lambda item: -item[1])[:10]),
+    }
+
+
+def check_startup(module: str, result: dict) -> list[str]:
+    problems = [f"{module} imports {name} eagerly"
+                for name in result["deferred_loaded"]]
+    budget = result["budget_seconds"]
+    if budget is not None and result["seconds"] > budget:
+        problems.append(f"{module} takes {result['seconds'] * 1000:.1f} ms "
+                        f"to import, over the {budget * 1000:.0f} ms budget")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the import time of the entry points with "
+        "python -X importtime and write JSON results.")
+    parser.add_argument("--modules", default=",".join(BUDGETS),
+                        help="comma-separated modules to import")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per module, the fastest is reported")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="JSON results file (default: stdout)")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error if a budget is exceeded "
+                        "or a deferred module is imported")
+    args = parser.parse_args()
+
+    results = {}
+    problems = []
+    for module in args.modules.split(","):
+        result = results[module] = measure_startup(module, args.repeat)
+        problems += check_startup(module, result)
+        print(f"{module:>24}: {result['seconds'] * 1000:8.1f} ms "
+              f"{result['modules']:5} modules", file=sys.stderr)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "modules": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
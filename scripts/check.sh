@@ -5,16 +5,16 @@ set -eu
 BASEDIR="$(dirname "$0")/.."
 
 check() {
-    flake8 "$BASEDIR"/{tbxconverter,tests}
+    flake8 "$BASEDIR"/{tbxconverter,tests,benchmarks}
     python3 -X dev -m unittest discover -s "$BASEDIR"
-    mypy "$BASEDIR"/{tbxconverter,tests}
+    mypy "$BASEDIR"/{tbxconverter,tests,benchmarks}
 }
 
 if [ "${1:-}" = "-c" ]; then
     while true; do
         check || true
         echo
-        inotifywait -e MODIFY "$BASEDIR"/{tbxconverter,tests}/*.py
+        inotifywait -e MODIFY "$BASEDIR"/{tbxconverter,tests,benchmarks}/*.py
         sleep 0.1
     done
 else
@@ -0,0 +1,61 @@
+import asyncio
+from io import BytesIO
+from typing import AsyncIterable, AsyncIterator, Union
+
+from .converter import convert_concept
+from .tbx_writer import render_term_entry, write_tbx_header
+from .tbx_writer import write_tbx_footer
+from .trados_reader import ExpatConceptParser, READ_SIZE
+
+
+async def convert_stream(
+        source: Union[AsyncIterable[bytes], asyncio.StreamReader],
+        executor=None,
+        id_prefix=None,
+        indent="  ",
+        chunk_size=READ_SIZE,
+) -> AsyncIterator[bytes]:
+    # Parsing, conversion and rendering of each input chunk run as one
+    # batch in the executor. Input is only read when the previous
+    # output chunk has been consumed, so memory use per conversion is
+    # bounded by the chunk size, however large the input.
+    loop = asyncio.get_running_loop()
+    parser = ExpatConceptParser()
+
+    def render(concepts):
+        return b"".join(render_term_entry(convert_concept(c, id_prefix),
+                                          indent)
+                        for c in concepts)
+
+    def feed(data):
+        return render(parser.feed(data))
+
+    def close():
+        buf = BytesIO()
+        buf.write(render(parser.close()))
+        write_tbx_footer(buf, indent)
+        return buf.getvalue()
+
+    header = BytesIO()
+    write_tbx_header(header, indent)
+    yield header.getvalue()
+
+    async for data in _read_chunks(source, chunk_size):
+        output = await loop.run_in_executor(executor, feed, data)
+        if output:
+            yield output
+
+    yield await loop.run_in_executor(executor, close)
+
+
+async def _read_chunks(source, chunk_size) -> AsyncIterator[bytes]:
+    if isinstance(source, asyncio.StreamReader):
+        while data := await source.read(chunk_size):
+            yield data
+        return
+
+    async for data in source:
+        # Large chunks are split, so that no single batch holds up the
+        # executor or buffers too much output.
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
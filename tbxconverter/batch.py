@@ -0,0 +1,291 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .compression import strip_compression_suffix
+from .converter import OUTPUT_FORMATS, convert_file
+from .converter import _parse_id_ranges, _parse_list
+from .trados_reader import ConceptFilter
+
+MANIFEST_NAME = ".tbxconverter-manifest.json"
+MANIFEST_VERSION = 1
+
+INPUT_PATTERNS = ["*.xml", "*.xml.gz", "*.xml.bz2", "*.xml.xz", "*.zip"]
+
+FORMAT_EXTENSIONS = {
+    "tbx": ".tbx",
+    "jsonl": ".jsonl",
+    "jsonl-terms": ".jsonl",
+    "tsv": ".tsv",
+}
+
+COMPRESSION_EXTENSIONS = {
+    None: "",
+    "none": "",
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "xz": ".xz",
+}
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    input_path: Path
+    output_path: Path
+    status: str
+    count: int = 0
+    error: Optional[str] = None
+
+
+def find_inputs(patterns: Iterable[str]) -> list[Path]:
+    inputs = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            inputs.extend(sorted(
+                p for pattern in INPUT_PATTERNS for p in path.glob(pattern)))
+        elif any(c in pattern for c in "*?["):
+            inputs.extend(Path(p) for p in sorted(glob.glob(pattern)))
+        else:
+            inputs.append(path)
+
+    unique: dict[Path, Path] = {}
+    for path in inputs:
+        unique.setdefault(path.resolve(), path)
+    return list(unique.values())
+
+
+def convert_batch(inputs: Iterable[Path], output_dir: Path, jobs=1,
+                  force=False, options=None,
+                  compression=None) -> list[BatchResult]:
+    # options are passed on to convert_file. The outputs are named after
+    # the inputs, with the extension of the output format and of the
+    # compression.
+    options = dict(options or {})
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unsupported output compression {compression!r}")
+    extension = (FORMAT_EXTENSIONS[options.get("output_format", "tbx")]
+                 + COMPRESSION_EXTENSIONS[compression])
+    recorded = _recorded_options(options)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(output_dir / MANIFEST_NAME)
+
+    outputs: dict[Path, Path] = {}
+    for input_path in inputs:
+        name = strip_compression_suffix(input_path).stem
+        output_path = output_dir / (name + extension)
+        if output_path in outputs.values():
+            raise ValueError(f"More than one input would be written to "
+                             f"{output_path}")
+        outputs[input_path] = output_path
+
+    results = []
+    pending = []
+    for input_path, output_path in outputs.items():
+        if not force and manifest.is_current(input_path, output_path,
+                                             recorded):
+            results.append(BatchResult(input_path, output_path, "skipped"))
+        else:
+            pending.append((input_path, output_path))
+    if manifest.changed:
+        # Keeps the mtimes of touched inputs, so they are not hashed
+        # again on the next run.
+        manifest.save()
+
+    def finish(input_path, output_path, future_result):
+        try:
+            count, fingerprint = future_result()
+        except Exception as ex:
+            results.append(BatchResult(input_path, output_path, "failed",
+                                       error=repr(ex)))
+            manifest.remove(input_path)
+        else:
+            results.append(BatchResult(input_path, output_path,
+                                       "converted", count))
+            manifest.update(input_path, output_path, recorded, count,
+                            fingerprint)
+        manifest.save()
+
+    if jobs <= 1 or len(pending) <= 1:
+        for input_path, output_path in pending:
+            finish(input_path, output_path,
+                   partial(_convert_one, input_path, output_path, options))
+    else:
+        with ProcessPoolExecutor(min(jobs, len(pending))) as executor:
+            futures = {
+                executor.submit(_convert_one, input_path, output_path,
+                                options): (input_path, output_path)
+                for input_path, output_path in pending}
+            for future in as_completed(futures):
+                finish(*futures[future], future.result)
+
+    order = {path: i for i, path in enumerate(outputs)}
+    results.sort(key=lambda r: order[r.input_path])
+    return results
+
+
+def _recorded_options(options) -> dict:
+    # The options as they are stored in the manifest, using only JSON
+    # types so that they compare equal after a round trip.
+    options = dict(options)
+    if options.get("concept_filter") is not None:
+        options["concept_filter"] = options["concept_filter"].key()
+    return json.loads(json.dumps(options))
+
+
+def _convert_one(input_path, output_path, options):
+    # Fingerprint first, so changes made during the conversion are
+    # picked up by the next run.
+    stat = input_path.stat()
+    fingerprint = stat.st_size, stat.st_mtime_ns, file_digest(input_path)
+
+    # The temporary file keeps the extensions, which decide the
+    # compression.
+    tmp_path = output_path.with_name(".tmp-" + output_path.name)
+    try:
+        count = convert_file(input_path, tmp_path, **options)
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return count, fingerprint
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while data := f.read(1024 * 1024):
+            h.update(data)
+    return h.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path: Path):
+        self._path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        if data.get("version") != MANIFEST_VERSION:
+            data = {}
+        self._entries = data.get("entries", {})
+        self.changed = False
+
+    def is_current(self, input_path: Path, output_path: Path,
+                   options) -> bool:
+        entry = self._entries.get(str(input_path.resolve()))
+        if entry is None or entry["options"] != options:
+            return False
+        if entry["output"] != str(output_path) or not output_path.exists():
+            return False
+
+        stat = input_path.stat()
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+
+        # Touched but possibly unchanged, e.g. copied again.
+        if file_digest(input_path) != entry["sha256"]:
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns
+        self.changed = True
+        return True
+
+    def update(self, input_path: Path, output_path: Path, options,
+               count: int, fingerprint: tuple[int, int, str]):
+        size, mtime_ns, digest = fingerprint
+        self._entries[str(input_path.resolve())] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": digest,
+            "options": options,
+            "output": str(output_path),
+            "count": count,
+        }
+        self.changed = True
+
+    def remove(self, input_path: Path):
+        self._entries.pop(str(input_path.resolve()), None)
+        self.changed = True
+
+    def save(self):
+        tmp_path = self._path.with_name(self._path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION,
+                       "entries": self._entries}, f, indent=2)
+        os.replace(tmp_path, self._path)
+        self.changed = False
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert MultiTerm XML exports to TBX files, skipping "
+        "inputs that have not changed since the last run.")
+    parser.add_argument("inputs", nargs="+",
+                        help="input files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", type=Path, required=True)
+    parser.add_argument("-j", "--jobs", type=int, default=0,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="convert all inputs even if unchanged")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="tbx",
+                        help="output TBX, JSON Lines with one object per "
+                        "concept or per term, or TSV with one row per "
+                        "term (default: tbx)")
+    parser.add_argument("--compress", choices=["gzip", "bz2", "xz", "none"],
+                        help="compress the outputs (default: none)")
+    parser.add_argument("--languages", type=_parse_list,
+                        help="only these language codes, comma separated; "
+                        "a code like EN matches EN-GB and EN-US")
+    parser.add_argument("--ids", type=_parse_id_ranges,
+                        help="only these concept ids or ranges, comma "
+                        "separated, e.g. 1-100,250")
+    parser.add_argument("--modified-since", type=datetime.fromisoformat,
+                        help="only concepts created or modified on or "
+                        "after this date, e.g. 2024-01-31 (UTC unless a "
+                        "time zone is given)")
+    args = parser.parse_args()
+
+    # Only options that differ from the defaults are passed, so that
+    # the manifest of an earlier run without them still matches.
+    options = {}
+    if args.format != "tbx":
+        options["output_format"] = args.format
+    if args.languages or args.ids or args.modified_since:
+        options["concept_filter"] = ConceptFilter(
+            languages=frozenset(args.languages) if args.languages else None,
+            id_ranges=args.ids,
+            modified_since=args.modified_since)
+
+    inputs = find_inputs(args.inputs)
+    try:
+        results = convert_batch(inputs, args.output_dir,
+                                jobs=args.jobs or os.cpu_count() or 1,
+                                force=args.force, options=options,
+                                compression=args.compress)
+    except ValueError as ex:
+        sys.exit(f"error: {ex}")
+
+    for result in results:
+        detail = (result.error if result.error
+                  else f"{result.count} entries" if result.count else "")
+        print(f"{result.status:>9}: {result.input_path} {detail}",
+              file=sys.stderr)
+
+    if any(result.status == "failed" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
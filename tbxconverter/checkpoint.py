@@ -0,0 +1,170 @@
+import json
+import mmap
+import os
+from dataclasses import asdict, dataclass
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from .compression import compression_from_extension, detect_compression
+from .converter import convert_concept
+from .splitting import iter_concept_ranges, read_fragment, scan_layout
+from .tbx_writer import render_term_entry
+from .tbx_writer import write_tbx_header, write_tbx_footer
+
+CHECKPOINT_VERSION = 1
+DEFAULT_INTERVAL = 10000
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    # The input and options it was taken with, where the next conceptGrp
+    # is searched for in the input, and how far the output had come.
+    input_size: int
+    input_mtime_ns: int
+    options: list
+    offset: int
+    concept_id: Optional[int]
+    output_length: int
+    entries: int
+
+
+def checkpoint_path(output_path: Path) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + ".checkpoint")
+
+
+def load_checkpoint(path: Path) -> Optional[Checkpoint]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is not a checkpoint of this version")
+    return Checkpoint(**data["checkpoint"])
+
+
+def save_checkpoint(path: Path, checkpoint: Checkpoint):
+    # Replaced in one step, so that a crash leaves either the old or the
+    # new checkpoint.
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CHECKPOINT_VERSION,
+                   "checkpoint": asdict(checkpoint)}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def convert_file_resumable(input_path: Path, output_path: Path,
+                           interval=DEFAULT_INTERVAL, resume=False,
+                           concept_filter=None, output_format="tbx",
+                           note_cache=None) -> int:
+    # Converts interval concepts at a time, syncing the output and
+    # saving a checkpoint after each batch. With resume, the output is
+    # cut back to the last checkpoint and the conversion goes on from
+    # there, giving the same file as an uninterrupted run. Both files
+    # need to be uncompressed, since the checkpoint holds byte offsets.
+    if detect_compression(input_path) is not None:
+        raise ValueError("Checkpoints require an uncompressed input")
+    if compression_from_extension(Path(output_path)) is not None:
+        raise ValueError("Checkpoints require an uncompressed output")
+    if interval < 1:
+        raise ValueError("The checkpoint interval must be positive")
+
+    path = checkpoint_path(output_path)
+    options = json.loads(json.dumps([
+        output_format, concept_filter.key() if concept_filter else None]))
+    checkpoint = load_checkpoint(path) if resume else None
+    if checkpoint is not None and not os.path.exists(output_path):
+        # Nothing was kept of the earlier run, so start it over.
+        checkpoint = None
+
+    with open(input_path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if checkpoint is not None:
+            if (checkpoint.input_size, checkpoint.input_mtime_ns) != (
+                    stat.st_size, stat.st_mtime_ns):
+                raise ValueError(f"{input_path} has changed since the "
+                                 f"checkpoint was saved")
+            if checkpoint.options != options:
+                raise ValueError("The checkpoint was saved with other "
+                                 "options")
+
+        layout = None
+        if stat.st_size:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            layout = scan_layout(data)
+            if layout is None:
+                data.close()
+        if layout is None:
+            # Nothing to resume in an export without concepts.
+            from .converter import convert_file
+            count = convert_file(input_path, output_path,
+                                 concept_filter=concept_filter,
+                                 output_format=output_format,
+                                 note_cache=note_cache)
+            path.unlink(missing_ok=True)
+            return count
+
+        with data:
+            prolog = data[:layout.body_start]
+            epilog = data[layout.body_end:]
+            # Surface a bad root element before writing anything.
+            for _ in read_fragment(prolog, b"", epilog):
+                pass
+
+            if output_format == "tbx":
+                render = render_term_entry
+            else:
+                from .record_writer import get_record_renderer
+                render = get_record_renderer(output_format)
+
+            if checkpoint is None:
+                # A checkpoint of an earlier run does not match the
+                # output about to be written.
+                path.unlink(missing_ok=True)
+                fo: BinaryIO = open(output_path, "wb")
+                if output_format == "tbx":
+                    write_tbx_header(fo)
+                else:
+                    from .record_writer import write_record_header
+                    write_record_header(fo, output_format)
+                offset, count = layout.body_start, 0
+                concept_id = None
+            else:
+                fo = open(output_path, "r+b")
+                if os.fstat(fo.fileno()).st_size < checkpoint.output_length:
+                    fo.close()
+                    raise ValueError(f"{output_path} is shorter than when "
+                                     f"the checkpoint was saved")
+                fo.truncate(checkpoint.output_length)
+                fo.seek(checkpoint.output_length)
+                offset, count = checkpoint.offset, checkpoint.entries
+                concept_id = checkpoint.concept_id
+
+            with fo:
+                ranges = iter_concept_ranges(data, layout, offset)
+                while batch := list(islice(ranges, interval)):
+                    body = data[batch[0][0]:batch[-1][1]]
+                    entries = []
+                    for concept in read_fragment(prolog, body, epilog,
+                                                 concept_filter):
+                        entries.append(render(convert_concept(
+                            concept, note_cache=note_cache)))
+                        concept_id = concept.id
+                    fo.write(b"".join(entries))
+                    count += len(entries)
+
+                    fo.flush()
+                    os.fsync(fo.fileno())
+                    save_checkpoint(path, Checkpoint(
+                        stat.st_size, stat.st_mtime_ns, options,
+                        batch[-1][1], concept_id, fo.tell(), count))
+
+                if output_format == "tbx":
+                    write_tbx_footer(fo)
+
+    path.unlink(missing_ok=True)
+    return count
@@ -0,0 +1,166 @@
+import io
+from contextlib import contextmanager, ExitStack
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+MAGIC_NUMBERS = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"PK\x03\x04", "zip"),
+]
+
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zip": "zip",
+}
+
+# Zip archives can be read but not written.
+WRITABLE = {None, "none", "gzip", "bz2", "xz"}
+
+
+def detect_compression(path: Path) -> Optional[str]:
+    with open(path, "rb") as f:
+        return _detect(f.read(8))
+
+
+def _detect(head: bytes) -> Optional[str]:
+    for magic, compression in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def compression_from_extension(path: Path) -> Optional[str]:
+    return EXTENSIONS.get(Path(path).suffix.lower())
+
+
+def strip_compression_suffix(path: Path) -> Path:
+    path = Path(path)
+    return path.with_suffix("") if compression_from_extension(path) else path
+
+
+@contextmanager
+def open_input(source, member=None) -> Iterator[BinaryIO]:
+    # Accepts a path or a seekable binary file, which is left open.
+    with ExitStack() as stack:
+        if isinstance(source, (str, Path)):
+            source = stack.enter_context(open(source, "rb"))
+        compression = _detect(source.read(8))
+        source.seek(0)
+
+        if compression is None:
+            yield source
+        elif compression == "zip":
+            import zipfile
+            archive = stack.enter_context(zipfile.ZipFile(source))
+            name = member or _find_zip_member(archive)
+            yield stack.enter_context(archive.open(name))  # type: ignore
+        else:
+            yield stack.enter_context(_decompressor(source, compression))
+
+
+def decompress_stream(stream) -> BinaryIO:
+    # For streams that cannot seek, such as request bodies. Zip archives
+    # keep their directory at the end and cannot be read this way.
+    head = b""
+    while len(head) < 8:
+        data = stream.read(8 - len(head))
+        if not data:
+            break
+        head += data
+
+    stream = io.BufferedReader(_Prefixed(head, stream))  # type: ignore
+    compression = _detect(head)
+    if compression is None:
+        return stream
+    elif compression == "zip":
+        raise ValueError("Zip archives cannot be streamed")
+    else:
+        return _decompressor(stream, compression)
+
+
+# The codec modules are imported on first use, since together they take
+# longer to import than the rest of the package.
+def _decompressor(stream, compression: str) -> BinaryIO:
+    if compression == "gzip":
+        import gzip
+        return gzip.GzipFile(fileobj=stream)  # type: ignore
+    elif compression == "bz2":
+        import bz2
+        return bz2.BZ2File(stream)  # type: ignore
+    else:
+        import lzma
+        return lzma.LZMAFile(stream)  # type: ignore
+
+
+class _Prefixed(io.RawIOBase):
+    def __init__(self, prefix: bytes, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._prefix:
+            n = min(len(b), len(self._prefix))
+            b[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._stream.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _find_zip_member(archive) -> str:
+    names = [info.filename for info in archive.infolist()
+             if not info.is_dir()]
+    if len(names) != 1:
+        names = [name for name in names if name.lower().endswith(".xml")]
+    if len(names) != 1:
+        raise ValueError(f"Expected exactly one XML file in "
+                         f"{archive.filename}, found {names!r}")
+    return names[0]
+
+
+@contextmanager
+def open_output(path: Path, compression=None) -> Iterator[BinaryIO]:
+    if compression is None:
+        compression = compression_from_extension(path)
+    # Checked before opening, which would truncate an existing file.
+    _check_writable(compression)
+
+    with ExitStack() as stack:
+        f = stack.enter_context(open(path, "wb"))
+        if compression in (None, "none"):
+            yield f
+        else:
+            yield stack.enter_context(compress_stream(f, compression))
+
+
+def _check_writable(compression):
+    if compression not in WRITABLE:
+        raise ValueError(f"Unsupported output compression {compression!r}")
+
+
+def compress_stream(stream, compression: str) -> BinaryIO:
+    # The wrappers leave the underlying stream open when closed. Gzip
+    # headers get no name or timestamp, so identical input gives
+    # identical output.
+    _check_writable(compression)
+    if compression == "gzip":
+        import gzip
+        return gzip.GzipFile(filename="", mode="wb", fileobj=stream,
+                             compresslevel=6, mtime=0)  # type: ignore
+    elif compression == "bz2":
+        import bz2
+        return bz2.BZ2File(stream, "wb")  # type: ignore
+    elif compression == "xz":
+        import lzma
+        return lzma.LZMAFile(stream, "wb")  # type: ignore
+    else:
+        raise ValueError(f"Unsupported output compression {compression!r}")
@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from .converter import trados_to_tbx
+from .splitting import scan_layout, iter_concept_ranges, read_fragment
+from .tbx_writer import write_tbx_file
+from .trados_reader import Concept, parse_id_range
+
+MAGIC = b"TBXCIDX\0"
+INDEX_VERSION = 1
+CODECS = ["utf-8", "utf-16-le", "utf-16-be"]
+INDEX_SUFFIX = ".cidx"
+
+# magic, version, codec, file size, file mtime_ns, file sha256,
+# body start, body end, entry count
+_HEADER = struct.Struct("<8sHHQq32sQQQ")
+
+
+class StaleIndexError(ValueError):
+    pass
+
+
+class ConceptIndex:
+    # Entries are kept sorted by concept id, in three parallel arrays so
+    # that the file loads without any per-entry parsing.
+    def __init__(self, codec, size, mtime_ns, digest, body_start, body_end,
+                 ids, offsets, lengths):
+        self.codec = codec
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.body_start = body_start
+        self.body_end = body_end
+        self.ids = ids
+        self.offsets = offsets
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, input_path: Path) -> "ConceptIndex":
+        with open(input_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if not stat.st_size:
+                raise ValueError(f"{input_path} is empty")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                layout = scan_layout(data)
+                if layout is None:
+                    raise ValueError(f"No concepts found in {input_path}")
+                prolog = data[:layout.body_start]
+                epilog = data[layout.body_end:]
+                for _ in read_fragment(prolog, b"", epilog):
+                    pass
+
+                find_id = _IdFinder(layout.codec, prolog, epilog)
+                entries = []
+                for start, end in iter_concept_ranges(data, layout):
+                    concept_id = find_id(data[start:end])
+                    if concept_id is not None:
+                        entries.append((concept_id, start, end - start))
+                digest = hashlib.sha256(data).digest()
+
+        entries.sort()
+        return cls(layout.codec, stat.st_size, stat.st_mtime_ns, digest,
+                   layout.body_start, layout.body_end,
+                   array("q", [e[0] for e in entries]),
+                   array("Q", [e[1] for e in entries]),
+                   array("I", [e[2] for e in entries]))
+
+    def save(self, path: Path):
+        tmp_path = Path(path).with_name(Path(path).name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(
+                MAGIC, INDEX_VERSION, CODECS.index(self.codec), self.size,
+                self.mtime_ns, self.digest, self.body_start, self.body_end,
+                len(self.ids)))
+            for column in [self.ids, self.offsets, self.lengths]:
+                f.write(_little_endian(column).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ConceptIndex":
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size or not header.startswith(MAGIC):
+                raise ValueError(f"{path} is not a concept index")
+            (_, version, codec, size, mtime_ns, digest, body_start,
+             body_end, count) = _HEADER.unpack(header)
+            if version != INDEX_VERSION:
+                raise StaleIndexError(f"{path} has unsupported version "
+                                      f"{version}")
+
+            columns = []
+            for typecode in "qQI":
+                column = array(typecode)
+                column.fromfile(f, count)
+                columns.append(_little_endian(column))
+
+        return cls(CODECS[codec], size, mtime_ns, digest, body_start,
+                   body_end, *columns)
+
+    def is_current(self, input_path: Path) -> bool:
+        stat = Path(input_path).stat()
+        if stat.st_size != self.size:
+            return False
+        if stat.st_mtime_ns == self.mtime_ns:
+            return True
+        with open(input_path, "rb") as f:
+            if hashlib.file_digest(f, "sha256").digest() != self.digest:
+                return False
+        # Touched or copied but unchanged: remember the new mtime so that
+        # the export is not hashed again once the index is saved.
+        self.mtime_ns = stat.st_mtime_ns
+        return True
+
+    def find(self, concept_id: int) -> list[tuple[int, int]]:
+        return self.find_range(concept_id, concept_id)
+
+    def find_range(self, first: int, last: int) -> list[tuple[int, int]]:
+        lo = bisect_left(self.ids, first)
+        hi = bisect_right(self.ids, last)
+        return [(self.offsets[i], self.lengths[i]) for i in range(lo, hi)]
+
+
+def _little_endian(column: array) -> array:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+class _IdFinder:
+    # Reads the id straight from the raw bytes where it is plain text,
+    # and parses the whole conceptGrp otherwise.
+    pattern = re.compile(r"<concept(?:\s[^>]*)?>([^<&]*)</concept>")
+
+    def __init__(self, codec, prolog, epilog):
+        self._codec = codec
+        self._prolog = prolog
+        self._epilog = epilog
+        self._end = "</concept>".encode(codec)
+        self._unit = len(" ".encode(codec))
+
+    def __call__(self, body: bytes) -> Optional[int]:
+        end = body.find(self._end)
+        if end >= 0 and not end % self._unit:
+            head = body[:end + len(self._end)].decode(self._codec)
+            match = self.pattern.search(head)
+            if match and match.group(1).strip().isdigit():
+                return int(match.group(1))
+
+        for concept in read_fragment(self._prolog, body, self._epilog):
+            return concept.id
+        return None
+
+
+def index_path_for(input_path: Path) -> Path:
+    return Path(input_path).with_name(Path(input_path).name + INDEX_SUFFIX)
+
+
+def open_index(input_path: Path, index_path=None,
+               rebuild=True) -> ConceptIndex:
+    index_path = index_path or index_path_for(input_path)
+    try:
+        index = ConceptIndex.load(index_path)
+    except (FileNotFoundError, StaleIndexError):
+        if not rebuild:
+            raise
+    else:
+        mtime_ns = index.mtime_ns
+        if index.is_current(input_path):
+            if index.mtime_ns != mtime_ns:
+                index.save(index_path)
+            return index
+        if not rebuild:
+            raise StaleIndexError(f"{index_path} does not match "
+                                  f"{input_path}")
+
+    index = ConceptIndex.build(input_path)
+    index.save(index_path)
+    return index
+
+
+def read_concepts(input_path: Path, ranges: Iterable[tuple[int, int]],
+                  index: Optional[ConceptIndex] = None) -> Iterator[Concept]:
+    if index is None:
+        index = open_index(input_path)
+
+    located = sorted({location
+                      for first, last in ranges
+                      for location in index.find_range(first, last)})
+    if not located:
+        return
+
+    with open(input_path, "rb") as f:
+        prolog = f.read(index.body_start)
+        f.seek(index.body_end)
+        epilog = f.read()
+
+        body = []
+        for offset, length in located:
+            f.seek(offset)
+            body.append(f.read(length))
+
+    yield from read_fragment(prolog, b"".join(body), epilog)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index the concepts of a MultiTerm XML export, and "
+        "convert selected concepts to TBX on stdout using the index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="build an index")
+    build_parser.add_argument("input", type=Path)
+    build_parser.add_argument("--index", type=Path,
+                              help=f"index file (default: input file name "
+                              f"plus {INDEX_SUFFIX})")
+
+    lookup_parser = subparsers.add_parser(
+        "lookup", help="convert concepts by id, building the index if "
+        "it is missing or out of date")
+    lookup_parser.add_argument("input", type=Path)
+    lookup_parser.add_argument("ids", nargs="+", type=parse_id_range,
+                               help="concept ids or ranges, e.g. 42 or "
+                               "100-200")
+    lookup_parser.add_argument("--index", type=Path)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = ConceptIndex.build(args.input)
+        index.save(args.index or index_path_for(args.input))
+        print(f"Indexed {len(index)} concepts", file=sys.stderr)
+    else:
+        index = open_index(args.input, args.index)
+        concepts = read_concepts(args.input, args.ids, index)
+        write_tbx_file(sys.stdout.buffer, trados_to_tbx(concepts))
+
+
+if __name__ == "__main__":
+    main()
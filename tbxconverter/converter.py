@@ -1,73 +1,452 @@
+import argparse
+import os
 import sys
+from contextlib import ExitStack
 from datetime import datetime, timezone
-from typing import Iterable
+from functools import lru_cache
+from typing import Iterable, Optional
 from pathlib import Path
 
+from .compression import detect_compression, open_input, open_output
+from .compression import compress_stream
+from .progress import ConversionCancelled, track_progress
 from .trados_reader import Concept, TransactionType
-from .trados_reader import read_trados_file
+from .trados_reader import ConceptFilter, read_trados_file
+from .trados_reader import parse_id_range
 from .tbx_writer import TermEntry, Term, TermNote, LangSet, Descrip
-from .tbx_writer import write_tbx_file
+from .tbx_writer import write_tbx_file, write_tbx_fragments
+from .tbx_writer import render_term_entry, write_buffered
 
 ORIGINATION = TransactionType.ORIGINATION
 MODIFICATION = TransactionType.MODIFICATION
 
+OUTPUT_FORMATS = ["tbx", "jsonl", "jsonl-terms", "tsv"]
 
-def convert_file(input_path: Path, output_path: Path) -> int:
-    with open(input_path, "rb") as fi, open(output_path, "wb") as fo:
-        trados_data = read_trados_file(fi)
-        tbx_data = trados_to_tbx(trados_data)
-        return write_tbx_file(fo, tbx_data)
+DEFAULT_NOTE_CACHE_SIZE = 4096
+
+
+def convert_file(input_path: Path, output_path: Path, jobs=1,
+                 cache=None, progress=None, cancel=None, hooks=None,
+                 concept_filter=None, output_format="tbx",
+                 pipeline=None, checkpoint_every=None, resume=False,
+                 note_cache=None) -> int:
+    if checkpoint_every is not None or resume:
+        if (jobs > 1 or cache is not None or progress is not None
+                or cancel is not None or hooks is not None
+                or pipeline is not None):
+            raise ValueError("Checkpoints cannot be combined with jobs, "
+                             "the fragment cache, progress reporting, "
+                             "cancellation, hooks or the pipeline")
+        from .checkpoint import DEFAULT_INTERVAL, convert_file_resumable
+        return convert_file_resumable(
+            input_path, output_path,
+            DEFAULT_INTERVAL if checkpoint_every is None else checkpoint_every,
+            resume, concept_filter, output_format, note_cache)
+
+    try:
+        with open_output(output_path) as fo:
+            return convert_to_stream(input_path, fo, jobs, cache,
+                                     progress, cancel, hooks,
+                                     concept_filter, output_format,
+                                     pipeline, note_cache)
+    except ConversionCancelled:
+        os.remove(output_path)
+        raise
+
+
+def convert_to_stream(input_path: Path, stream, jobs=1, cache=None,
+                      progress=None, cancel=None, hooks=None,
+                      concept_filter=None, output_format="tbx",
+                      pipeline=None, note_cache=None) -> int:
+    if jobs > 1 and cache is not None:
+        raise ValueError("The fragment cache requires jobs=1")
+    if note_cache is not None and (jobs > 1 or cache is not None):
+        raise ValueError("The term note cache cannot be combined with jobs "
+                         "or the fragment cache")
+    if pipeline is not None and (jobs > 1 or cache is not None
+                                 or hooks is not None):
+        raise ValueError("The pipeline cannot be combined with jobs, the "
+                         "fragment cache or hooks")
+    if output_format != "tbx":
+        if cache is not None:
+            raise ValueError("The fragment cache only holds TBX")
+        from .record_writer import get_record_renderer
+        get_record_renderer(output_format)
+
+    tracked = progress is not None or cancel is not None
+    if jobs > 1 and (tracked or hooks is not None):
+        raise ValueError("Progress reporting, cancellation and hooks "
+                         "require jobs=1")
+
+    # Splitting into chunks and keying on raw bytes need the
+    # uncompressed input mapped into memory, so compressed inputs are
+    # always streamed through the serial reader, as are conversions
+    # that report progress or call hooks between concepts.
+    splittable = (not tracked and hooks is None
+                  and detect_compression(input_path) is None)
+
+    if jobs > 1 and splittable:
+        from .parallel import convert_parallel
+        return convert_parallel(input_path, stream, jobs,
+                                concept_filter=concept_filter,
+                                output_format=output_format)
+
+    if cache is not None and splittable:
+        from .fragment_cache import convert_file_cached
+        return convert_file_cached(input_path, stream, cache,
+                                   concept_filter=concept_filter)
+
+    with open(input_path, "rb") as raw, open_input(raw) as fi:
+        if pipeline is not None:
+            return pipeline.convert(fi, raw, stream,
+                                    os.fstat(raw.fileno()).st_size,
+                                    concept_filter, output_format,
+                                    progress, cancel, note_cache)
+        if hooks is not None:
+            return _convert_with_hooks(fi, stream, cache, hooks, raw,
+                                       progress, cancel, concept_filter,
+                                       output_format, note_cache)
+
+        trados_data = read_trados_file(fi, concept_filter=concept_filter)
+        if tracked:
+            trados_data = track_progress(
+                trados_data, raw.tell, os.fstat(raw.fileno()).st_size,
+                progress, cancel)
+
+        if cache is not None:
+            from .fragment_cache import write_cached_tbx_file
+            return write_cached_tbx_file(stream, trados_data, cache)
+        tbx_data = trados_to_tbx(trados_data, note_cache=note_cache)
+        if output_format != "tbx":
+            from .record_writer import write_records
+            return write_records(stream, tbx_data, output_format)
+        return write_tbx_file(stream, tbx_data)
+
+
+def _convert_with_hooks(fi, stream, cache, hooks, raw, progress, cancel,
+                        concept_filter, output_format, note_cache):
+    trados_data = hooks.stage("parse", read_trados_file(
+        hooks.stream("read", fi), concept_filter=concept_filter))
+    if progress is not None or cancel is not None:
+        trados_data = track_progress(
+            trados_data, raw.tell, os.fstat(raw.fileno()).st_size,
+            progress, cancel)
+    stream = hooks.stream("write", stream)
+
+    if cache is not None:
+        from .fragment_cache import write_cached_tbx_file
+        return write_cached_tbx_file(stream, trados_data, cache)
+
+    tbx_data = hooks.stage("convert", trados_to_tbx(
+        trados_data, note_cache=note_cache))
+
+    if output_format == "tbx":
+        render_entry = render_term_entry
+    else:
+        from .record_writer import get_record_renderer
+        render_entry = get_record_renderer(output_format)
+
+    def render(entry):
+        hooks.entry(entry)
+        return render_entry(entry)
+
+    fragments = hooks.stage("serialize", map(render, tbx_data))
+    if output_format != "tbx":
+        from .record_writer import write_record_header
+        write_record_header(stream, output_format)
+        return write_buffered(stream, fragments)
+    return write_tbx_fragments(stream, fragments)
+
+
+class TermNoteCache:
+    # Terms imported or edited together share the source and date of
+    # their transactions, so the notes of each distinct transaction are
+    # built once and shared, which TermNote being frozen allows. The
+    # least recently used are dropped once maxsize is reached. It only
+    # pays off when transactions repeat, so it is used only when given.
+
+    def __init__(self, maxsize=DEFAULT_NOTE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.convert = lru_cache(maxsize)(_convert_transaction)
+
+    def __len__(self):
+        return self.convert.cache_info().currsize
+
+    @property
+    def hits(self) -> int:
+        return self.convert.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        return self.convert.cache_info().misses
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self.convert.cache_clear()
 
 
 def trados_to_tbx(
         trados_data: Iterable[Concept],
         id_prefix=None,
+        note_cache: Optional[TermNoteCache] = None,
 ) -> Iterable[TermEntry]:
+    for concept in trados_data:
+        yield convert_concept(concept, id_prefix, note_cache)
 
-    def convert_terms(terms):
-        return [Term(term.text,
-                     convert_comment(term.descriptions),
-                     [note for t in term.transactions
-                      for note in convert_transaction(t)])
-                for term in terms]
-
-    def convert_comment(descriptions):
-        if len(descriptions) > 1:
-            return "\n".join(f"{k}: {v}" for k, v in descriptions.items())
-        elif not descriptions:
-            return None
-        else:
-            return next(iter(descriptions.values()))
 
-    def convert_transaction(transaction):
-        if transaction.type == ORIGINATION:
-            return [TermNote("createdBy", transaction.source),
-                    TermNote("createdAt", convert_date(transaction.date))]
-        else:
-            return [TermNote("lastModifiedBy", transaction.source),
-                    TermNote("lastModifiedAt", convert_date(transaction.date))]
+def convert_concept(concept: Concept, id_prefix=None,
+                    note_cache: Optional[TermNoteCache] = None) -> TermEntry:
+    tbx_concept_id = (f"{id_prefix}-{concept.id}"
+                      if id_prefix else str(concept.id))
+    descrips = [Descrip("conceptId", tbx_concept_id)]
+    notes = (_convert_transaction if note_cache is None
+             else note_cache.convert)
+    languages = [LangSet(lang.code, _convert_terms(lang.terms, notes))
+                 for lang in concept.languages]
 
-    def convert_date(date_str):
-        d = datetime.fromisoformat(date_str)
-        if d.tzinfo is None:
-            d = d.replace(tzinfo=timezone.utc)
-        return str(int(d.timestamp()) * 1000)
+    return TermEntry(descrips, languages)
+
+
+def _convert_terms(terms, notes):
+    return [Term(term.text,
+                 _convert_comment(term.descriptions),
+                 [note for t in term.transactions
+                  for note in notes(t.type, t.source, t.date)])
+            for term in terms]
+
+
+def _convert_comment(descriptions):
+    if len(descriptions) > 1:
+        return "\n".join(f"{k}: {v}" for k, v in descriptions.items())
+    elif not descriptions:
+        return None
+    else:
+        return next(iter(descriptions.values()))
 
-    for concept in trados_data:
-        tbx_concept_id = (f"{id_prefix}-{concept.id}"
-                          if id_prefix else str(concept.id))
-        descrips = [Descrip("conceptId", tbx_concept_id)]
-        languages = [LangSet(lang.code, convert_terms(lang.terms))
-                     for lang in concept.languages]
 
-        yield TermEntry(descrips, languages)
+def _convert_transaction(type, source, date) -> tuple[TermNote, TermNote]:
+    if type == ORIGINATION:
+        return (TermNote("createdBy", source),
+                TermNote("createdAt", _convert_date(date)))
+    else:
+        return (TermNote("lastModifiedBy", source),
+                TermNote("lastModifiedAt", _convert_date(date)))
+
+
+def _convert_date(date_str):
+    d = datetime.fromisoformat(date_str)
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=timezone.utc)
+    return str(int(d.timestamp()) * 1000)
 
 
 def main():
-    with open(sys.argv[1], "rb") as f:
-        trados_data = read_trados_file(f)
-        tbx_data = trados_to_tbx(trados_data)
-        write_tbx_file(sys.stdout.buffer, tbx_data)
+    parser = argparse.ArgumentParser(
+        description="Convert a MultiTerm XML export to TBX on stdout. "
+        "Compressed inputs are decompressed on the fly.")
+    parser.add_argument("input", type=Path,
+                        help="XML export, optionally gzip, bz2, xz or zip "
+                        "compressed")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="write to this file instead of stdout, "
+                        "compressed according to its extension")
+    parser.add_argument("--compress", choices=["gzip", "bz2", "xz", "none"],
+                        help="compress the output (default: from the "
+                        "output file extension)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="tbx",
+                        help="output TBX, JSON Lines with one object per "
+                        "concept or per term, or TSV with one row per "
+                        "term (default: tbx)")
+    parser.add_argument("--shard-entries", type=int,
+                        help="split the output into files of at most this "
+                        "many entries, named like OUTPUT-0001.tbx")
+    parser.add_argument("--shard-size", type=float,
+                        help="split the output into files of at most this "
+                        "many MB, before compression")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes (0 for one per CPU)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="read ahead, convert and write behind on "
+                        "separate threads, and print queue statistics to "
+                        "stderr")
+    parser.add_argument("--checkpoint-every", type=int, metavar="N",
+                        help="save a checkpoint next to the output every N "
+                        "concepts, so that an interrupted conversion can "
+                        "be resumed")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the checkpoint of an "
+                        "interrupted conversion, if there is one")
+    parser.add_argument("--cache", type=Path,
+                        help="reuse rendered entries from this cache file")
+    parser.add_argument("--cache-size", type=int, default=512,
+                        help="maximum cache size in MB")
+    parser.add_argument("--note-cache", type=int, nargs="?",
+                        const=DEFAULT_NOTE_CACHE_SIZE, metavar="SIZE",
+                        help="share the term notes of up to SIZE repeated "
+                        "transactions (default: "
+                        f"{DEFAULT_NOTE_CACHE_SIZE}), which saves time and "
+                        "memory when terms were imported or edited in "
+                        "batches, and print the hit rate to stderr")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the time spent in each stage to stderr")
+    parser.add_argument("--profile-stats", type=Path,
+                        help="also save cProfile statistics to this file")
+    parser.add_argument("--profile-stacks", type=Path,
+                        help="also save sampled stacks to this file, in the "
+                        "collapsed format used for flame graphs")
+    parser.add_argument("--languages", type=_parse_list,
+                        help="only these language codes, comma separated; "
+                        "a code like EN matches EN-GB and EN-US")
+    parser.add_argument("--ids", type=_parse_id_ranges,
+                        help="only these concept ids or ranges, comma "
+                        "separated, e.g. 1-100,250")
+    parser.add_argument("--modified-since", type=datetime.fromisoformat,
+                        help="only concepts created or modified on or "
+                        "after this date, e.g. 2024-01-31 (UTC unless a "
+                        "time zone is given)")
+    args = parser.parse_args()
+
+    concept_filter = None
+    if args.languages or args.ids or args.modified_since:
+        concept_filter = ConceptFilter(
+            languages=frozenset(args.languages) if args.languages else None,
+            id_ranges=args.ids,
+            modified_since=args.modified_since)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs > 1 and args.cache:
+        parser.error("--cache cannot be combined with --jobs")
+    if args.cache and args.format != "tbx":
+        parser.error("--cache requires --format tbx")
+    if args.pipeline and (jobs > 1 or args.cache):
+        parser.error("--pipeline cannot be combined with --jobs or "
+                     "--cache")
+    note_cache = None
+    if args.note_cache is not None:
+        note_cache = TermNoteCache(args.note_cache)
+    if note_cache is not None and (jobs > 1 or args.cache):
+        parser.error("--note-cache cannot be combined with --jobs or "
+                     "--cache")
+
+    if args.checkpoint_every is not None or args.resume:
+        if not args.output:
+            parser.error("checkpoints require --output")
+        if (jobs > 1 or args.cache or args.pipeline or args.shard_entries
+                or args.shard_size or args.profile or args.profile_stats
+                or args.profile_stacks):
+            parser.error("checkpoints cannot be combined with --jobs, "
+                         "--cache, --pipeline, sharding or profiling")
+        if args.compress not in (None, "none"):
+            parser.error("checkpoints cannot be combined with --compress")
+        try:
+            convert_file(args.input, args.output,
+                         concept_filter=concept_filter,
+                         output_format=args.format,
+                         checkpoint_every=args.checkpoint_every,
+                         resume=args.resume, note_cache=note_cache)
+        except ValueError as ex:
+            sys.exit(f"error: {ex}")
+        _print_note_cache_stats(note_cache)
+        return
+
+    if args.shard_entries or args.shard_size:
+        if not args.output:
+            parser.error("sharding requires --output")
+        if args.format != "tbx":
+            parser.error("sharding requires --format tbx")
+        if args.cache or args.pipeline or note_cache is not None \
+                or args.profile or args.profile_stats or args.profile_stacks:
+            parser.error("sharding cannot be combined with --cache, "
+                         "--pipeline, --note-cache or profiling")
+        from .sharding import convert_file_sharded
+        shards = convert_file_sharded(
+            args.input, args.output, args.shard_entries,
+            int(args.shard_size * 1024 * 1024) if args.shard_size else None,
+            jobs, args.compress, concept_filter)
+        for shard in shards:
+            print(f"{shard.path}: {shard.count} entries", file=sys.stderr)
+        return
+
+    hooks = profiler = sampler = None
+    if args.profile or args.profile_stats or args.profile_stacks:
+        if jobs > 1:
+            parser.error("profiling cannot be combined with --jobs")
+        if args.pipeline:
+            parser.error("profiling cannot be combined with --pipeline")
+        from .profiling import StageProfile
+        hooks = StageProfile()
+    if args.profile_stats:
+        import cProfile
+        profiler = cProfile.Profile()
+    if args.profile_stacks:
+        from .profiling import StackSampler
+        sampler = StackSampler()
+
+    with ExitStack() as stack:
+        if args.output:
+            stream = stack.enter_context(
+                open_output(args.output, args.compress))
+        elif args.compress not in (None, "none"):
+            stream = stack.enter_context(
+                compress_stream(sys.stdout.buffer, args.compress))
+        else:
+            stream = sys.stdout.buffer
+
+        cache = None
+        if args.cache:
+            from .fragment_cache import FragmentCache
+            cache = stack.enter_context(
+                FragmentCache(args.cache, args.cache_size * 1024 * 1024))
+
+        pipeline = None
+        if args.pipeline:
+            from .pipeline import Pipeline
+            pipeline = Pipeline()
+
+        if sampler is not None:
+            stack.enter_context(sampler)
+        if profiler is not None:
+            stack.enter_context(profiler)
+
+        convert_to_stream(args.input, stream, jobs, cache, hooks=hooks,
+                          concept_filter=concept_filter,
+                          output_format=args.format, pipeline=pipeline,
+                          note_cache=note_cache)
+
+    if hooks is not None:
+        hooks.finish()
+        print(hooks.format_report(), file=sys.stderr)
+    if profiler is not None:
+        profiler.dump_stats(args.profile_stats)
+    if sampler is not None:
+        with open(args.profile_stacks, "w", encoding="utf-8") as f:
+            sampler.write_collapsed(f)
+    if pipeline is not None:
+        print(pipeline.format_report(), file=sys.stderr)
+    if cache is not None:
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses "
+              f"({cache.hit_rate:.1%}), {cache.evictions} evicted",
+              file=sys.stderr)
+    _print_note_cache_stats(note_cache)
+
+
+def _print_note_cache_stats(note_cache):
+    if note_cache is not None:
+        print(f"Term notes: {note_cache.hits} hits, {note_cache.misses} "
+              f"misses ({note_cache.hit_rate:.1%}), {len(note_cache)} of "
+              f"{note_cache.maxsize} cached", file=sys.stderr)
+
+
+def _parse_list(text: str) -> list[str]:
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def _parse_id_ranges(text: str) -> tuple[tuple[int, int], ...]:
+    return tuple(parse_id_range(item) for item in _parse_list(text))
 
 
 if __name__ == "__main__":
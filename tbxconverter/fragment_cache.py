@@ -0,0 +1,213 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .converter import convert_concept
+from .tbx_writer import render_term_entry, write_tbx_fragments
+from .splitting import scan_layout, iter_concept_ranges, read_fragment
+from .trados_reader import Concept, read_trados_file
+
+# Bump whenever conversion or serialization output changes, so that
+# fragments rendered by older versions are not reused.
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class FragmentCache:
+    def __init__(self, path: Path, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._touched: list[tuple[int, bytes]] = []
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS fragments (
+                key BLOB PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                entries INTEGER NOT NULL,
+                generation INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS fragments_generation
+                ON fragments (generation);
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL);
+        """)
+        with self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+            self._db.execute(
+                "UPDATE meta SET value = value + 1 "
+                "WHERE name = 'generation'")
+        # Fragments used by older runs are evicted first.
+        self._generation = self._db.execute(
+            "SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: bytes) -> Optional[tuple[bytes, int]]:
+        row = self._db.execute(
+            "SELECT data, entries, generation FROM fragments WHERE key = ?",
+            (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        data, entries, generation = row
+        if generation != self._generation:
+            self._touched.append((self._generation, key))
+            if len(self._touched) >= 1000:
+                self._flush_touched()
+        return data, entries
+
+    def _flush_touched(self):
+        self._db.executemany(
+            "UPDATE fragments SET generation = ? WHERE key = ?",
+            self._touched)
+        self._touched.clear()
+
+    def put(self, key: bytes, data: bytes, entries=1):
+        self._db.execute(
+            "INSERT OR REPLACE INTO fragments VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), entries, self._generation))
+
+    def size(self) -> int:
+        return self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM fragments").fetchone()[0]
+
+    def evict(self):
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+
+        victims = []
+        for key, size in self._db.execute(
+                "SELECT key, size FROM fragments "
+                "ORDER BY generation, rowid"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+        self._db.executemany("DELETE FROM fragments WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def close(self):
+        if self._db is None:
+            return
+        with self._db:
+            self._flush_touched()
+            self.evict()
+        self._db.close()
+        self._db = None  # type: ignore
+
+
+def concept_key(concept: Concept, id_prefix=None, indent="  ") -> bytes:
+    # The repr of plain tuples is much cheaper than that of the
+    # dataclasses and just as unambiguous.
+    def transactions(items):
+        return [(t.type.value, t.source, t.date) for t in items]
+
+    content = (
+        CACHE_VERSION, id_prefix, indent, concept.id,
+        transactions(concept.transactions),
+        [(lang.name, lang.code,
+          [(term.text, transactions(term.transactions),
+            list(term.descriptions.items()))
+           for term in lang.terms])
+         for lang in concept.languages])
+
+    return hashlib.sha256(repr(content).encode("utf-8")).digest()
+
+
+def write_cached_tbx_file(stream, trados_data: Iterable[Concept],
+                          cache: FragmentCache, id_prefix=None,
+                          indent="  ") -> int:
+    def render(concept):
+        key = concept_key(concept, id_prefix, indent)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+        data = render_term_entry(convert_concept(concept, id_prefix), indent)
+        cache.put(key, data)
+        return data
+
+    return write_tbx_fragments(
+        stream, (render(concept) for concept in trados_data), indent)
+
+
+def convert_file_cached(input_path: Path, stream, cache: FragmentCache,
+                        id_prefix=None, indent="  ",
+                        concept_filter=None) -> int:
+    # Keys on the raw bytes of each conceptGrp, so that unchanged
+    # concepts are not even parsed. Falls back to keying on parsed
+    # concepts for inputs that cannot be split.
+    with open(input_path, "rb") as f:
+        layout = None
+        if os.fstat(f.fileno()).st_size:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            layout = scan_layout(data)
+            if layout is None:
+                data.close()
+
+        if layout is None:
+            return write_cached_tbx_file(
+                stream, read_trados_file(f, concept_filter=concept_filter),
+                cache, id_prefix, indent)
+
+        with data:
+            prolog = data[:layout.body_start]
+            epilog = data[layout.body_end:]
+            for _ in read_fragment(prolog, b"", epilog):
+                pass
+
+            filter_key = concept_filter.key() if concept_filter else None
+            salt = hashlib.sha256(repr(
+                (CACHE_VERSION, "raw", id_prefix, indent,
+                 filter_key)).encode("utf-8"))
+            salt.update(prolog)
+            count = 0
+
+            def render(start, end):
+                nonlocal count
+                body = data[start:end]
+                h = salt.copy()
+                h.update(body)
+                key = h.digest()
+
+                cached = cache.get(key)
+                if cached is None:
+                    entries = [
+                        render_term_entry(convert_concept(c, id_prefix),
+                                          indent)
+                        for c in read_fragment(prolog, body, epilog,
+                                               concept_filter)]
+                    cached = b"".join(entries), len(entries)
+                    cache.put(key, *cached)
+
+                count += cached[1]
+                return cached[0]
+
+            write_tbx_fragments(
+                stream,
+                (render(start, end)
+                 for start, end in iter_concept_ranges(data, layout)),
+                indent)
+
+    return count
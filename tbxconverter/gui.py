@@ -9,19 +9,24 @@ from winter.widgets import Toplevel, Button, Label    # type: ignore
 from winter.dispatcher import Dispatcher              # type: ignore
 
 from .gui_model import ConverterWindowModel, ConverterService
+from .gui_model import split_selection
 
 
 def main():
     app = App()
     app.set_thread_dpi_mode(app.get_supported_dpi_mode())
 
-    model = ConverterWindowModel(ConverterService(Dispatcher(app)))
+    service = ConverterService(Dispatcher(app))
+    model = ConverterWindowModel(service)
 
     window = build_ui(app, model)
     window.show()
     window.update()
+    service.preload()
 
-    sys.exit(pump_messages())
+    status = pump_messages()
+    service.shutdown()
+    sys.exit(status)
 
 
 def build_ui(app, model: ConverterWindowModel):
@@ -29,12 +34,13 @@ def build_ui(app, model: ConverterWindowModel):
         app.post_quit_message(0)
 
     def on_open_button_clicked(event):
-        filename = toplevel.window.show_open_file_dialog(
-            flags=OFN.FILEMUSTEXIST | OFN.PATHMUSTEXIST | OFN.HIDEREADONLY,
+        selection = toplevel.window.show_open_file_dialog(
+            flags=OFN.FILEMUSTEXIST | OFN.PATHMUSTEXIST | OFN.HIDEREADONLY
+            | OFN.ALLOWMULTISELECT | OFN.EXPLORER,
             filters=[("XML", "*.xml"), ("All Files", "*.*")])
 
-        if filename:
-            model.load_file(filename)
+        if selection:
+            model.load_files(split_selection(selection))
 
     def on_export_button_clicked(event):
         filename = toplevel.window.show_save_file_dialog(
@@ -45,9 +51,13 @@ def build_ui(app, model: ConverterWindowModel):
         if filename:
             model.convert(filename)
 
+    def on_cancel_button_clicked(event):
+        model.cancel()
+
     def on_model_state_changed(state):
         open_button.enable(state.load_enabled)
         export_button.enable(state.export_enabled)
+        cancel_button.enable(state.cancel_enabled)
         label.set_text(state.status)
         print(state)
 
@@ -67,14 +77,17 @@ def build_ui(app, model: ConverterWindowModel):
                          command=on_open_button_clicked)
     export_button = Button(toplevel, caption="Exportera...",
                            command=on_export_button_clicked)
+    cancel_button = Button(toplevel, caption="Avbryt",
+                           command=on_cancel_button_clicked)
     label = Label(toplevel, caption="",
                   style=SS.CENTER | SS.CENTERIMAGE)
 
     grid = GridLayout(cell_size=(160, 32), spacing=10, padding=15)
     grid.add(open_button, sticky="ew")
     grid.add(export_button, sticky="ew")
+    grid.add(cancel_button, sticky="ew")
     grid.break_row()
-    grid.add(label, colspan=2, sticky="ew")
+    grid.add(label, colspan=3, sticky="ew")
     toplevel.set_layout(grid)
     toplevel.set_size()
 
@@ -1,8 +1,48 @@
-from dataclasses import dataclass, replace
-from threading import Thread
+import os
+import time
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from functools import partial
+from importlib import import_module
+from threading import Lock, Thread
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Optional
 
-from .converter import convert_file
+from .progress import CancellationToken, ConversionCancelled, Progress
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from .prescan import ScanResult
+
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED = {JobStatus.DONE, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+@dataclass(frozen=True)
+class Job:
+    id: int
+    input_path: Path
+    output_path: Path
+    scan: Optional["ScanResult"] = field(default=None, repr=False,
+                                         compare=False)
+
+
+@dataclass(frozen=True)
+class JobState:
+    job: Job
+    status: JobStatus
+    progress: Optional[Progress] = None
+    count: int = 0
+    error: Optional[Exception] = None
 
 
 @dataclass(frozen=True)
@@ -10,15 +50,26 @@ class State:
     load_enabled: bool
     export_enabled: bool
     status: str
+    cancel_enabled: bool = False
+    progress: Optional[Progress] = None
+    jobs: tuple[JobState, ...] = ()
 
 
 class ConverterWindowModel:
-    def __init__(self, service):
+    def __init__(self, service: "ConverterService"):
         self._service = service
-        self._state_callbacks = []
-        self._alert_callbacks = []
-        self._input_path = None
-        self._output_path = None
+        self._state_callbacks: list[Callable[[State], None]] = []
+        self._alert_callbacks: list[Callable[[str], None]] = []
+        self._input_paths: list[Path] = []
+        self._scan_tokens: dict[Path, CancellationToken] = {}
+        self._scans: dict[Path, "ScanResult"] = {}
+        self._failed_scans = 0
+        self._load_id = 0
+        self._batch: Optional[JobBatch] = None
+        self._jobs: dict[int, JobState] = {}
+        self._sizes: dict[int, int] = {}
+        self._started = 0.0
+        self._next_job_id = 1
         self._state = State(
             load_enabled=True,
             export_enabled=False,
@@ -32,33 +83,198 @@ class ConverterWindowModel:
         self._alert_callbacks.append(callback)
 
     def load_file(self, filename: str):
-        self._input_path = Path(filename)
-        self._update_state(
-            export_enabled=True,
-            status=f"Öppnad: {self._input_path.name}")
+        self.load_files([filename])
+
+    def load_files(self, filenames: list[str]):
+        self._cancel_scans()
+        self._scans = {}
+        self._failed_scans = 0
+        self._input_paths = list(dict.fromkeys(map(Path, filenames)))
+        if len(self._input_paths) == 1:
+            status = f"Läser {self._input_paths[0].name}..."
+        else:
+            status = f"Läser {len(self._input_paths)} filer..."
+        self._update_state(export_enabled=True, status=status)
+
+        self._load_id += 1
+        for path in self._input_paths:
+            self._scan_tokens[path] = self._service.scan(
+                path, partial(self._on_scanned, self._load_id, path))
 
     def convert(self, output_filename: str):
-        self._output_path = Path(output_filename)
+        # With several files, the outputs are named after the inputs, in
+        # the folder of the chosen file.
+        self._cancel_scans()
+        output_path = Path(output_filename)
+        if len(self._input_paths) == 1:
+            outputs = {self._input_paths[0]: output_path}
+        else:
+            from .compression import strip_compression_suffix
+            outputs = {}
+            for input_path in self._input_paths:
+                name = strip_compression_suffix(input_path).stem + ".tbx"
+                if output_path.with_name(name) in outputs.values():
+                    self._alert(f"Mer än en fil skulle exporteras till "
+                                f"{name}.")
+                    return
+                outputs[input_path] = output_path.with_name(name)
+
+        jobs = []
+        self._sizes = {}
+        for input_path, path in outputs.items():
+            scan = self._scans.get(input_path)
+            job = Job(self._next_job_id, input_path, path, scan)
+            self._next_job_id += 1
+            jobs.append(job)
+            self._sizes[job.id] = _file_size(input_path, scan)
+        self._jobs = {job.id: JobState(job, JobStatus.QUEUED)
+                      for job in jobs}
+        self._started = time.monotonic()
+
         self._update_state(
             load_enabled=False,
             export_enabled=False,
-            status="Exporterar...")
-        self._service.convert(
-            self._input_path,
-            self._output_path,
-            self._on_finish)
+            cancel_enabled=True,
+            progress=None,
+            jobs=tuple(self._jobs.values()),
+            status=("Exporterar..." if len(jobs) == 1
+                    else f"Exporterar 0 av {len(jobs)} filer..."))
+        self._batch = self._service.convert_files(jobs, self._on_job)
+
+    def cancel(self):
+        if self._batch is not None:
+            self._batch.cancel()
+            self._update_state(
+                cancel_enabled=False,
+                status="Avbryter...")
+
+    def _cancel_scans(self):
+        for token in self._scan_tokens.values():
+            token.cancel()
+        self._scan_tokens = {}
+
+    def _on_scanned(self, load_id, path, result, error):
+        # Results of scans that were cancelled by opening other files or
+        # starting the export come too late to matter.
+        if load_id != self._load_id or path not in self._scan_tokens:
+            return
+        del self._scan_tokens[path]
+        name = path.name
+
+        if len(self._input_paths) == 1:
+            if error is not None:
+                self._alert(f"Fel vid inläsning:\n{error!r}")
+                self._update_state(export_enabled=False,
+                                   status=f"{name} kunde inte läsas.")
+            elif not result.concepts:
+                self._update_state(export_enabled=False,
+                                   status=f"Inga termer fanns i {name}.")
+            else:
+                self._scans[path] = result
+                self._update_state(status=(
+                    f"Öppnad: {name} ({result.encoding}, "
+                    f"{result.concepts} termposter, "
+                    f"{result.terms} termer, {len(result.languages)} språk, "
+                    f"export ca {result.estimated_seconds:.0f} s)"))
+            return
+
+        # Unreadable and empty files are left out of the export.
+        if error is not None:
+            self._alert(f"Fel vid inläsning av {name}:\n{error!r}")
+        if error is not None or not result.concepts:
+            self._input_paths.remove(path)
+            self._failed_scans += 1
+        else:
+            self._scans[path] = result
+        if self._scan_tokens:
+            return
 
-    def _on_finish(self, count, error):
-        path = self._output_path
-        self._output_path = None
+        scans = list(self._scans.values())
+        if not scans:
+            self._update_state(export_enabled=False,
+                               status="Inga av filerna kunde läsas.")
+            return
+        status = (f"Öppnade {len(scans)} filer: "
+                  f"{sum(s.concepts for s in scans)} termposter, "
+                  f"{sum(s.terms for s in scans)} termer, export ca "
+                  f"{sum(s.estimated_seconds for s in scans):.0f} s")
+        if self._failed_scans:
+            status += f" ({self._failed_scans} hoppades över)"
+        self._update_state(status=status)
 
-        print((count, error))
+    def _on_job(self, job_state: JobState):
+        current = self._jobs.get(job_state.job.id)
+        # Progress can arrive after the job has finished.
+        if current is None or current.status in FINISHED:
+            return
+        if job_state.status in FINISHED and job_state.job.scan is not None:
+            # The cached concepts can take up to CACHE_LIMIT bytes of
+            # memory, so they are let go once the job is done with them.
+            self._scans.pop(job_state.job.input_path, None)
+            job_state = replace(job_state,
+                                job=replace(job_state.job, scan=None))
+        self._jobs[job_state.job.id] = job_state
+        jobs = tuple(self._jobs.values())
 
-        if error is None and count > 0:
+        if all(state.status in FINISHED for state in jobs):
+            self._batch = None
+            if len(jobs) == 1:
+                self._on_finish(job_state)
+            else:
+                self._on_batch_finish(jobs)
+            return
+
+        if self._batch is None or self._batch.cancelled:
+            self._update_state(jobs=jobs)
+            return
+
+        progress = self._total_progress(jobs)
+        if len(jobs) == 1:
+            status = "Exporterar..."
+        else:
+            done = sum(state.status in FINISHED for state in jobs)
+            status = f"Exporterar {done} av {len(jobs)} filer..."
+        status += (f" {progress.fraction:.0%} "
+                   f"({progress.concepts} termer, "
+                   f"{progress.bytes_per_second / 1e6:.1f} MB/s")
+        if progress.eta is not None:
+            status += f", {progress.eta:.0f} s kvar"
+        self._update_state(progress=progress, jobs=jobs, status=status + ")")
+
+    def _total_progress(self, jobs) -> Progress:
+        # Throughput over the whole batch, counting finished jobs as
+        # fully read and queued ones as not started.
+        bytes_read = concepts = 0
+        for state in jobs:
+            if state.status in FINISHED:
+                bytes_read += self._sizes[state.job.id]
+                concepts += state.count
+            elif state.progress is not None:
+                bytes_read += state.progress.bytes_read
+                concepts += state.progress.concepts
+        return Progress(bytes_read, sum(self._sizes.values()), concepts,
+                        time.monotonic() - self._started)
+
+    def _on_finish(self, job_state: JobState):
+        count, error = job_state.count, job_state.error
+
+        if job_state.status is JobStatus.CANCELLED:
+            self._update_state(
+                load_enabled=True,
+                export_enabled=True,
+                cancel_enabled=False,
+                progress=None,
+                jobs=(job_state,),
+                status="Exporten avbröts.")
+        elif error is None and count > 0:
             self._update_state(
                 load_enabled=True,
                 export_enabled=False,
-                status=f"Exporterade {count} termer till {path.name}.")
+                cancel_enabled=False,
+                progress=None,
+                jobs=(job_state,),
+                status=(f"Exporterade {count} termer till "
+                        f"{job_state.job.output_path.name}."))
         else:
             if error:
                 self._alert(f"Fel vid export:\n{error!r}")
@@ -68,8 +284,39 @@ class ConverterWindowModel:
             self._update_state(
                 load_enabled=True,
                 export_enabled=True,
+                cancel_enabled=False,
+                progress=None,
+                jobs=(job_state,),
                 status="Export misslyckades.")
 
+    def _on_batch_finish(self, jobs: tuple[JobState, ...]):
+        done = [state for state in jobs if state.status is JobStatus.DONE]
+        failed = [state for state in jobs
+                  if state.status is JobStatus.FAILED]
+        if failed:
+            self._alert("\n\n".join(
+                f"Fel vid export av {state.job.input_path.name}:\n"
+                f"{state.error!r}" for state in failed))
+
+        count = sum(state.count for state in done)
+        status = (f"Exporterade {count} termer från {len(done)} av "
+                  f"{len(jobs)} filer till {jobs[0].job.output_path.parent}")
+        if len(done) == len(jobs):
+            status = (f"Exporterade {count} termer från {len(jobs)} filer "
+                      f"till {jobs[0].job.output_path.parent}.")
+        elif failed:
+            status += f", {len(failed)} misslyckades."
+        else:
+            status += ", exporten avbröts."
+
+        self._update_state(
+            load_enabled=True,
+            export_enabled=len(done) < len(jobs),
+            cancel_enabled=False,
+            progress=None,
+            jobs=jobs,
+            status=status)
+
     def _update_state(self, **updates):
         state = self._state = replace(self._state, **updates)
         for callback in self._state_callbacks:
@@ -80,21 +327,203 @@ class ConverterWindowModel:
             callback(message)
 
 
+def split_selection(selection) -> list[str]:
+    # A multiple selection from the open dialog is the folder followed
+    # by the file names, separated by NULs; a single file is its path.
+    if not isinstance(selection, str):
+        return list(selection)
+    folder, *names = selection.rstrip("\0").split("\0")
+    if not names:
+        return [folder]
+    return [os.path.join(folder, name) for name in names]
+
+
+def _file_size(path: Path, scan) -> int:
+    if scan is not None:
+        return scan.size
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+class JobBatch:
+    def __init__(self, token: CancellationToken):
+        self.token = token
+        self.futures: list["Future"] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    def cancel(self):
+        # Queued jobs are dropped, running ones stop at the next concept.
+        self.token.cancel()
+        for future in self.futures:
+            future.cancel()
+
+
 class ConverterService:
-    def __init__(self, dispatcher):
+    # A single job runs on a thread, where it can use the concepts
+    # cached by the scan. Several jobs share a bounded pool of worker
+    # processes, since the conversion is CPU-bound, and report back over
+    # a queue that a listener thread hands on to the dispatcher.
+    def __init__(self, dispatcher, workers: Optional[int] = None):
         self._dispatcher = dispatcher
+        self._workers = workers or os.cpu_count() or 1
+        self._lock = Lock()
+        self._threads: Optional["ThreadPoolExecutor"] = None
+        self._processes: Optional["ProcessPoolExecutor"] = None
+        self._manager: Any = None
+        self._updates: Any = None
+        self._listener: Optional[Thread] = None
+        self._callbacks: dict[int, tuple[Job, Callable]] = {}
+        self._batches: list[JobBatch] = []
+        self._scan_tokens: set[CancellationToken] = set()
+
+    def preload(self):
+        # The conversion modules are imported here rather than at the
+        # top so that the window can show before they have loaded.
+        Thread(target=import_module, args=(f"{__package__}.converter",),
+               daemon=True).start()
 
-    def convert(self, input_path, output_path, callback):
-        args = input_path, output_path, callback
-        Thread(target=self._work, args=args).start()
+    def scan(self, input_path, callback) -> CancellationToken:
+        token = CancellationToken()
+        with self._lock:
+            self._scan_tokens.add(token)
+        self._thread_pool().submit(self._scan_work, input_path, callback,
+                                   token)
+        return token
 
-    def _work(self, input_path, output_path, callback):
+    def _scan_work(self, input_path, callback, token):
         try:
-            count = convert_file(input_path, output_path)
+            from .prescan import scan_file
+            result = scan_file(input_path, token)
         except Exception as ex:
-            count = 0
+            result = None
             error = ex
         else:
             error = None
+        finally:
+            with self._lock:
+                self._scan_tokens.discard(token)
+
+        self._dispatcher.submit(callback, result, error)
+
+    def convert_files(self, jobs: list[Job], callback) -> JobBatch:
+        # The callback gets a JobState when a job starts, reports
+        # progress and finishes.
+        executor: Executor
+        if len(jobs) > 1:
+            executor, updates = self._process_pool()
+            batch = JobBatch(CancellationToken(self._manager.Event()))
+            report = updates.put
+        else:
+            executor = self._thread_pool()
+            batch = JobBatch(CancellationToken())
+            report = self._report
+
+        with self._lock:
+            self._batches = [b for b in self._batches
+                             if not all(f.done() for f in b.futures)]
+            self._batches.append(batch)
+            for job in jobs:
+                self._callbacks[job.id] = job, callback
+
+        for job in jobs:
+            if len(jobs) > 1:
+                # Worker processes cannot use the cached concepts.
+                job = replace(job, scan=None)
+            future = executor.submit(_run_job, job, batch.token, report)
+            future.add_done_callback(partial(self._finish, job))
+            batch.futures.append(future)
+
+        return batch
+
+    def shutdown(self):
+        # Scans and jobs still running are cancelled rather than waited
+        # for, so that closing the window does not hang.
+        with self._lock:
+            batches = list(self._batches)
+            scan_tokens = list(self._scan_tokens)
+        for token in scan_tokens:
+            token.cancel()
+        for batch in batches:
+            batch.cancel()
+        for executor in [self._threads, self._processes]:
+            if executor is not None:
+                executor.shutdown()
+        if self._listener is not None:
+            self._updates.put(None)
+            self._listener.join()
+            self._manager.shutdown()
+
+    def _thread_pool(self) -> "ThreadPoolExecutor":
+        with self._lock:
+            if self._threads is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._threads = ThreadPoolExecutor(
+                    self._workers, thread_name_prefix="converter")
+            return self._threads
+
+    def _process_pool(self) -> tuple["ProcessPoolExecutor", Any]:
+        with self._lock:
+            if self._processes is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # Spawned workers do not inherit the GUI's threads.
+                context = multiprocessing.get_context("spawn")
+                self._manager = context.Manager()
+                self._updates = self._manager.Queue()
+                self._processes = ProcessPoolExecutor(
+                    self._workers, mp_context=context)
+                self._listener = Thread(target=self._listen, daemon=True)
+                self._listener.start()
+            return self._processes, self._updates
+
+    def _listen(self):
+        while (update := self._updates.get()) is not None:
+            self._report(update)
+
+    def _report(self, update):
+        job_id, progress = update
+        with self._lock:
+            job, callback = self._callbacks.get(job_id, (None, None))
+        if callback is not None:
+            self._dispatcher.submit(
+                callback, JobState(job, JobStatus.RUNNING, progress))
+
+    def _finish(self, job, future):
+        with self._lock:
+            _, callback = self._callbacks.pop(job.id)
+
+        if future.cancelled():
+            state = JobState(job, JobStatus.CANCELLED)
+        elif isinstance(future.exception(), ConversionCancelled):
+            state = JobState(job, JobStatus.CANCELLED)
+        elif future.exception() is not None:
+            state = JobState(job, JobStatus.FAILED,
+                             error=future.exception())
+        else:
+            state = JobState(job, JobStatus.DONE, count=future.result())
+        self._dispatcher.submit(callback, state)
+
+
+def _run_job(job: Job, cancel: CancellationToken, report) -> int:
+    # Runs on a worker thread or in a worker process. The job id is
+    # reported with no progress when the job starts.
+    report((job.id, None))
+    cancel.check()
+
+    def on_progress(progress):
+        report((job.id, progress))
 
-        self._dispatcher.submit(callback, count, error)
+    scan = job.scan
+    if scan is not None and scan.cached is not None and scan.is_current():
+        from .prescan import convert_scanned
+        return convert_scanned(scan, job.output_path, progress=on_progress,
+                               cancel=cancel)
+    else:
+        from .converter import convert_file
+        return convert_file(job.input_path, job.output_path,
+                            progress=on_progress, cancel=cancel)
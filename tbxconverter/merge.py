@@ -0,0 +1,229 @@
+import argparse
+import heapq
+import pickle
+import sys
+import tempfile
+from contextlib import ExitStack, closing
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Generator, Iterable, Iterator, Optional, Sequence
+
+from .compression import open_input, open_output
+from .converter import convert_concept
+from .tbx_writer import TermEntry, write_tbx_file
+from .trados_reader import Concept, read_trados_file, parse_date
+
+POLICIES = ["first", "last", "latest", "error"]
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+MAX_OPEN_RUNS = 64
+
+# Approximate size of a buffered record besides its pickled bytes: the
+# key tuple, the record tuple and the list slot.
+RECORD_OVERHEAD = 200
+
+_NO_DATE = datetime.min.replace(tzinfo=timezone.utc)
+
+
+class MergeConflictError(ValueError):
+    pass
+
+
+@dataclass
+class MergeStats:
+    concepts_read: int = 0
+    concepts_written: int = 0
+    conflicts: int = 0
+    runs: int = 0
+
+
+def merge_files(input_paths: Sequence[Path], stream, policy="first",
+                id_prefixes: Optional[Sequence[Optional[str]]] = None,
+                memory_budget=DEFAULT_MEMORY_BUDGET,
+                tmp_dir=None) -> MergeStats:
+    # Each input is sorted by concept id in runs of at most
+    # memory_budget bytes, spilled to disk, and the runs of all inputs
+    # are merged into one stream. Concepts with the same id and the
+    # same prefix are resolved by the policy: keep the first or last
+    # input's version, the one with the latest transaction, or fail.
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown merge policy {policy!r}")
+    if id_prefixes is None:
+        id_prefixes = [None] * len(input_paths)
+    elif len(id_prefixes) != len(input_paths):
+        raise ValueError("Expected one id prefix per input")
+
+    stats = MergeStats()
+    with tempfile.TemporaryDirectory(prefix="tbxmerge-",
+                                     dir=tmp_dir) as tmp:
+        runs = _RunWriter(Path(tmp), memory_budget)
+        for source, input_path in enumerate(input_paths):
+            with open(input_path, "rb") as raw, open_input(raw) as f:
+                for seq, concept in enumerate(read_trados_file(f)):
+                    runs.add((concept.id, source, seq), concept)
+                    stats.concepts_read += 1
+        runs.spill()
+        stats.runs = len(runs.paths)
+
+        with ExitStack() as stack:
+            records = _merge_runs(runs, stack)
+            entries = _resolve(records, policy, list(map(str, input_paths)),
+                               id_prefixes, stats)
+            stats.concepts_written = write_tbx_file(stream, entries)
+
+    return stats
+
+
+class _RunWriter:
+    def __init__(self, directory: Path, memory_budget: int):
+        self.paths: list[Path] = []
+        self._directory = directory
+        self._budget = memory_budget
+        self._records: list[tuple[tuple, bytes]] = []
+        self._size = 0
+
+    def add(self, key: tuple, concept: Concept):
+        # Buffering pickled bytes rather than objects keeps the memory
+        # use close to what is counted against the budget.
+        data = pickle.dumps((key, concept), pickle.HIGHEST_PROTOCOL)
+        self._records.append((key, data))
+        self._size += len(data) + RECORD_OVERHEAD
+        if self._size >= self._budget:
+            self.spill()
+
+    def spill(self):
+        if not self._records:
+            return
+        self._records.sort(key=itemgetter(0))
+        with open(self.new_path(), "wb") as f:
+            f.writelines(data for _, data in self._records)
+        self._records.clear()
+        self._size = 0
+
+    def new_path(self) -> Path:
+        self.paths.append(self._directory / f"run-{len(self.paths):05d}")
+        return self.paths[-1]
+
+
+def _read_run(path: Path) -> Generator[tuple, None, None]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _merge_runs(runs: _RunWriter, stack: ExitStack) -> Iterator[tuple]:
+    # Merges in several passes if there are too many runs to keep open.
+    paths = list(runs.paths)
+    while len(paths) > MAX_OPEN_RUNS:
+        batch, paths = paths[:MAX_OPEN_RUNS], paths[MAX_OPEN_RUNS:]
+        merged = runs.new_path()
+        with open(merged, "wb") as f:
+            for record in heapq.merge(*map(_read_run, batch),
+                                      key=itemgetter(0)):
+                pickle.dump(record, f, pickle.HIGHEST_PROTOCOL)
+        for path in batch:
+            path.unlink()
+        paths.append(merged)
+
+    readers = [stack.enter_context(closing(_read_run(path)))
+               for path in paths]
+    return heapq.merge(*readers, key=itemgetter(0))
+
+
+def _resolve(records: Iterable[tuple], policy: str, sources: list[str],
+             id_prefixes: Sequence[Optional[str]],
+             stats: MergeStats) -> Iterator[TermEntry]:
+    for concept_id, group in groupby(records, key=lambda r: r[0][0]):
+        # Inputs with different prefixes give distinct concepts.
+        by_prefix: dict[Optional[str], list[tuple[int, Concept]]] = {}
+        for (_, source, _), concept in group:
+            by_prefix.setdefault(id_prefixes[source], []).append(
+                (source, concept))
+
+        for prefix, versions in by_prefix.items():
+            if len(versions) > 1:
+                stats.conflicts += len(versions) - 1
+                if policy == "error":
+                    names = ", ".join(sorted({sources[source]
+                                              for source, _ in versions}))
+                    raise MergeConflictError(
+                        f"Concept {concept_id} occurs {len(versions)} "
+                        f"times, in {names}")
+            yield convert_concept(_choose(versions, policy), prefix)
+
+
+def _choose(versions: list[tuple[int, Concept]], policy: str) -> Concept:
+    if policy == "last":
+        return versions[-1][1]
+    elif policy == "latest":
+        # max() keeps the first of equally recent versions.
+        return max(versions, key=lambda v: _last_changed(v[1]))[1]
+    else:
+        return versions[0][1]
+
+
+def _last_changed(concept: Concept) -> datetime:
+    transactions = [*concept.transactions,
+                    *(t for lang in concept.languages
+                      for term in lang.terms
+                      for t in term.transactions)]
+    return max((parse_date(t.date) for t in transactions), default=_NO_DATE)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge MultiTerm XML exports into one TBX file, "
+        "sorted and deduplicated by concept id, without loading them "
+        "into memory.")
+    parser.add_argument("inputs", type=Path, nargs="+",
+                        help="XML exports, optionally compressed")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="write to this file instead of stdout, "
+                        "compressed according to its extension")
+    parser.add_argument("--policy", choices=POLICIES, default="first",
+                        help="which version of a duplicated concept to "
+                        "keep: from the first or last input listing it, "
+                        "the most recently changed, or none and fail "
+                        "(default: first)")
+    parser.add_argument("--id-prefix", action="append",
+                        help="concept id prefix, given once per input in "
+                        "the same order; use an empty string for none")
+    parser.add_argument("--memory", type=int, default=64,
+                        help="MB of concepts to sort in memory before "
+                        "spilling to disk (default: 64)")
+    parser.add_argument("--tmp-dir", type=Path,
+                        help="directory for spill files")
+    args = parser.parse_args()
+
+    id_prefixes = None
+    if args.id_prefix is not None:
+        if len(args.id_prefix) != len(args.inputs):
+            parser.error("give --id-prefix once per input")
+        id_prefixes = [prefix or None for prefix in args.id_prefix]
+
+    try:
+        with ExitStack() as stack:
+            if args.output:
+                stream = stack.enter_context(open_output(args.output))
+            else:
+                stream = sys.stdout.buffer
+            stats = merge_files(args.inputs, stream, args.policy,
+                                id_prefixes, args.memory * 1024 * 1024,
+                                args.tmp_dir)
+    except MergeConflictError as ex:
+        if args.output:
+            args.output.unlink()
+        sys.exit(f"error: {ex}")
+
+    print(f"Read {stats.concepts_read} concepts, wrote "
+          f"{stats.concepts_written}, {stats.conflicts} duplicates "
+          f"dropped, {stats.runs} sorted runs", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
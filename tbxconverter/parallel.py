@@ -0,0 +1,93 @@
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+from .converter import trados_to_tbx
+from .splitting import scan_layout, iter_chunks, read_fragment
+from .record_writer import get_record_renderer, write_record_header
+from .tbx_writer import render_term_entry
+from .tbx_writer import write_tbx_header, write_tbx_footer
+from .trados_reader import read_trados_file
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def convert_parallel(input_path: Path, stream, jobs: int,
+                     chunk_size=DEFAULT_CHUNK_SIZE,
+                     concept_filter=None, output_format="tbx") -> int:
+    count = 0
+    if output_format == "tbx":
+        write_tbx_header(stream)
+    else:
+        write_record_header(stream, output_format)
+    for chunk_count, fragments in iter_converted_chunks(
+            input_path, jobs, chunk_size, concept_filter,
+            output_format=output_format):
+        stream.write(b"".join(fragments))
+        count += chunk_count
+    if output_format == "tbx":
+        write_tbx_footer(stream)
+    return count
+
+
+def iter_converted_chunks(input_path: Path, jobs: int,
+                          chunk_size=DEFAULT_CHUNK_SIZE, concept_filter=None,
+                          per_entry=False,
+                          output_format="tbx") -> Iterator[tuple[int, list]]:
+    # Yields the entry count and rendered entries of each chunk, in
+    # input order. The entries of a chunk come as a single joined
+    # fragment unless per_entry is set.
+    with open(input_path, "rb") as f:
+        layout = None
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                layout = scan_layout(data)
+                if layout:
+                    prolog = data[:layout.body_start]
+                    epilog = data[layout.body_end:]
+                    chunks = list(iter_chunks(data, layout, chunk_size))
+
+        if layout is None:
+            render = _get_renderer(output_format)
+            for entry in trados_to_tbx(
+                    read_trados_file(f, concept_filter=concept_filter)):
+                yield 1, [render(entry)]
+            return
+
+    # Surface a bad root element or broken prolog before starting workers.
+    for _ in read_fragment(prolog, b"", epilog):
+        pass
+
+    with ProcessPoolExecutor(jobs) as executor:
+        pending: deque = deque()
+        for start, end in chunks:
+            pending.append(executor.submit(
+                _convert_chunk, input_path, prolog, epilog, start, end,
+                concept_filter, per_entry, output_format))
+            # Keep a bounded number of finished fragments in memory.
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def _convert_chunk(input_path, prolog, epilog, start, end, concept_filter,
+                   per_entry, output_format):
+    with open(input_path, "rb") as f:
+        f.seek(start)
+        body = f.read(end - start)
+
+    concepts = read_fragment(prolog, body, epilog, concept_filter)
+    render = _get_renderer(output_format)
+    entries = [render(entry) for entry in trados_to_tbx(concepts)]
+    return len(entries), entries if per_entry else [b"".join(entries)]
+
+
+def _get_renderer(output_format):
+    if output_format == "tbx":
+        return render_term_entry
+    return get_record_renderer(output_format)
@@ -0,0 +1,239 @@
+import threading
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from queue import Empty, Full, Queue
+from typing import Iterator, Optional
+
+from .converter import convert_concept
+from .progress import track_progress
+from .tbx_writer import WRITE_BUFFER_SIZE, render_term_entry
+from .tbx_writer import write_tbx_footer, write_tbx_header
+from .trados_reader import Concept, ExpatConceptParser
+
+READ_AHEAD_SIZE = 1024 * 1024
+QUEUE_SIZE = 8
+
+# How often a stage waiting on a queue checks whether another stage has
+# failed.
+STOP_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class QueueStats:
+    name: str
+    capacity: int
+    items: int = 0
+    max_depth: int = 0
+    total_depth: int = 0
+    # Time the producer spent blocked on a full queue, and the consumer
+    # on an empty one.
+    put_stall: float = 0.0
+    get_stall: float = 0.0
+
+    @property
+    def mean_depth(self) -> float:
+        return self.total_depth / self.items if self.items else 0.0
+
+
+class Pipeline:
+    # Converts in three stages connected by bounded queues: a reader
+    # thread that reads (and decompresses) ahead in large blocks, the
+    # calling thread that parses, converts and renders, and a writer
+    # thread that writes (and compresses) behind. Full queues hold back
+    # the stage before them. The queue statistics show which stage is
+    # the bottleneck: the one whose input queue stays full and whose
+    # output queue stays empty.
+
+    def __init__(self, read_size=READ_AHEAD_SIZE, queue_size=QUEUE_SIZE,
+                 write_size=WRITE_BUFFER_SIZE):
+        self.read_size = read_size
+        self.queue_size = queue_size
+        self.write_size = write_size
+        self.read_queue = QueueStats("read", queue_size)
+        self.write_queue = QueueStats("write", queue_size)
+        self.seconds = 0.0
+
+    def convert(self, fi, raw, stream, total_bytes, concept_filter=None,
+                output_format="tbx", progress=None, cancel=None,
+                note_cache=None) -> int:
+        # raw is the file under fi, for reporting progress in the same
+        # bytes as total_bytes when the input is compressed.
+        start = time.perf_counter()
+        stop = threading.Event()
+        read_queue = _StageQueue(self.read_queue, stop)
+        write_queue = _StageQueue(self.write_queue, stop)
+        reader = _Stage(stop, self._read, fi, raw, read_queue)
+        writer = _Stage(stop, self._write, write_queue, stream)
+
+        count = 0
+        try:
+            count = self._convert(read_queue, write_queue, total_bytes,
+                                  concept_filter, output_format, progress,
+                                  cancel, note_cache)
+            write_queue.put(None)
+        except _Stopped:
+            # Raised below, as the error of the stage that stopped.
+            pass
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            reader.join()
+            writer.join()
+            self.seconds += time.perf_counter() - start
+
+        reader.check()
+        writer.check()
+        return count
+
+    def format_report(self) -> str:
+        lines = [f"{'queue':<6} {'items':>7} {'mean':>6} {'max':>4} "
+                 f"{'put stall':>10} {'get stall':>10}"]
+        for stats in [self.read_queue, self.write_queue]:
+            lines.append(f"{stats.name:<6} {stats.items:7d} "
+                         f"{stats.mean_depth:6.2f} "
+                         f"{stats.max_depth:2d}/{stats.capacity:<2d}"
+                         f"{stats.put_stall:9.3f}s {stats.get_stall:9.3f}s")
+        lines.append(f"total {self.seconds:.3f}s")
+        return "\n".join(lines)
+
+    def _read(self, fi, raw, read_queue):
+        while data := fi.read(self.read_size):
+            read_queue.put((data, raw.tell()))
+        read_queue.put(None)
+
+    def _convert(self, read_queue, write_queue, total_bytes,
+                 concept_filter, output_format, progress, cancel,
+                 note_cache) -> int:
+        parser = ExpatConceptParser(concept_filter=concept_filter)
+        position = 0
+
+        def concepts() -> Iterator[Concept]:
+            nonlocal position
+            while (item := read_queue.get()) is not None:
+                data, position = item
+                yield from parser.feed(data)
+            yield from parser.close()
+
+        header = BytesIO()
+        if output_format == "tbx":
+            render = render_term_entry
+            write_tbx_header(header)
+        else:
+            from .record_writer import get_record_renderer
+            from .record_writer import write_record_header
+            render = get_record_renderer(output_format)
+            write_record_header(header, output_format)
+
+        items = concepts()
+        if progress is not None or cancel is not None:
+            items = track_progress(items, lambda: position, total_bytes,
+                                   progress, cancel)
+
+        count = 0
+        buffer = [header.getvalue()]
+        buffered = len(buffer[0])
+        for concept in items:
+            data = render(convert_concept(concept, note_cache=note_cache))
+            buffer.append(data)
+            buffered += len(data)
+            count += 1
+            if buffered >= self.write_size:
+                write_queue.put(b"".join(buffer))
+                buffer.clear()
+                buffered = 0
+
+        if output_format == "tbx":
+            footer = BytesIO()
+            write_tbx_footer(footer)
+            buffer.append(footer.getvalue())
+        write_queue.put(b"".join(buffer))
+        return count
+
+    def _write(self, write_queue, stream):
+        while (data := write_queue.get()) is not None:
+            stream.write(data)
+
+
+class _Stopped(Exception):
+    pass
+
+
+class _StageQueue:
+    def __init__(self, stats: QueueStats, stop: threading.Event):
+        self._queue: Queue = Queue(stats.capacity)
+        self._stats = stats
+        self._stop = stop
+
+    def put(self, item):
+        stats = self._stats
+        depth = self._queue.qsize()
+        stats.items += 1
+        stats.total_depth += depth
+        stats.max_depth = max(stats.max_depth,
+                              min(depth + 1, stats.capacity))
+
+        try:
+            self._queue.put_nowait(item)
+            return
+        except Full:
+            pass
+
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    self._queue.put(item, timeout=STOP_POLL_INTERVAL)
+                    return
+                except Full:
+                    if self._stop.is_set():
+                        raise _Stopped() from None
+        finally:
+            stats.put_stall += time.perf_counter() - start
+
+    def get(self):
+        try:
+            return self._queue.get_nowait()
+        except Empty:
+            pass
+
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return self._queue.get(timeout=STOP_POLL_INTERVAL)
+                except Empty:
+                    if self._stop.is_set():
+                        raise _Stopped() from None
+        finally:
+            self._stats.get_stall += time.perf_counter() - start
+
+
+class _Stage:
+    # Runs one stage on its own thread. If it fails, the error is kept
+    # to be raised on the calling thread, and the other stages are told
+    # to stop.
+
+    def __init__(self, stop: threading.Event, target, *args):
+        self._error: Optional[BaseException] = None
+        self._stop = stop
+        self._thread = threading.Thread(target=self._run,
+                                        args=(target, *args))
+        self._thread.start()
+
+    def check(self):
+        if self._error is not None:
+            raise self._error
+
+    def join(self):
+        self._thread.join()
+
+    def _run(self, target, *args):
+        try:
+            target(*args)
+        except _Stopped:
+            pass
+        except BaseException as ex:
+            self._error = ex
+            self._stop.set()
@@ -0,0 +1,131 @@
+import codecs
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .compression import open_input, open_output
+from .converter import trados_to_tbx
+from .progress import ConversionCancelled, track_progress
+from .tbx_writer import write_tbx_file
+from .trados_reader import Concept, ExpatConceptParser, READ_SIZE
+
+# Parsed concepts take about one and a half times the size of the XML,
+# so only exports up to this size are kept in memory for the export.
+CACHE_LIMIT = 64 * 1024 * 1024
+
+# Conversion time relative to the scan, from the read_expat and
+# convert_file benchmark stages. Converting the file reads it again;
+# converting cached concepts leaves only converting and writing.
+CONVERT_FACTOR = 1.6
+CACHED_CONVERT_FACTOR = 0.5
+
+_DECLARED_ENCODING = re.compile(
+    rb"<\?xml[^>]*encoding\s*=\s*[\"']([A-Za-z0-9._-]+)")
+
+
+@dataclass(frozen=True)
+class ScanResult:
+    path: Path
+    size: int
+    mtime_ns: int
+    encoding: str
+    concepts: int
+    languages: tuple[str, ...]
+    terms: int
+    seconds: float
+    cached: Optional[list[Concept]] = field(default=None, repr=False,
+                                            compare=False)
+
+    @property
+    def estimated_seconds(self) -> float:
+        factor = (CACHED_CONVERT_FACTOR if self.cached is not None
+                  else CONVERT_FACTOR)
+        return self.seconds * factor
+
+    def is_current(self) -> bool:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (self.size,
+                                                    self.mtime_ns)
+
+
+def scan_file(input_path: Path, cancel=None,
+              cache_limit=CACHE_LIMIT) -> ScanResult:
+    # Parses the whole export, which also checks that it is well-formed
+    # and has an mtf root, counting as it goes. The concepts are kept
+    # if the uncompressed export is at most cache_limit bytes.
+    start = time.perf_counter()
+    parser = ExpatConceptParser()
+    concepts = terms = 0
+    languages = set()
+    cached: Optional[list[Concept]] = []
+    encoding = None
+
+    with open(input_path, "rb") as raw, open_input(raw) as fi:
+        stat = os.fstat(raw.fileno())
+        while True:
+            if cancel is not None:
+                cancel.check()
+
+            data = fi.read(READ_SIZE)
+            if encoding is None:
+                encoding = _detect_encoding(data)
+            batch = parser.feed(data) if data else parser.close()
+
+            for concept in batch:
+                concepts += 1
+                for language in concept.languages:
+                    languages.add(language.code)
+                    terms += len(language.terms)
+            if cached is not None:
+                cached.extend(batch)
+                if fi.tell() > cache_limit:
+                    cached = None
+
+            if not data:
+                break
+
+    return ScanResult(Path(input_path), stat.st_size, stat.st_mtime_ns,
+                      encoding, concepts, tuple(sorted(languages)), terms,
+                      time.perf_counter() - start, cached)
+
+
+def convert_scanned(scan: ScanResult, output_path: Path, progress=None,
+                    cancel=None) -> int:
+    # Like convert_file, but from the concepts cached by the scan.
+    if scan.cached is None:
+        raise ValueError(f"No concepts were cached for {scan.path}")
+
+    done = 0
+
+    def counted():
+        nonlocal done
+        for concept in scan.cached or ():
+            done += 1
+            yield concept
+
+    def position():
+        return scan.size * done // scan.concepts if scan.concepts else 0
+
+    try:
+        with open_output(output_path) as fo:
+            return write_tbx_file(fo, trados_to_tbx(track_progress(
+                counted(), position, scan.size, progress, cancel)))
+    except ConversionCancelled:
+        os.remove(output_path)
+        raise
+
+
+def _detect_encoding(head: bytes) -> str:
+    if head.startswith(codecs.BOM_UTF8):
+        return "UTF-8"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE,
+                        b"<\0", b"\0<")):
+        return "UTF-16"
+    match = _DECLARED_ENCODING.match(head)
+    return match.group(1).decode("ascii").upper() if match else "UTF-8"
@@ -0,0 +1,180 @@
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Iterable, TypeVar
+
+from .tbx_writer import TermEntry
+
+T = TypeVar("T")
+
+STAGES = ["read", "parse", "convert", "serialize", "write"]
+
+
+class ConversionHooks:
+    def stage(self, name: str, items: Iterable[T]) -> Iterable[T]:
+        return items
+
+    def stream(self, name: str, stream):
+        return stream
+
+    def entry(self, entry: TermEntry):
+        pass
+
+
+class StageProfile(ConversionHooks):
+    # Time is attributed to the innermost active stage only. The
+    # pipeline is pulled from the writer end, so each stage would
+    # otherwise include all the stages before it.
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.counts = Counter()
+        self._stack = []
+        self._last = 0.0
+        self._start = time.perf_counter()
+        self._end = None
+
+    @property
+    def total(self) -> float:
+        end = self._end if self._end is not None else time.perf_counter()
+        return end - self._start
+
+    def finish(self):
+        self._end = time.perf_counter()
+
+    def _enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            self._add(self._stack[-1], now - self._last)
+        self._stack.append(name)
+        self._last = now
+
+    def _exit(self):
+        now = time.perf_counter()
+        self._add(self._stack.pop(), now - self._last)
+        self._last = now
+
+    def _add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def stage(self, name, items):
+        iterator = iter(items)
+        while True:
+            self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            yield item
+
+    def stream(self, name, stream):
+        return _TimedStream(self, name, stream)
+
+    def entry(self, entry):
+        counts = self.counts
+        counts["entries"] += 1
+        for lang in entry.languages:
+            counts["terms"] += len(lang.terms)
+            for term in lang.terms:
+                counts["notes"] += len(term.term_notes)
+                if term.note is not None:
+                    counts["notes"] += 1
+
+    def format_report(self) -> str:
+        total = self.total
+        other = max(total - sum(self.seconds.values()), 0.0)
+        rows = [*self.seconds.items(), ("other", other), ("total", total)]
+
+        lines = [f"{'stage':<10} {'seconds':>9} {'share':>7}"]
+        for name, seconds in rows:
+            share = seconds / total if total else 0.0
+            lines.append(f"{name:<10} {seconds:>9.3f} {share:>7.1%}")
+        lines.append(", ".join(f"{count} {name}"
+                               for name, count in self.counts.items()))
+        return "\n".join(lines)
+
+
+class _TimedStream:
+    def __init__(self, profile, name, stream):
+        self._profile = profile
+        self._name = name
+        self._stream = stream
+
+    def read(self, size=-1):
+        self._profile._enter(self._name)
+        try:
+            data = self._stream.read(size)
+        finally:
+            self._profile._exit()
+        self._profile.counts["bytes read"] += len(data)
+        return data
+
+    def write(self, data):
+        self._profile._enter(self._name)
+        try:
+            result = self._stream.write(data)
+        finally:
+            self._profile._exit()
+        self._profile.counts["bytes written"] += len(data)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class StackSampler:
+    # Samples the stack of the calling thread at a fixed interval and
+    # counts them in the collapsed format read by flame graph tools.
+    # Uses a profiling timer signal where available, since a sampling
+    # thread only gets the GIL when the sampled thread blocks on I/O.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._use_signal = (hasattr(signal, "setitimer") and
+                            threading.current_thread() is
+                            threading.main_thread())
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._previous_handler = None
+
+    def __enter__(self):
+        if self._use_signal:
+            self._previous_handler = signal.signal(
+                signal.SIGPROF, lambda signum, frame: self._sample(frame))
+            signal.setitimer(signal.ITIMER_PROF, self.interval,
+                             self.interval)
+        else:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._use_signal:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler)
+        else:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample(sys._current_frames().get(self._thread_id))
+
+    def _sample(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} "
+                         f"({os.path.basename(code.co_filename)}:"
+                         f"{code.co_firstlineno})")
+            frame = frame.f_back
+        if names:
+            self.stacks[";".join(reversed(names))] += 1
+
+    def write_collapsed(self, stream):
+        for stack, count in sorted(self.stacks.items()):
+            stream.write(f"{stack} {count}\n")
@@ -0,0 +1,87 @@
+import time
+from dataclasses import dataclass
+from threading import Event
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+PROGRESS_INTERVAL = 0.1
+
+
+class ConversionCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    # Takes any event with is_set() and set(), such as a multiprocessing
+    # manager's, to be shared with worker processes.
+    def __init__(self, event=None):
+        self._event = event if event is not None else Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def check(self):
+        if self._event.is_set():
+            raise ConversionCancelled()
+
+
+@dataclass(frozen=True, slots=True)
+class Progress:
+    bytes_read: int
+    total_bytes: int
+    concepts: int
+    elapsed: float
+
+    @property
+    def fraction(self) -> float:
+        if not self.total_bytes:
+            return 0.0
+        return min(self.bytes_read / self.total_bytes, 1.0)
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_read / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        rate = self.bytes_per_second
+        if not rate:
+            return None
+        return max(self.total_bytes - self.bytes_read, 0) / rate
+
+
+def track_progress(
+        items: Iterable[T],
+        position: Callable[[], int],
+        total_bytes: int,
+        callback: Optional[Callable[[Progress], None]] = None,
+        cancel: Optional[CancellationToken] = None,
+        interval=PROGRESS_INTERVAL,
+) -> Iterator[T]:
+    # Reports at most once per interval, plus once at the end, so that
+    # the callback can post each report to the UI thread as it is.
+    start = last = time.monotonic()
+    count = 0
+
+    def report(now):
+        if callback is not None:
+            callback(Progress(position(), total_bytes, count, now - start))
+
+    for item in items:
+        if cancel is not None:
+            cancel.check()
+        yield item
+        count += 1
+        now = time.monotonic()
+        if now - last >= interval:
+            last = now
+            report(now)
+
+    if cancel is not None:
+        cancel.check()
+    report(time.monotonic())
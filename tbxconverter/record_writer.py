@@ -0,0 +1,100 @@
+import json
+import re
+from typing import Iterable
+
+from .tbx_writer import TermEntry, Term, write_buffered
+
+TSV_COLUMNS = ["conceptId", "language", "term", "note", "createdBy",
+               "createdAt", "lastModifiedBy", "lastModifiedAt"]
+
+_encode_json = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"),
+                                check_circular=False).encode
+
+_TSV_SPECIAL = re.compile(r"[\t\n\r\\]")
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n",
+                              "\r": "\\r"})
+
+
+def write_records(stream, terms: Iterable[TermEntry],
+                  output_format="jsonl") -> int:
+    render = get_record_renderer(output_format)
+    write_record_header(stream, output_format)
+    return write_buffered(stream, map(render, terms))
+
+
+def write_record_header(stream, output_format):
+    if output_format == "tsv":
+        stream.write(("\t".join(TSV_COLUMNS) + "\n").encode("utf-8"))
+
+
+def get_record_renderer(output_format):
+    try:
+        return RENDERERS[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format {output_format!r}") \
+            from None
+
+
+# One object per concept, with the descrips as keys, e.g.
+# {"conceptId":"7","languages":[{"language":"EN-GB","terms":[...]}]}.
+def render_jsonl(entry: TermEntry) -> bytes:
+    record: dict = {d.type: d.value for d in entry.descrips}
+    record["languages"] = [
+        {"language": lang.iso_code,
+         "terms": [_term_record(term) for term in lang.terms]}
+        for lang in entry.languages]
+    return (_encode_json(record) + "\n").encode("utf-8")
+
+
+# One object per term, repeating the concept's descrips.
+def render_jsonl_terms(entry: TermEntry) -> bytes:
+    concept = {d.type: d.value for d in entry.descrips}
+    lines = [_encode_json({**concept, "language": lang.iso_code,
+                           **_term_record(term)}) + "\n"
+             for lang in entry.languages
+             for term in lang.terms]
+    return "".join(lines).encode("utf-8")
+
+
+# One row per term. Tabs, line breaks and backslashes in values are
+# written as \t, \n, \r and \\, and repeated notes of one type are
+# joined by a line break.
+def render_tsv(entry: TermEntry) -> bytes:
+    concept_id = next((d.value for d in entry.descrips
+                       if d.type == "conceptId"), "")
+    lines = []
+    for lang in entry.languages:
+        for term in lang.terms:
+            notes: dict = {}
+            for note in term.term_notes:
+                if note.type in notes:
+                    notes[note.type] += "\n" + note.value
+                else:
+                    notes[note.type] = note.value
+            fields = [concept_id, lang.iso_code, term.value,
+                      term.note or "", *(notes.get(column, "")
+                                         for column in TSV_COLUMNS[4:])]
+            lines.append("\t".join(map(_escape_tsv, fields)) + "\n")
+    return "".join(lines).encode("utf-8")
+
+
+# The notes are a list, since a term can have several of one type.
+def _term_record(term: Term) -> dict:
+    record: dict = {"term": term.value, "note": term.note}
+    if term.term_notes:
+        record["termNotes"] = [{"type": note.type, "value": note.value}
+                               for note in term.term_notes]
+    return record
+
+
+def _escape_tsv(text: str) -> str:
+    if _TSV_SPECIAL.search(text):
+        return text.translate(_TSV_ESCAPES)
+    return text
+
+
+RENDERERS = {
+    "jsonl": render_jsonl,
+    "jsonl-terms": render_jsonl_terms,
+    "tsv": render_tsv,
+}
@@ -0,0 +1,452 @@
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .compression import compress_stream, decompress_stream
+from .converter import trados_to_tbx
+from .progress import CancellationToken, ConversionCancelled
+from .progress import track_progress
+from .tbx_writer import write_tbx_file, WRITE_BUFFER_SIZE
+from .trados_reader import read_trados_file
+
+LATENCY_WINDOW = 1000
+
+
+@dataclass(frozen=True)
+class ServerLimits:
+    workers: int = 8
+    max_concurrent: int = 4
+    max_request_bytes: int = 1024 * 1024 * 1024
+    timeout: float = 300.0
+    idle_timeout: float = 5.0
+
+
+class ConversionServer(ThreadingHTTPServer):
+    # Connections are handled on a bounded pool instead of a thread
+    # each, and at most max_concurrent of them convert at a time.
+    # Requests beyond that are turned away rather than queued, so that
+    # clients can retry elsewhere. Keep-alive connections are closed
+    # after idle_timeout without a request, so that idle clients do not
+    # hold on to the pool threads.
+    def __init__(self, address, limits=ServerLimits(), verbose=False):
+        super().__init__(address, ConversionRequestHandler)
+        self.limits = limits
+        self.verbose = verbose
+        self.metrics = Metrics()
+        self.slots = threading.BoundedSemaphore(limits.max_concurrent)
+        self._pool = ThreadPoolExecutor(limits.workers)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self.process_request_thread, request,
+                          client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown()
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.statuses = Counter()
+        self.active = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.concepts = 0
+        self.conversion_seconds = 0.0
+
+    def begin(self):
+        with self._lock:
+            self.active += 1
+
+    def end(self, status, bytes_in, bytes_out, concepts, seconds):
+        with self._lock:
+            self.active -= 1
+            self.statuses[status] += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.concepts += concepts
+            self.conversion_seconds += seconds
+            self._latencies.append(seconds)
+
+    def reject(self, status):
+        with self._lock:
+            self.statuses[status] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "uptime_seconds": time.monotonic() - self._started,
+                "requests": sum(self.statuses.values()),
+                "statuses": {str(k): v for k, v in
+                             sorted(self.statuses.items())},
+                "active": self.active,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "concepts": self.concepts,
+                "concepts_per_second": (
+                    self.concepts / self.conversion_seconds
+                    if self.conversion_seconds else 0.0),
+                "latency_seconds": {
+                    name: _percentile(latencies, p)
+                    for name, p in [("p50", 0.5), ("p90", 0.9),
+                                    ("p99", 0.99), ("max", 1.0)]},
+            }
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: ConversionServer
+
+    def handle_one_request(self):
+        # Waiting for the request line is waiting on an idle connection.
+        self.connection.settimeout(self.server.limits.idle_timeout)
+        super().handle_one_request()
+
+    def parse_request(self):
+        self.connection.settimeout(self.server.limits.timeout)
+        return super().parse_request()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        body = json.dumps(self.server.metrics.snapshot(), indent=2).encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/convert":
+            self.close_connection = True
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        metrics = self.server.metrics
+        if not self.server.slots.acquire(blocking=False):
+            metrics.reject(HTTPStatus.SERVICE_UNAVAILABLE)
+            self.close_connection = True
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE,
+                            explain="Too many concurrent conversions")
+            return
+
+        metrics.begin()
+        start = time.monotonic()
+        status = HTTPStatus.INTERNAL_SERVER_ERROR
+        body = response = None
+        count = 0
+        try:
+            body = self._open_body()
+            response = _ChunkedResponse(self)
+            count = self._convert(body, response)
+            status = HTTPStatus.OK
+        except HTTPError as ex:
+            status = ex.status
+            self._fail(response, status, str(ex))
+        except TimeoutError:
+            status = HTTPStatus.REQUEST_TIMEOUT
+            self._fail(response, status, "Timed out reading the request")
+        except (ET.ParseError, ValueError, EOFError) as ex:
+            status = HTTPStatus.BAD_REQUEST
+            self._fail(response, status, f"Invalid input: {ex}")
+        except ConnectionError:
+            raise
+        except Exception:
+            # Logged with its traceback by the server.
+            self._fail(response, status, "Conversion failed")
+            raise
+        finally:
+            self.server.slots.release()
+            metrics.end(status, body.bytes_read if body else 0,
+                        response.bytes_written if response else 0,
+                        count, time.monotonic() - start)
+
+    def _open_body(self):
+        limits = self.server.limits
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            length = None
+        else:
+            try:
+                length = int(self.headers.get("Content-Length", ""))
+            except ValueError:
+                raise HTTPError(HTTPStatus.LENGTH_REQUIRED,
+                                "Content-Length or chunked transfer "
+                                "encoding required") from None
+            if length > limits.max_request_bytes:
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                f"Request body larger than "
+                                f"{limits.max_request_bytes} bytes")
+        return _RequestBody(self.rfile, length, limits.max_request_bytes)
+
+    def _convert(self, body, response) -> int:
+        token = CancellationToken()
+        timer = threading.Timer(self.server.limits.timeout, token.cancel)
+        timer.start()
+        try:
+            gzip = _accepts_gzip(self.headers.get("Accept-Encoding", ""))
+            if gzip:
+                response.headers.append(("Content-Encoding", "gzip"))
+                stream = compress_stream(response, "gzip")
+            else:
+                stream = response
+
+            trados_data = track_progress(
+                read_trados_file(_Decompressed(body)),
+                lambda: body.bytes_read, 0, cancel=token)
+            count = write_tbx_file(stream, trados_to_tbx(trados_data))
+            body.drain()
+
+            if gzip:
+                stream.close()
+            response.close()
+            return count
+        except ConversionCancelled:
+            raise HTTPError(HTTPStatus.REQUEST_TIMEOUT,
+                            f"Conversion took longer than "
+                            f"{self.server.limits.timeout} s") from None
+        finally:
+            timer.cancel()
+
+    def _fail(self, response, status, message):
+        # The rest of the request body is not read, so the connection
+        # cannot be reused. Once the response has started, all that can
+        # be done is to break it off without the terminating chunk.
+        self.close_connection = True
+        if response is None or not response.committed:
+            self.send_error(status, explain=message)
+        else:
+            self.log_error("Aborted response: %s", message)
+
+
+def _is_corrupt_data(ex) -> bool:
+    # Besides OSError and EOFError, zlib and lzma have errors of their
+    # own, which can only have been raised if they have been imported.
+    if isinstance(ex, (OSError, EOFError)):
+        return True
+    zlib = sys.modules.get("zlib")
+    lzma = sys.modules.get("lzma")
+    return (zlib is not None and isinstance(ex, zlib.error)
+            or lzma is not None and isinstance(ex, lzma.LZMAError))
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    for coding in ["gzip", "x-gzip", "*"]:
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+class _RequestBody(io.RawIOBase):
+    def __init__(self, rfile, length, max_bytes):
+        self._rfile = rfile
+        self._chunked = length is None
+        self._remaining = length or 0
+        self._max_bytes = max_bytes
+        self._eof = False
+        self.bytes_read = 0
+        self.error = None
+
+    def readable(self):
+        return True
+
+    def drain(self):
+        # Skips anything after the document, such as trailing garbage
+        # after a gzip member, so that the connection can be reused.
+        buf = bytearray(WRITE_BUFFER_SIZE)
+        while self.readinto(buf):
+            pass
+
+    def readinto(self, b):
+        try:
+            return self._readinto(b)
+        except Exception as ex:
+            self.error = ex
+            raise
+
+    def _readinto(self, b):
+        if self._eof:
+            return 0
+
+        if self._chunked and not self._remaining:
+            line = self._rfile.readline(1024)
+            size = int(line.split(b";")[0].strip() or b"x", 16)
+            if size == 0:
+                while self._rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+                    pass
+                self._eof = True
+                return 0
+            self._remaining = size
+        elif not self._remaining:
+            self._eof = True
+            return 0
+
+        data = self._rfile.read(min(len(b), self._remaining))
+        if not data:
+            raise EOFError("Request body ended early")
+        b[:len(data)] = data
+        self._remaining -= len(data)
+        self.bytes_read += len(data)
+        if self._chunked and not self._remaining:
+            self._rfile.readline(1024)
+
+        if self.bytes_read > self._max_bytes:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"Request body larger than {self._max_bytes} "
+                            f"bytes")
+        return len(data)
+
+
+class _Decompressed(io.RawIOBase):
+    # The decompressors report corrupt data as OSError, but also pass on
+    # errors in reading the request body, such as timeouts. Only errors
+    # that did not come from the body are taken to be invalid input.
+    def __init__(self, body: _RequestBody):
+        self._body = body
+        self._stream = decompress_stream(body)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        try:
+            return self._stream.readinto(b)
+        except Exception as ex:
+            if ex is self._body.error or not _is_corrupt_data(ex):
+                raise
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            f"Invalid input: {ex}") from ex
+
+
+class _ChunkedResponse:
+    # Holds back the status line until a full buffer is ready, so that
+    # errors in the first part of the input still get a proper status.
+    # Short responses are sent whole, with a Content-Length.
+    def __init__(self, handler, buffer_size=WRITE_BUFFER_SIZE):
+        self.headers = [("Content-Type", "application/x-tbx+xml")]
+        self.committed = False
+        self.bytes_written = 0
+        self._handler = handler
+        self._buffer = []
+        self._buffered = 0
+        self._buffer_size = buffer_size
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        self._buffered += len(data)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self._buffered:
+            return
+        if not self.committed:
+            self._send_headers(("Transfer-Encoding", "chunked"))
+        data = b"".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        self._handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.bytes_written += len(data)
+
+    def close(self):
+        if self.committed:
+            self.flush()
+            self._handler.wfile.write(b"0\r\n\r\n")
+        else:
+            data = b"".join(self._buffer)
+            self._send_headers(("Content-Length", str(len(data))))
+            self._handler.wfile.write(data)
+            self.bytes_written += len(data)
+
+    def _send_headers(self, *extra):
+        handler = self._handler
+        handler.send_response(HTTPStatus.OK)
+        for name, value in self.headers + list(extra):
+            handler.send_header(name, value)
+        handler.end_headers()
+        self.committed = True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve MultiTerm XML to TBX conversion over HTTP. "
+        "POST an export, optionally compressed, to /convert; GET /metrics "
+        "for statistics.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8,
+                        help="threads handling connections")
+    parser.add_argument("--max-concurrent", type=int, default=4,
+                        help="conversions running at the same time")
+    parser.add_argument("--max-size", type=int, default=1024,
+                        help="maximum request body size in MB")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="maximum seconds per conversion")
+    parser.add_argument("--idle-timeout", type=float, default=5,
+                        help="seconds to keep idle connections open")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    args = parser.parse_args()
+
+    limits = ServerLimits(
+        workers=args.workers,
+        max_concurrent=args.max_concurrent,
+        max_request_bytes=args.max_size * 1024 * 1024,
+        timeout=args.timeout,
+        idle_timeout=args.idle_timeout)
+
+    with ConversionServer((args.host, args.port), limits,
+                          verbose=not args.quiet) as server:
+        host, port = server.server_address[:2]
+        print(f"Serving on http://{host}:{port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import threading
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Queue
+
+from .compression import detect_compression, open_input, open_output
+from .compression import strip_compression_suffix
+from .converter import trados_to_tbx
+from .tbx_writer import render_term_entry, write_tbx_shards
+from .trados_reader import read_trados_file
+
+SHARD_QUEUE_SIZE = 16
+
+
+@dataclass(frozen=True)
+class Shard:
+    path: Path
+    count: int
+
+
+def shard_path(output_path: Path, number: int) -> Path:
+    # output.tbx.gz becomes output-0001.tbx.gz, and so on.
+    output_path = Path(output_path)
+    base = strip_compression_suffix(output_path)
+    compression_suffix = output_path.name[len(base.name):]
+    return output_path.with_name(
+        f"{base.stem}-{number:04d}{base.suffix}{compression_suffix}")
+
+
+def convert_file_sharded(input_path: Path, output_path: Path,
+                         max_entries=None, max_bytes=None, jobs=1,
+                         compression=None,
+                         concept_filter=None) -> list[Shard]:
+    paths: list[Path] = []
+
+    if jobs > 1 and detect_compression(input_path) is None:
+        from .parallel import iter_converted_chunks
+        fragments = (fragment for _, chunk in iter_converted_chunks(
+                         input_path, jobs, concept_filter=concept_filter,
+                         per_entry=True)
+                     for fragment in chunk)
+
+        # Shards are handed to writer threads as they fill up, so that
+        # compressing and writing one shard overlaps with converting
+        # the next. zlib, bz2 and lzma release the GIL while working.
+        writers: list[_ShardWriter] = []
+
+        def open_threaded_shard(number):
+            paths.append(shard_path(output_path, number))
+            writers.append(_ShardWriter(paths[-1], compression))
+            return closing(writers[-1])
+
+        try:
+            counts = write_tbx_shards(open_threaded_shard, fragments,
+                                      max_entries, max_bytes)
+        finally:
+            for writer in writers:
+                writer.close()
+            for writer in writers:
+                writer.join()
+    else:
+        @contextmanager
+        def open_shard(number):
+            paths.append(shard_path(output_path, number))
+            with open_output(paths[-1], compression) as stream:
+                yield stream
+
+        with open(input_path, "rb") as raw, open_input(raw) as fi:
+            entries = trados_to_tbx(
+                read_trados_file(fi, concept_filter=concept_filter))
+            counts = write_tbx_shards(open_shard,
+                                      map(render_term_entry, entries),
+                                      max_entries, max_bytes)
+
+    # Shards left over from an earlier, larger conversion would
+    # otherwise look like part of this one.
+    number = len(paths) + 1
+    while shard_path(output_path, number).exists():
+        shard_path(output_path, number).unlink()
+        number += 1
+
+    return [Shard(path, count) for path, count in zip(paths, counts)]
+
+
+class _ShardWriter:
+    def __init__(self, path: Path, compression):
+        self._queue: Queue = Queue(SHARD_QUEUE_SIZE)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        args=(path, compression))
+        self._thread.start()
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(data)
+        return len(data)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+
+    def join(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self, path, compression):
+        done = False
+        try:
+            with open_output(path, compression) as stream:
+                while (data := self._queue.get()) is not None:
+                    stream.write(data)
+                done = True
+        except BaseException as ex:
+            self._error = ex
+            # Keep taking data so that the producer never blocks.
+            while not done:
+                done = self._queue.get() is None
@@ -0,0 +1,112 @@
+import codecs
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Iterable, Iterator, Optional
+
+from .trados_reader import Concept, read_trados_file
+
+TAG_TERMINATORS = (">", "/", " ", "\t", "\r", "\n")
+
+
+@dataclass(frozen=True)
+class ConceptLayout:
+    codec: str
+    body_start: int
+    body_end: int
+
+
+def detect_codec(head: bytes) -> str:
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(b"<\0"):
+        return "utf-16-le"
+    if head.startswith(codecs.BOM_UTF16_BE) or head.startswith(b"\0<"):
+        return "utf-16-be"
+    # The markup we look for is plain ASCII in every other encoding
+    # MultiTerm uses.
+    return "utf-8"
+
+
+class _Markers:
+    def __init__(self, codec):
+        self.unit = len(" ".encode(codec))
+        self.start = "<conceptGrp".encode(codec)
+        self.end = "</conceptGrp>".encode(codec)
+        self.terminators = [c.encode(codec) for c in TAG_TERMINATORS]
+
+    def find_start(self, data, pos, stop):
+        while True:
+            pos = data.find(self.start, pos, stop)
+            if pos < 0:
+                return -1
+            following = pos + len(self.start)
+            if (pos % self.unit == 0
+                    and data[following:following + self.unit]
+                    in self.terminators):
+                return pos
+            pos += self.unit
+
+    def find_end(self, data, pos, stop):
+        while True:
+            pos = data.find(self.end, pos, stop)
+            if pos < 0:
+                return -1
+            if pos % self.unit == 0:
+                return pos + len(self.end)
+            pos += self.unit
+
+    def rfind_end(self, data):
+        stop = len(data)
+        while True:
+            pos = data.rfind(self.end, 0, stop)
+            if pos < 0 or pos % self.unit == 0:
+                return pos if pos < 0 else pos + len(self.end)
+            stop = pos + len(self.end) - 1
+
+
+def scan_layout(data) -> Optional[ConceptLayout]:
+    codec = detect_codec(data[:2])
+    markers = _Markers(codec)
+
+    body_start = markers.find_start(data, 0, len(data))
+    if body_start < 0:
+        return None
+
+    body_end = markers.rfind_end(data)
+    if body_end < body_start:
+        return None
+
+    return ConceptLayout(codec, body_start, body_end)
+
+
+def iter_chunks(data, layout: ConceptLayout,
+                chunk_size: int) -> Iterator[tuple[int, int]]:
+    markers = _Markers(layout.codec)
+    pos = layout.body_start
+
+    while pos < layout.body_end:
+        end = markers.find_end(data, pos + chunk_size, layout.body_end)
+        if end < 0:
+            end = layout.body_end
+        yield pos, end
+        pos = end
+
+
+def iter_concept_ranges(data, layout: ConceptLayout,
+                        start=None) -> Iterator[tuple[int, int]]:
+    markers = _Markers(layout.codec)
+    pos = layout.body_start if start is None else start
+
+    while True:
+        pos = markers.find_start(data, pos, layout.body_end)
+        if pos < 0:
+            return
+        end = markers.find_end(data, pos, layout.body_end)
+        if end < 0:
+            raise ValueError(f"Unterminated conceptGrp at offset {pos}")
+        yield pos, end
+        pos = end
+
+
+def read_fragment(prolog: bytes, body: bytes, epilog: bytes,
+                  concept_filter=None) -> Iterable[Concept]:
+    return read_trados_file(BytesIO(b"".join([prolog, body, epilog])),
+                            concept_filter=concept_filter)
@@ -0,0 +1,43 @@
+import xml.etree.ElementTree as ET
+from typing import Iterator
+
+from .tbx_writer import TermEntry, Term, TermNote, LangSet, Descrip
+
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+def read_tbx_file(stream) -> Iterator[TermEntry]:
+    # Reads the termEntry elements of a martif document one at a time,
+    # discarding each once it has been converted.
+    doc_iterator = ET.iterparse(stream, events=("start", "end"))
+
+    root = next(doc_iterator)[1]
+    if root.tag != "martif":
+        raise ValueError(f"Unexpected root element {root.tag!r}")
+
+    parents = [root]
+    for event, element in doc_iterator:
+        if event == "start":
+            parents.append(element)
+            continue
+
+        parents.pop()
+        if element.tag == "termEntry":
+            yield _read_term_entry(element)
+            parents[-1].clear()
+
+
+def _read_term_entry(element) -> TermEntry:
+    descrips = [Descrip(d.attrib.get("type", ""), d.text or "")
+                for d in element.iterfind("descrip")]
+    languages = [LangSet(lang.attrib.get(XML_LANG, ""),
+                         [_read_term(tig) for tig in lang.iterfind("tig")])
+                 for lang in element.iterfind("langSet")]
+    return TermEntry(descrips, languages)
+
+
+def _read_term(tig) -> Term:
+    return Term(tig.findtext("term") or "",
+                tig.findtext("note") or None,
+                [TermNote(n.attrib.get("type", ""), n.text or "")
+                 for n in tig.iterfind("termNote")])
@@ -1,43 +1,119 @@
-import xml.etree.ElementTree as ET
-from xml.etree.ElementTree import Element, SubElement
 from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
 from typing import Optional, Iterable
 
+WRITE_BUFFER_SIZE = 64 * 1024
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Descrip:
     type: str
     value: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TermNote:
     type: str
     value: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Term:
     value: str
     note: Optional[str]
     term_notes: list[TermNote]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LangSet:
     iso_code: str
     terms: list[Term]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TermEntry:
     descrips: list[Descrip]
     languages: list[LangSet]
 
 
-def write_tbx_file(stream, terms: Iterable[TermEntry], indent="  ") -> int:
-    indent_bytes = indent.encode("utf-8")
+def write_tbx_file(stream, terms: Iterable[TermEntry], indent="  ",
+                   engine="template") -> int:
+    render = _get_renderer(engine)
+    fragments = (render(entry, indent) for entry in terms)
+    return write_tbx_fragments(stream, fragments, indent)
+
+
+def write_tbx_fragments(stream, fragments: Iterable[bytes],
+                        indent="  ") -> int:
+    write_tbx_header(stream, indent)
+    count = write_buffered(stream, fragments)
+    write_tbx_footer(stream, indent)
+    return count
+
+
+def write_buffered(stream, fragments: Iterable[bytes]) -> int:
     count = 0
+    buffer = []
+    buffered = 0
+
+    for data in fragments:
+        buffer.append(data)
+        buffered += len(data)
+        count += 1
+
+        if buffered >= WRITE_BUFFER_SIZE:
+            stream.write(b"".join(buffer))
+            buffer.clear()
+            buffered = 0
+
+    if buffer:
+        stream.write(b"".join(buffer))
+
+    return count
+
+
+def write_tbx_shards(open_shard, fragments: Iterable[bytes], max_entries=None,
+                     max_bytes=None, indent="  ") -> list[int]:
+    # open_shard(n) returns a context manager for the binary stream of
+    # shard n, counting from 1. A shard is closed before an entry that
+    # would take it over either limit, so only a single entry larger
+    # than max_bytes can give a larger shard. Byte sizes are before any
+    # compression.
+    if not max_entries and not max_bytes:
+        raise ValueError("Either max_entries or max_bytes is required")
+
+    overhead = BytesIO()
+    write_tbx_header(overhead, indent)
+    write_tbx_footer(overhead, indent)
+
+    fragments = iter(fragments)
+    pending = next(fragments, None)
+    counts: list[int] = []
+
+    def shard_fragments():
+        nonlocal pending
+        count = 0
+        size = len(overhead.getvalue())
+        while pending is not None:
+            if count and ((max_entries and count >= max_entries) or
+                          (max_bytes and size + len(pending) > max_bytes)):
+                return
+            yield pending
+            count += 1
+            size += len(pending)
+            pending = next(fragments, None)
+
+    while True:
+        with open_shard(len(counts) + 1) as stream:
+            counts.append(write_tbx_fragments(stream, shard_fragments(),
+                                              indent))
+        if pending is None:
+            return counts
+
+
+def write_tbx_header(stream, indent="  "):
+    indent_bytes = indent.encode("utf-8")
 
     stream.write(b'<?xml version="1.0" encoding="utf-8"?>\n')
     stream.write(b'<martif type="TBX">\n')
@@ -46,33 +122,9 @@ def write_tbx_file(stream, terms: Iterable[TermEntry], indent="  ") -> int:
     stream.write(indent_bytes * 2)
     stream.write(b'<body>\n')
 
-    for entry in terms:
-        stream.write(indent_bytes * 3)
-        root = Element("termEntry")
-
-        for desc in entry.descrips:
-            desc_element = SubElement(root, "descrip", {"type": desc.type})
-            desc_element.text = desc.value
-
-        for lang in entry.languages:
-            lang_element = SubElement(root, "langSet",
-                                      {"xml:lang": lang.iso_code})
-            for term in lang.terms:
-                tig = SubElement(lang_element, "tig")
-                SubElement(tig, "term").text = term.value
-                if term.note:
-                    SubElement(tig, "note").text = term.note
 
-                for note in term.term_notes:
-                    note_element = SubElement(
-                        tig, "termNote", {"type": note.type})
-                    note_element.text = note.value
-
-        ET.indent(root, space=indent, level=3)
-        stream.write(ET.tostring(root))
-        stream.write(b'\n')
-
-        count += 1
+def write_tbx_footer(stream, indent="  "):
+    indent_bytes = indent.encode("utf-8")
 
     stream.write(indent_bytes * 2)
     stream.write(b'</body>\n')
@@ -80,4 +132,122 @@ def write_tbx_file(stream, terms: Iterable[TermEntry], indent="  ") -> int:
     stream.write(b'</text>\n')
     stream.write(b'</martif>\n')
 
-    return count
+
+def render_term_entry(entry: TermEntry, indent="  ",
+                      engine="template") -> bytes:
+    return _get_renderer(engine)(entry, indent)
+
+
+def _get_renderer(engine):
+    if engine == "template":
+        return _render_template
+    elif engine == "etree":
+        return _render_etree
+    else:
+        raise ValueError(f"Unknown writer engine {engine!r}")
+
+
+def _render_etree(entry: TermEntry, indent: str) -> bytes:
+    import xml.etree.ElementTree as ET
+    from xml.etree.ElementTree import Element, SubElement
+
+    root = Element("termEntry")
+
+    for desc in entry.descrips:
+        desc_element = SubElement(root, "descrip", {"type": desc.type})
+        desc_element.text = desc.value
+
+    for lang in entry.languages:
+        lang_element = SubElement(root, "langSet",
+                                  {"xml:lang": lang.iso_code})
+        for term in lang.terms:
+            tig = SubElement(lang_element, "tig")
+            SubElement(tig, "term").text = term.value
+            if term.note:
+                SubElement(tig, "note").text = term.note
+
+            for note in term.term_notes:
+                note_element = SubElement(
+                    tig, "termNote", {"type": note.type})
+                note_element.text = note.value
+
+    ET.indent(root, space=indent, level=3)
+    return indent.encode("utf-8") * 3 + ET.tostring(root) + b"\n"
+
+
+# Produces the same bytes as _render_etree: ET.tostring encodes as
+# US-ASCII with character references and writes childless elements
+# without text as "<tag />".
+def _render_template(entry: TermEntry, indent: str) -> bytes:
+    first, i3, i4, i5, i6 = _indentation(indent)
+    esc = _escape_text
+    attr = _escape_attrib
+
+    if not entry.descrips and not entry.languages:
+        return first + b"<termEntry />\n"
+
+    out = ["<termEntry>"]
+    append = out.append
+
+    for desc in entry.descrips:
+        if desc.value:
+            append(f'{i4}<descrip type="{attr(desc.type)}">'
+                   f'{esc(desc.value)}</descrip>')
+        else:
+            append(f'{i4}<descrip type="{attr(desc.type)}" />')
+
+    for lang in entry.languages:
+        if not lang.terms:
+            append(f'{i4}<langSet xml:lang="{attr(lang.iso_code)}" />')
+            continue
+
+        append(f'{i4}<langSet xml:lang="{attr(lang.iso_code)}">')
+        for term in lang.terms:
+            if term.value:
+                append(f"{i5}<tig>{i6}<term>{esc(term.value)}</term>")
+            else:
+                append(f"{i5}<tig>{i6}<term />")
+            if term.note:
+                append(f"{i6}<note>{esc(term.note)}</note>")
+
+            for note in term.term_notes:
+                if note.value:
+                    append(f'{i6}<termNote type="{attr(note.type)}">'
+                           f'{esc(note.value)}</termNote>')
+                else:
+                    append(f'{i6}<termNote type="{attr(note.type)}" />')
+            append(f"{i5}</tig>")
+        append(f"{i4}</langSet>")
+
+    append(f"{i3}</termEntry>\n")
+
+    return first + "".join(out).encode("ascii", "xmlcharrefreplace")
+
+
+@lru_cache(maxsize=8)
+def _indentation(indent: str):
+    return (indent.encode("utf-8") * 3,
+            *("\n" + indent * level for level in range(3, 7)))
+
+
+def _escape_text(text: str) -> str:
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _escape_attrib(text: str) -> str:
+    text = _escape_text(text)
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
@@ -1,8 +1,13 @@
 import sys
+from bisect import bisect_right
 from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Iterable
-import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import Iterable, Mapping, Optional
+
+READ_SIZE = 64 * 1024
+DEFAULT_INTERN_POOL_SIZE = 64 * 1024
 
 
 class TransactionType(Enum):
@@ -10,35 +15,189 @@ class TransactionType(Enum):
     MODIFICATION = "modification"
 
 
-@dataclass(frozen=True)
+class _EmptyMapping(Mapping):
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+    def __repr__(self):
+        return "{}"
+
+    def __reduce__(self):
+        return "NO_DESCRIPTIONS"
+
+
+# Shared by every term without descriptions, which is most of them.
+NO_DESCRIPTIONS: Mapping[str, str] = _EmptyMapping()
+
+
+@dataclass(frozen=True, slots=True)
 class Transaction:
     type: TransactionType
     source: str
     date: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Term:
     text: str
     transactions: list[Transaction]
-    descriptions: dict[str, str] = field(default_factory=dict)
+    descriptions: Mapping[str, str] = field(
+        default_factory=lambda: NO_DESCRIPTIONS)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Language:
     name: str
     code: str
     terms: list[Term]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Concept:
     id: int
     languages: list[Language]
     transactions: list[Transaction]
 
 
-def read_trados_file(stream) -> Iterable[Concept]:
+@dataclass(frozen=True)
+class ConceptFilter:
+    # A concept is kept if its id is in one of the ranges and any of its
+    # own transactions is dated on or after modified_since; concepts
+    # without transactions are kept. Languages match on their code, in
+    # full or on the primary subtag, so "en" matches "EN-GB", and
+    # concepts left without languages are dropped.
+    languages: Optional[frozenset[str]] = None
+    id_ranges: Optional[tuple[tuple[int, int], ...]] = None
+    modified_since: Optional[datetime] = None
+    _range_starts: tuple[int, ...] = field(
+        init=False, repr=False, compare=False, default=())
+
+    def __post_init__(self):
+        if self.languages is not None:
+            object.__setattr__(self, "languages", frozenset(
+                code.lower() for code in self.languages))
+
+        if self.id_ranges is not None:
+            merged = []
+            for first, last in sorted(self.id_ranges):
+                if merged and first <= merged[-1][1] + 1:
+                    if last > merged[-1][1]:
+                        merged[-1] = merged[-1][0], last
+                else:
+                    merged.append((first, last))
+            object.__setattr__(self, "id_ranges", tuple(merged))
+            object.__setattr__(self, "_range_starts",
+                               tuple(first for first, _ in merged))
+
+        since = self.modified_since
+        if since is not None and since.tzinfo is None:
+            object.__setattr__(self, "modified_since",
+                               since.replace(tzinfo=timezone.utc))
+
+    def key(self) -> tuple:
+        # Identifies the filter across processes, where sets have no
+        # stable repr, using only JSON types.
+        since = self.modified_since
+        return (sorted(self.languages or ()),
+                self.languages is None,
+                self.id_ranges,
+                since.isoformat() if since else None)
+
+    def accepts_id(self, concept_id: int) -> bool:
+        if self.id_ranges is None:
+            return True
+        i = bisect_right(self._range_starts, concept_id) - 1
+        return i >= 0 and concept_id <= self.id_ranges[i][1]
+
+    def accepts_language(self, code: str) -> bool:
+        if self.languages is None:
+            return True
+        code = code.lower()
+        return (code in self.languages
+                or code.partition("-")[0] in self.languages)
+
+    def accepts_transactions(self, transactions: list[Transaction]) -> bool:
+        if self.modified_since is None or not transactions:
+            return True
+        return any(parse_date(t.date) >= self.modified_since
+                   for t in transactions)
+
+    def accepts(self, concept: Concept) -> bool:
+        return (self.accepts_id(concept.id)
+                and self.accepts_transactions(concept.transactions)
+                and (self.languages is None or bool(concept.languages)))
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text: str) -> datetime:
+    date = datetime.fromisoformat(text)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def parse_id_range(text: str) -> tuple[int, int]:
+    first, _, last = text.partition("-")
+    return int(first), int(last or first)
+
+
+class InternPool:
+    # Values like transaction sources, dates and language codes repeat
+    # throughout an export, so sharing one copy of each saves memory
+    # when concepts are kept around. New strings are not added once the
+    # pool is full.
+
+    def __init__(self, maxsize=DEFAULT_INTERN_POOL_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._strings = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def intern(self, value: str) -> str:
+        try:
+            value = self._strings[value]
+        except KeyError:
+            self.misses += 1
+            if len(self._strings) < self.maxsize:
+                self._strings[value] = value
+        else:
+            self.hits += 1
+        return value
+
+
+def read_trados_file(stream, backend="iterparse", intern_pool=None,
+                     concept_filter=None) -> Iterable[Concept]:
+    if intern_pool is None:
+        intern_pool = InternPool()
+
+    if backend == "iterparse":
+        return _read_with_iterparse(stream, intern_pool, concept_filter)
+    elif backend == "expat":
+        return _read_with_expat(stream, intern_pool, concept_filter)
+    else:
+        raise ValueError(f"Unknown reader backend {backend!r}")
+
+
+def _read_with_iterparse(stream, intern_pool,
+                         concept_filter) -> Iterable[Concept]:
+    intern = intern_pool.intern
+
     def read_transactions(element):
         transactions = []
 
@@ -53,11 +212,12 @@ def read_trados_file(stream) -> Iterable[Concept]:
 
             transactions.append(Transaction(
                 TransactionType(trans.attrib["type"]),
-                trans.text,
-                trans_date.text))
+                intern(trans.text),
+                intern(trans_date.text)))
 
         return transactions
 
+    import xml.etree.ElementTree as ET
     doc_iterator = ET.iterparse(stream, events=("start", "end"))
 
     root = next(doc_iterator)[1]
@@ -74,11 +234,23 @@ def read_trados_file(stream) -> Iterable[Concept]:
         if concept is None or not concept.text:
             continue
 
+        concept_id = int(concept.text)
+        transactions = read_transactions(concept_grp)
+        if concept_filter is not None and not (
+                concept_filter.accepts_id(concept_id)
+                and concept_filter.accepts_transactions(transactions)):
+            root.clear()
+            continue
+
         languages = []
         for lang_grp in concept_grp.iterfind("languageGrp"):
             lang = lang_grp.find("language")
             if lang is None:
                 continue
+            if (concept_filter is not None
+                    and not concept_filter.accepts_language(
+                        lang.attrib["lang"])):
+                continue
 
             terms = []
             for term_grp in lang_grp.iterfind("termGrp"):
@@ -90,21 +262,258 @@ def read_trados_file(stream) -> Iterable[Concept]:
                 terms.append(Term(
                     term.text,
                     read_transactions(term_grp),
-                    {d.attrib["type"]: d.text
+                    {intern(d.attrib["type"]): d.text
                      for d in descriptions
-                     if d.text}))
+                     if d.text} or NO_DESCRIPTIONS))
 
             languages.append(Language(
-                lang.attrib["type"],
-                lang.attrib["lang"],
+                intern(lang.attrib["type"]),
+                intern(lang.attrib["lang"]),
                 terms))
 
-        yield Concept(int(concept.text), languages,
-                      read_transactions(concept_grp))
+        if (concept_filter is None or concept_filter.languages is None
+                or languages):
+            yield Concept(concept_id, languages, transactions)
 
         root.clear()
 
 
+def _read_with_expat(stream, intern_pool,
+                     concept_filter) -> Iterable[Concept]:
+    parser = ExpatConceptParser(intern_pool, concept_filter)
+
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        yield from parser.feed(data)
+
+    yield from parser.close()
+
+
+class ExpatConceptParser:
+    # Builds concepts straight from expat callbacks, with the same
+    # semantics as the iterparse reader: only the first concept,
+    # language, term, transac and date child counts, and text is what
+    # ElementTree would put in Element.text. Subtrees that the filter
+    # rejects are skipped without building anything.
+
+    def __init__(self, intern_pool=None, concept_filter=None):
+        from xml.parsers import expat
+        if intern_pool is None:
+            intern_pool = InternPool()
+        self._intern = intern_pool.intern
+        self._filter = concept_filter
+        self._parser = expat.ParserCreate(None, "}")
+        self._parser.buffer_text = True
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._frames = []
+        self._concepts = []
+        self._root_seen = False
+
+    def feed(self, data: bytes) -> list[Concept]:
+        self._parse(data, False)
+        return self._take()
+
+    def close(self) -> list[Concept]:
+        self._parse(b"", True)
+        return self._take()
+
+    def _take(self):
+        concepts = self._concepts
+        self._concepts = []
+        return concepts
+
+    def _parse(self, data, final):
+        from xml.parsers import expat
+        try:
+            self._parser.Parse(data, final)
+        except expat.ExpatError as ex:
+            import xml.etree.ElementTree as ET
+            err = ET.ParseError(expat.ErrorString(ex.code) +
+                                f": line {ex.lineno}, column {ex.offset}")
+            err.code = ex.code
+            err.position = ex.lineno, ex.offset
+            raise err from None
+
+    def _start(self, name, attrs):
+        frames = self._frames
+        parent = frames[-1] if frames else None
+        kind = type(parent)
+        frame = None
+
+        if not self._root_seen:
+            self._root_seen = True
+            if name != "mtf":
+                tag = "{" + name if "}" in name else name
+                raise ValueError(f"Unexpected root element {tag!r}")
+
+        if kind is _Text:
+            # Element.text ends where the first child element starts.
+            self._parser.CharacterDataHandler = None
+
+        if name == "conceptGrp":
+            frame = _ConceptGrp()
+        elif parent is None:
+            pass
+        elif kind is _ConceptGrp:
+            if name == "concept":
+                if parent.id is None:
+                    parent.id = ""
+                    frame = _Text(parent, "id")
+            elif parent.skip:
+                # Known empty or filtered out: skip building its contents.
+                pass
+            elif name == "languageGrp":
+                # Transactions may still follow, so the transaction filter
+                # is applied once the whole concept has been read.
+                frame = _LanguageGrp(parent)
+            elif name == "transacGrp":
+                frame = _TransacGrp(parent)
+        elif kind is _LanguageGrp:
+            if parent.skip:
+                pass
+            elif name == "termGrp":
+                frame = _TermGrp(parent)
+            elif name == "language" and parent.attrs is None:
+                parent.attrs = attrs
+                if (self._filter is not None
+                        and not self._filter.accepts_language(
+                            attrs["lang"])):
+                    parent.skip = True
+        elif kind is _TermGrp:
+            if name == "term":
+                if parent.text is None:
+                    parent.text = ""
+                    frame = _Text(parent, "text")
+            elif name == "transacGrp":
+                frame = _TransacGrp(parent)
+            elif name == "descripGrp":
+                frame = _DescripGrp(parent)
+        elif kind is _TransacGrp:
+            if name == "transac":
+                if parent.transac is None:
+                    parent.transac = ""
+                    parent.attrs = attrs
+                    frame = _Text(parent, "transac")
+            elif name == "date" and parent.date is None:
+                parent.date = ""
+                frame = _Text(parent, "date")
+        elif kind is _DescripGrp and name == "descrip":
+            frame = _Text(parent, "", attrs)
+
+        if type(frame) is _Text:
+            # Only text we keep is worth a Python callback.
+            self._parser.CharacterDataHandler = frame.parts.append
+
+        frames.append(frame)
+
+    def _end(self, name):
+        frame = self._frames.pop()
+        if frame is None:
+            return
+
+        kind = type(frame)
+        if kind is _Text:
+            self._parser.CharacterDataHandler = None
+            text = "".join(frame.parts)
+            owner = frame.owner
+            if type(owner) is _DescripGrp:
+                if text:
+                    key = self._intern(frame.attrs["type"])
+                    owner.owner.descriptions[key] = text
+            else:
+                setattr(owner, frame.field, text)
+                if type(owner) is _ConceptGrp:
+                    owner.skip = not text or (
+                        self._filter is not None
+                        and not self._filter.accepts_id(int(text)))
+        elif kind is _TransacGrp:
+            if frame.transac and frame.date:
+                frame.owner.transactions.append(Transaction(
+                    TransactionType(frame.attrs["type"]),
+                    self._intern(frame.transac),
+                    self._intern(frame.date)))
+        elif kind is _TermGrp:
+            if frame.text:
+                frame.owner.terms.append(Term(
+                    frame.text,
+                    frame.transactions,
+                    frame.descriptions or NO_DESCRIPTIONS))
+        elif kind is _LanguageGrp:
+            if frame.attrs is not None and not frame.skip:
+                frame.owner.languages.append(Language(
+                    self._intern(frame.attrs["type"]),
+                    self._intern(frame.attrs["lang"]),
+                    frame.terms))
+        elif kind is _ConceptGrp:
+            if frame.id and not frame.skip:
+                concept = Concept(
+                    int(frame.id),
+                    frame.languages,
+                    frame.transactions)
+                if self._filter is None or self._filter.accepts(concept):
+                    self._concepts.append(concept)
+
+
+class _Text:
+    __slots__ = ("owner", "field", "attrs", "parts")
+
+    def __init__(self, owner, field, attrs=None):
+        self.owner = owner
+        self.field = field
+        self.attrs = attrs
+        self.parts = []
+
+
+class _ConceptGrp:
+    __slots__ = ("id", "languages", "transactions", "skip")
+
+    def __init__(self):
+        self.id = None
+        self.skip = False
+        self.languages = []
+        self.transactions = []
+
+
+class _LanguageGrp:
+    __slots__ = ("owner", "attrs", "terms", "skip")
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.attrs = None
+        self.skip = False
+        self.terms = []
+
+
+class _TermGrp:
+    __slots__ = ("owner", "text", "transactions", "descriptions")
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.text = None
+        self.transactions = []
+        self.descriptions = {}
+
+
+class _TransacGrp:
+    __slots__ = ("owner", "transac", "date", "attrs")
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.transac = None
+        self.date = None
+        self.attrs = None
+
+
+class _DescripGrp:
+    __slots__ = ("owner",)
+
+    def __init__(self, owner):
+        self.owner = owner
+
+
 def main():
     with open(sys.argv[1], "rb") as f:
         for c in read_trados_file(f):
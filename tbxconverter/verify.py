@@ -0,0 +1,148 @@
+import argparse
+import sys
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .compression import open_input
+from .converter import trados_to_tbx
+from .tbx_reader import read_tbx_file
+from .tbx_writer import TermEntry
+from .trados_reader import read_trados_file
+
+MAX_REPORTED = 100
+
+
+@dataclass(frozen=True)
+class Mismatch:
+    entry: int
+    concept_id: Optional[str]
+    message: str
+
+    def __str__(self):
+        return f"entry {self.entry} (concept {self.concept_id}): " \
+            f"{self.message}"
+
+
+@dataclass
+class VerificationResult:
+    concepts: int = 0
+    entries: int = 0
+    mismatch_count: int = 0
+    mismatches: list[Mismatch] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatch_count
+
+
+def verify_conversion(source, tbx, id_prefix=None, concept_filter=None,
+                      max_reported=MAX_REPORTED) -> VerificationResult:
+    # Converts the source again and compares it with the TBX entry by
+    # entry, in a single pass over both streams. Entries are matched by
+    # position, so a missing entry makes every later one mismatch too;
+    # only the first max_reported mismatches are kept.
+    expected = trados_to_tbx(
+        read_trados_file(source, concept_filter=concept_filter), id_prefix)
+    actual = read_tbx_file(tbx)
+    result = VerificationResult()
+
+    for position, (want, got) in enumerate(
+            zip_longest(expected, actual), start=1):
+        if want is not None:
+            result.concepts += 1
+        if got is not None:
+            result.entries += 1
+        if want == got:
+            continue
+
+        concept_id = _concept_id(want if want is not None else got)
+        for message in _compare(want, got):
+            result.mismatch_count += 1
+            if len(result.mismatches) < max_reported:
+                result.mismatches.append(
+                    Mismatch(position, concept_id, message))
+
+    return result
+
+
+def _concept_id(entry: TermEntry) -> Optional[str]:
+    for descrip in entry.descrips:
+        if descrip.type == "conceptId":
+            return descrip.value
+    return None
+
+
+def _compare(want: Optional[TermEntry],
+             got: Optional[TermEntry]) -> Iterator[str]:
+    if got is None:
+        yield "missing from the TBX"
+        return
+    if want is None:
+        yield "not in the source"
+        return
+
+    if _concept_id(want) != _concept_id(got):
+        yield f"concept id: expected {_concept_id(want)!r}, " \
+            f"found {_concept_id(got)!r}"
+    elif want.descrips != got.descrips:
+        yield "descrips differ"
+
+    want_codes = [lang.iso_code for lang in want.languages]
+    got_codes = [lang.iso_code for lang in got.languages]
+    if want_codes != got_codes:
+        yield f"languages: expected {want_codes}, found {got_codes}"
+        return
+
+    for want_lang, got_lang in zip(want.languages, got.languages):
+        code = want_lang.iso_code
+        want_terms = [term.value for term in want_lang.terms]
+        got_terms = [term.value for term in got_lang.terms]
+        if want_terms != got_terms:
+            yield f"{code} terms: expected {want_terms}, found {got_terms}"
+            continue
+
+        for want_term, got_term in zip(want_lang.terms, got_lang.terms):
+            term = want_term.value
+            if want_term.note != got_term.note:
+                yield f"{code} {term!r} note: expected " \
+                    f"{want_term.note!r}, found {got_term.note!r}"
+            if want_term.term_notes != got_term.term_notes:
+                want_notes = [(n.type, n.value) for n in want_term.term_notes]
+                got_notes = [(n.type, n.value) for n in got_term.term_notes]
+                yield f"{code} {term!r} term notes: expected " \
+                    f"{want_notes}, found {got_notes}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check a TBX file against the MultiTerm XML export it "
+        "was converted from, concept by concept, without loading either "
+        "into memory.")
+    parser.add_argument("source", type=Path,
+                        help="XML export, optionally compressed")
+    parser.add_argument("tbx", type=Path, help="TBX file, optionally "
+                        "compressed")
+    parser.add_argument("--id-prefix",
+                        help="concept id prefix used in the conversion")
+    parser.add_argument("--max-reported", type=int, default=MAX_REPORTED,
+                        help="mismatches to list (default: %(default)s)")
+    args = parser.parse_args()
+
+    with open(args.source, "rb") as source_raw, \
+            open_input(source_raw) as source, \
+            open(args.tbx, "rb") as tbx_raw, \
+            open_input(tbx_raw) as tbx:
+        result = verify_conversion(source, tbx, args.id_prefix,
+                                   max_reported=args.max_reported)
+
+    for mismatch in result.mismatches:
+        print(mismatch)
+    print(f"{result.concepts} concepts, {result.entries} entries, "
+          f"{result.mismatch_count} mismatches", file=sys.stderr)
+    sys.exit(0 if result.ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import xml.etree.ElementTree as ET
+from unittest import TestCase
+from io import BytesIO
+from importlib.resources import files
+
+from tbxconverter.aio import convert_stream
+from tbxconverter.converter import trados_to_tbx
+from tbxconverter.tbx_writer import write_tbx_file
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+async def iter_chunks(data, size, consumed=None):
+    for start in range(0, len(data), size):
+        if consumed is not None:
+            consumed.append(start)
+        await asyncio.sleep(0)
+        yield data[start:start + size]
+
+
+async def join(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+def convert_serially(data, id_prefix=None):
+    buf = BytesIO()
+    write_tbx_file(buf, trados_to_tbx(read_trados_file(BytesIO(data)),
+                                      id_prefix))
+    return buf.getvalue()
+
+
+class AsyncConversionTest(TestCase):
+    def test_matches_serial_output_for_example_files(self):
+        for name in ["sdl-trados-example.xml", "sdl-trados-utf16.xml"]:
+            with self.subTest(name):
+                data = files(__package__).joinpath(
+                    "data/" + name).read_bytes()
+
+                actual = asyncio.run(join(convert_stream(
+                    iter_chunks(data, 7))))
+
+                self.assertEqual(convert_serially(data), actual)
+
+    def test_splits_large_chunks(self):
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(concepts=200))
+        data = buf.getvalue()
+
+        async def convert():
+            chunks = [chunk async for chunk in convert_stream(
+                iter_chunks(data, len(data)), id_prefix="p",
+                chunk_size=4096)]
+            return chunks
+
+        chunks = asyncio.run(convert())
+
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(convert_serially(data, "p"), b"".join(chunks))
+
+    def test_reads_input_only_as_output_is_consumed(self):
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(concepts=200))
+        data = buf.getvalue()
+        consumed = []
+
+        async def convert():
+            conversion = convert_stream(iter_chunks(data, 1024, consumed))
+            async for chunk in conversion:
+                if b"<termEntry" in chunk:
+                    break
+            await conversion.aclose()
+
+        asyncio.run(convert())
+
+        self.assertLess(len(consumed), len(data) // 1024 // 2)
+
+    def test_reads_from_stream_reader(self):
+        data = files(__package__).joinpath(
+            "data/sdl-trados-example.xml").read_bytes()
+
+        async def convert():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await join(convert_stream(reader, chunk_size=100))
+
+        self.assertEqual(convert_serially(data), asyncio.run(convert()))
+
+    def test_multiplexes_conversions(self):
+        outputs = []
+        for seed in range(3):
+            buf = BytesIO()
+            generate_trados_file(buf, CorpusOptions(concepts=50, seed=seed))
+            outputs.append(buf.getvalue())
+
+        async def convert_all():
+            return await asyncio.gather(*(
+                join(convert_stream(iter_chunks(data, 512)))
+                for data in outputs))
+
+        results = asyncio.run(convert_all())
+
+        self.assertEqual([convert_serially(data) for data in outputs],
+                         results)
+
+    def test_raises_parse_errors(self):
+        with self.assertRaises(ET.ParseError):
+            asyncio.run(join(convert_stream(
+                iter_chunks(b"<mtf><conceptGrp></mtf>", 4))))
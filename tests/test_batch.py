@@ -0,0 +1,144 @@
+import gzip
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from importlib.resources import files
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.batch import convert_batch, find_inputs
+from tbxconverter.batch import MANIFEST_NAME
+from tbxconverter.converter import convert_file
+from tbxconverter.trados_reader import ConceptFilter
+
+
+class BatchConversionTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.input_dir = Path(tmp.name) / "in"
+        self.output_dir = Path(tmp.name) / "out"
+        self.input_dir.mkdir()
+
+        example = files(__package__).joinpath(
+            "data/sdl-trados-example.xml").read_bytes()
+        for name in ["a.xml", "b.xml"]:
+            (self.input_dir / name).write_bytes(example)
+
+    def test_converts_all_inputs(self):
+        results = self.convert()
+
+        self.assertEqual(["converted", "converted"],
+                         [r.status for r in results])
+        self.assertEqual([3, 3], [r.count for r in results])
+        self.assertTrue((self.output_dir / "a.tbx").exists())
+        self.assertTrue((self.output_dir / "b.tbx").exists())
+        self.assertTrue((self.output_dir / MANIFEST_NAME).exists())
+
+    def test_converts_with_worker_pool(self):
+        results = self.convert(jobs=2)
+
+        self.assertEqual(["converted", "converted"],
+                         [r.status for r in results])
+        self.assertEqual((self.output_dir / "a.tbx").read_bytes(),
+                         (self.output_dir / "b.tbx").read_bytes())
+
+    def test_skips_unchanged_inputs(self):
+        self.convert()
+        results = self.convert()
+
+        self.assertEqual(["skipped", "skipped"], [r.status for r in results])
+
+    def test_skips_touched_but_identical_inputs(self):
+        self.convert()
+        stat = (self.input_dir / "a.xml").stat()
+        os.utime(self.input_dir / "a.xml",
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        results = self.convert()
+
+        self.assertEqual(["skipped", "skipped"], [r.status for r in results])
+        # The new mtime was saved, so the input is not hashed again.
+        with patch("tbxconverter.batch.file_digest") as file_digest:
+            self.assertEqual(["skipped", "skipped"],
+                             [r.status for r in self.convert()])
+        file_digest.assert_not_called()
+
+    def test_reconverts_changed_inputs(self):
+        self.convert()
+        path = self.input_dir / "b.xml"
+        path.write_bytes(path.read_bytes().replace(b"3000", b"3001"))
+
+        results = self.convert()
+
+        self.assertEqual(["skipped", "converted"],
+                         [r.status for r in results])
+        self.assertIn(b"3001", (self.output_dir / "b.tbx").read_bytes())
+
+    def test_reconverts_missing_outputs_and_changed_options(self):
+        self.convert()
+        (self.output_dir / "a.tbx").unlink()
+
+        self.assertEqual(["converted", "skipped"],
+                         [r.status for r in self.convert()])
+        self.assertEqual(["converted", "converted"],
+                         [r.status for r in self.convert(
+                             options={"jobs": 2})])
+
+    def test_applies_format_compression_and_filter(self):
+        concept_filter = ConceptFilter(id_ranges=((1, 1),))
+        options = {"output_format": "jsonl", "concept_filter": concept_filter}
+
+        results = self.convert(options=options, compression="gzip")
+
+        self.assertEqual(["converted", "converted"],
+                         [r.status for r in results])
+        self.assertEqual([1, 1], [r.count for r in results])
+        expected = self.output_dir / "expected.jsonl"
+        convert_file(self.input_dir / "a.xml", expected, **options)
+        self.assertEqual(expected.read_bytes(), gzip.decompress(
+            (self.output_dir / "a.jsonl.gz").read_bytes()))
+
+        self.assertEqual(["skipped", "skipped"],
+                         [r.status for r in self.convert(
+                             options=options, compression="gzip")])
+        options["concept_filter"] = ConceptFilter(id_ranges=((1, 2),))
+        self.assertEqual(["converted", "converted"],
+                         [r.status for r in self.convert(
+                             options=options, compression="gzip")])
+
+    def test_reports_failures_and_retries_them(self):
+        (self.input_dir / "b.xml").write_bytes(b"<mtf><broken></mtf>")
+
+        results = self.convert()
+        self.assertEqual(["converted", "failed"],
+                         [r.status for r in results])
+        self.assertIn("ParseError", results[1].error)
+        self.assertFalse((self.output_dir / "b.tbx").exists())
+        self.assertFalse((self.output_dir / ".tmp-b.tbx").exists())
+
+        results = self.convert()
+        self.assertEqual(["skipped", "failed"], [r.status for r in results])
+
+    def test_finds_inputs_from_directories_and_globs(self):
+        pattern = str(self.input_dir / "a*.xml")
+
+        inputs = find_inputs([str(self.input_dir), pattern])
+
+        self.assertEqual(["a.xml", "b.xml"], [p.name for p in inputs])
+
+    def test_finds_and_names_compressed_inputs(self):
+        (self.input_dir / "b.xml").rename(self.input_dir / "c.xml")
+        data = (self.input_dir / "c.xml").read_bytes()
+        (self.input_dir / "b.xml.gz").write_bytes(gzip.compress(data))
+
+        results = self.convert()
+
+        self.assertEqual(["a.xml", "b.xml.gz", "c.xml"],
+                         [r.input_path.name for r in results])
+        self.assertEqual((self.output_dir / "a.tbx").read_bytes(),
+                         (self.output_dir / "b.tbx").read_bytes())
+
+    def convert(self, **kwargs):
+        inputs = find_inputs([str(self.input_dir)])
+        return convert_batch(inputs, self.output_dir, **kwargs)
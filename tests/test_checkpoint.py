@@ -0,0 +1,142 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter import checkpoint
+from tbxconverter.checkpoint import checkpoint_path, load_checkpoint
+from tbxconverter.converter import TermNoteCache, convert_file
+from tbxconverter.trados_reader import ConceptFilter
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class Crash(Exception):
+    pass
+
+
+class CheckpointTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+        self.input_path = self.path / "input.xml"
+        with open(self.input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(concepts=100))
+        self.output_path = self.path / "output.tbx"
+
+    def expected(self, **kwargs):
+        expected_path = self.path / "expected.tbx"
+        count = convert_file(self.input_path, expected_path, **kwargs)
+        return count, expected_path.read_bytes()
+
+    def crash_after(self, checkpoints, **kwargs):
+        save = checkpoint.save_checkpoint
+        saved = 0
+
+        def save_then_crash(path, state):
+            nonlocal saved
+            save(path, state)
+            saved += 1
+            if saved == checkpoints:
+                raise Crash()
+
+        with patch.object(checkpoint, "save_checkpoint", save_then_crash):
+            with self.assertRaises(Crash):
+                convert_file(self.input_path, self.output_path, **kwargs)
+
+    def test_matches_uninterrupted_conversion(self):
+        count = convert_file(self.input_path, self.output_path,
+                             checkpoint_every=7)
+
+        self.assertEqual(self.expected(), (count,
+                                           self.output_path.read_bytes()))
+        self.assertFalse(checkpoint_path(self.output_path).exists())
+
+    def test_resumes_after_crash(self):
+        concept_filter = ConceptFilter(languages=frozenset(["EN"]))
+        for kwargs in [{}, {"output_format": "jsonl"},
+                       {"concept_filter": concept_filter},
+                       {"note_cache": TermNoteCache()}]:
+            with self.subTest(**kwargs):
+                self.crash_after(4, checkpoint_every=10, **kwargs)
+                state = load_checkpoint(checkpoint_path(self.output_path))
+                self.assertEqual(40, state.concept_id)
+                self.assertEqual(state.output_length,
+                                 self.output_path.stat().st_size)
+                # Written after the last checkpoint, before the crash.
+                with open(self.output_path, "ab") as f:
+                    f.write(b"<termEntry>half")
+
+                count = convert_file(self.input_path, self.output_path,
+                                     checkpoint_every=10, resume=True,
+                                     **kwargs)
+
+                self.assertEqual(self.expected(**kwargs),
+                                 (count, self.output_path.read_bytes()))
+                self.assertFalse(checkpoint_path(self.output_path).exists())
+
+    def test_resumes_only_from_checkpointed_concepts(self):
+        self.crash_after(2, checkpoint_every=30)
+
+        with patch("tbxconverter.checkpoint.read_fragment",
+                   wraps=checkpoint.read_fragment) as read_fragment:
+            convert_file(self.input_path, self.output_path, resume=True,
+                         checkpoint_every=30)
+
+        # The empty fragment checking the prolog, then concepts 61-90
+        # and 91-100.
+        self.assertEqual(3, read_fragment.call_count)
+        self.assertEqual(self.expected()[1], self.output_path.read_bytes())
+
+    def test_refuses_to_resume_changed_input(self):
+        self.crash_after(1, checkpoint_every=10)
+        os.utime(self.input_path, ns=(0, 0))
+
+        with self.assertRaisesRegex(ValueError, "has changed"):
+            convert_file(self.input_path, self.output_path, resume=True)
+
+    def test_refuses_to_resume_with_other_options(self):
+        self.crash_after(1, checkpoint_every=10)
+
+        with self.assertRaisesRegex(ValueError, "other options"):
+            convert_file(self.input_path, self.output_path, resume=True,
+                         output_format="tsv")
+
+    def test_converts_with_note_cache(self):
+        note_cache = TermNoteCache()
+
+        count = convert_file(self.input_path, self.output_path,
+                             note_cache=note_cache)
+
+        self.assertEqual(self.expected(), (count,
+                                           self.output_path.read_bytes()))
+        self.assertGreater(note_cache.misses, 0)
+
+    def test_starts_over_without_checkpoint(self):
+        self.output_path.write_bytes(b"left over")
+
+        convert_file(self.input_path, self.output_path, resume=True)
+
+        self.assertEqual(self.expected()[1], self.output_path.read_bytes())
+
+    def test_starts_over_without_output(self):
+        self.crash_after(2, checkpoint_every=10)
+        self.output_path.unlink()
+
+        count = convert_file(self.input_path, self.output_path, resume=True,
+                             checkpoint_every=10)
+
+        self.assertEqual(self.expected(), (count,
+                                           self.output_path.read_bytes()))
+        self.assertFalse(checkpoint_path(self.output_path).exists())
+
+    def test_rejects_non_positive_interval(self):
+        with self.assertRaisesRegex(ValueError, "must be positive"):
+            convert_file(self.input_path, self.output_path,
+                         checkpoint_every=0)
+
+    def test_requires_uncompressed_files(self):
+        with self.assertRaisesRegex(ValueError, "uncompressed output"):
+            convert_file(self.input_path, self.path / "output.tbx.gz",
+                         checkpoint_every=10)
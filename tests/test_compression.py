@@ -0,0 +1,118 @@
+import bz2
+import gzip
+import lzma
+import zipfile
+from unittest import TestCase
+from importlib.resources import files
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.compression import detect_compression, open_input
+from tbxconverter.compression import open_output
+from tbxconverter.converter import convert_file
+from tbxconverter.fragment_cache import FragmentCache
+
+COMPRESSORS = {
+    "gz": gzip.compress,
+    "bz2": bz2.compress,
+    "xz": lzma.compress,
+}
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+
+        self.example = files(__package__).joinpath(
+            "data/sdl-trados-example.xml").read_bytes()
+        self.input_path = self.path / "input.xml"
+        self.input_path.write_bytes(self.example)
+        self.expected_path = self.path / "expected.tbx"
+        convert_file(self.input_path, self.expected_path)
+
+    def test_converts_compressed_inputs(self):
+        for suffix, compress in COMPRESSORS.items():
+            with self.subTest(suffix):
+                input_path = self.path / f"input.xml.{suffix}"
+                input_path.write_bytes(compress(self.example))
+                self.assert_converts(input_path)
+
+    def test_converts_zip_member(self):
+        input_path = self.path / "input.zip"
+        with zipfile.ZipFile(input_path, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("readme.txt", "Exported from MultiTerm")
+            z.writestr("export/terms.xml", self.example)
+
+        self.assert_converts(input_path)
+
+    def test_rejects_ambiguous_zip_archive(self):
+        input_path = self.path / "input.zip"
+        with zipfile.ZipFile(input_path, "w") as z:
+            z.writestr("a.xml", self.example)
+            z.writestr("b.xml", self.example)
+
+        with self.assertRaisesRegex(ValueError, "a.xml"):
+            with open_input(input_path):
+                pass
+        with open_input(input_path, member="b.xml") as f:
+            self.assertEqual(self.example, f.read())
+
+    def test_detects_compression_from_content(self):
+        misnamed = self.path / "input.gz"
+        misnamed.write_bytes(lzma.compress(self.example))
+        plain = self.path / "plain.xml.gz"
+        plain.write_bytes(self.example)
+
+        self.assertEqual("xz", detect_compression(misnamed))
+        self.assertIsNone(detect_compression(plain))
+        self.assert_converts(misnamed)
+        self.assert_converts(plain)
+
+    def test_compresses_output_according_to_extension(self):
+        decompressors = {
+            "gz": gzip.decompress,
+            "bz2": bz2.decompress,
+            "xz": lzma.decompress,
+        }
+        for suffix, decompress in decompressors.items():
+            with self.subTest(suffix):
+                output_path = self.path / f"output.tbx.{suffix}"
+                self.assertEqual(3, convert_file(self.input_path,
+                                                 output_path))
+                self.assertEqual(self.expected_path.read_bytes(),
+                                 decompress(output_path.read_bytes()))
+
+    def test_gzip_output_is_reproducible(self):
+        outputs = []
+        for name in ["a.tbx.gz", "b.tbx.gz"]:
+            with open_output(self.path / name) as f:
+                f.write(b"<tbx/>")
+            outputs.append((self.path / name).read_bytes())
+
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_leaves_existing_zip_output_unchanged(self):
+        output_path = self.path / "output.zip"
+        output_path.write_bytes(b"existing archive")
+
+        with self.assertRaisesRegex(ValueError, "Unsupported output"):
+            convert_file(self.input_path, output_path)
+        self.assertEqual(b"existing archive", output_path.read_bytes())
+
+    def test_parallel_and_cached_modes_accept_compressed_input(self):
+        input_path = self.path / "input.xml.gz"
+        input_path.write_bytes(gzip.compress(self.example))
+
+        self.assert_converts(input_path, jobs=2)
+        for _ in range(2):
+            with FragmentCache(self.path / "cache.db") as cache:
+                self.assert_converts(input_path, cache=cache)
+        self.assertEqual(3, cache.hits)
+
+    def assert_converts(self, input_path, **kwargs):
+        output_path = self.path / "output.tbx"
+        self.assertEqual(3, convert_file(input_path, output_path, **kwargs))
+        self.assertEqual(self.expected_path.read_bytes(),
+                         output_path.read_bytes())
@@ -0,0 +1,97 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from importlib.resources import files
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.concept_index import ConceptIndex, StaleIndexError
+from tbxconverter.concept_index import open_index, read_concepts
+from tbxconverter.concept_index import index_path_for, parse_id_range
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class ConceptIndexTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+        self.input_path = self.path / "input.xml"
+
+    def generate(self, **options):
+        with open(self.input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(**options))
+        with open(self.input_path, "rb") as f:
+            return {c.id: c for c in read_trados_file(f)}
+
+    def test_reads_selected_concepts(self):
+        for encoding in ["utf-8", "utf-16"]:
+            with self.subTest(encoding):
+                concepts = self.generate(concepts=200, encoding=encoding)
+                ConceptIndex.build(self.input_path).save(
+                    index_path_for(self.input_path))
+
+                index = ConceptIndex.load(index_path_for(self.input_path))
+                actual = list(read_concepts(
+                    self.input_path, [(150, 150), (10, 12), (11, 11)],
+                    index))
+
+                self.assertEqual(200, len(index))
+                self.assertEqual([concepts[i] for i in [10, 11, 12, 150]],
+                                 actual)
+
+    def test_reads_example_files(self):
+        for name in ["sdl-trados-example.xml", "sdl-trados-utf16.xml"]:
+            with self.subTest(name):
+                data = files(__package__).joinpath("data/" + name)
+                self.input_path.write_bytes(data.read_bytes())
+                with open(self.input_path, "rb") as f:
+                    expected = list(read_trados_file(f))
+
+                actual = list(read_concepts(self.input_path,
+                                            [(0, 10**9)]))
+
+                self.assertEqual(expected, actual)
+
+    def test_finds_ids_that_need_parsing(self):
+        self.input_path.write_bytes(
+            b"<mtf><conceptGrp><concept>&#49;2</concept></conceptGrp>"
+            b"<conceptGrp><concept/></conceptGrp>"
+            b"<conceptGrp><concept> 7 </concept></conceptGrp></mtf>")
+
+        index = ConceptIndex.build(self.input_path)
+
+        self.assertEqual([7, 12], list(index.ids))
+        self.assertEqual([], list(read_concepts(self.input_path, [(8, 11)],
+                                                index)))
+
+    def test_rebuilds_stale_index(self):
+        self.generate(concepts=20)
+        self.assertEqual(20, len(open_index(self.input_path)))
+
+        self.generate(concepts=30)
+        with self.assertRaises(StaleIndexError):
+            open_index(self.input_path, rebuild=False)
+        self.assertEqual(30, len(open_index(self.input_path)))
+
+    def test_accepts_touched_but_identical_input(self):
+        self.generate(concepts=20)
+        open_index(self.input_path)
+        stat = self.input_path.stat()
+        os.utime(self.input_path,
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        index = open_index(self.input_path, rebuild=False)
+
+        self.assertEqual(20, len(index))
+        # The new mtime is saved, so the export is not hashed again.
+        saved = ConceptIndex.load(index_path_for(self.input_path))
+        self.assertEqual(stat.st_mtime_ns + 10**9, saved.mtime_ns)
+        with patch("hashlib.file_digest") as file_digest:
+            open_index(self.input_path, rebuild=False)
+        file_digest.assert_not_called()
+
+    def test_parses_id_ranges(self):
+        self.assertEqual((42, 42), parse_id_range("42"))
+        self.assertEqual((100, 200), parse_id_range("100-200"))
@@ -12,7 +12,7 @@ from tbxconverter.tbx_writer import TermEntry, LangSet
 from tbxconverter.tbx_writer import TermNote, Descrip
 from tbxconverter.tbx_writer import Term as TbxTerm
 from tbxconverter.tbx_writer import write_tbx_file
-from tbxconverter.converter import trados_to_tbx
+from tbxconverter.converter import TermNoteCache, trados_to_tbx
 
 ORIGINATION = TransactionType.ORIGINATION
 MODIFICATION = TransactionType.MODIFICATION
@@ -153,6 +153,33 @@ class ConverterTest(TestCase):
 
         self.assertEqual(expected, list(trados_to_tbx(trados_data)))
 
+    def test_shares_term_notes_of_repeated_transactions(self) -> None:
+        imported = Transaction(ORIGINATION, "import", "2020-05-01T10:00:00")
+        edited = Transaction(MODIFICATION, "import", "2021-01-01T00:00:00")
+        terms = [TradosTerm(f"term {i}", [imported, edited])
+                 for i in range(3)]
+        trados_data = [Concept(1, [Language("English", "EN", terms)], [])]
+        [uncached] = trados_to_tbx(trados_data)
+        self.assertIsNot(uncached.languages[0].terms[0].term_notes[0],
+                         uncached.languages[0].terms[2].term_notes[0])
+
+        for size in [0, 1, 16]:
+            with self.subTest(size):
+                cache = TermNoteCache(size)
+                [entry] = trados_to_tbx(trados_data, note_cache=cache)
+
+                self.assertEqual(uncached, entry)
+                notes = [term.term_notes for term in entry.languages[0].terms]
+                shared = size > 1
+                self.assertEqual(shared, notes[0][0] is notes[2][0])
+                self.assertEqual(shared, notes[0][3] is notes[2][3])
+                self.assertEqual(min(size, 2), len(cache))
+                self.assertEqual(4 if shared else 0, cache.hits)
+                self.assertEqual(2 if shared else 6, cache.misses)
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
 
 class ExampleFileConverterTest(TestCase):
     trados_xml: bytes
@@ -0,0 +1,114 @@
+from unittest import TestCase
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.converter import trados_to_tbx
+from tbxconverter.fragment_cache import FragmentCache, concept_key
+from tbxconverter.fragment_cache import write_cached_tbx_file
+from tbxconverter.fragment_cache import convert_file_cached
+from tbxconverter.tbx_writer import write_tbx_file
+from tbxconverter.trados_reader import Concept, Language, Term
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_path = Path(tmp.name) / "cache.db"
+
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(concepts=100))
+        buf.seek(0)
+        self.concepts = list(read_trados_file(buf))
+
+    def test_writes_same_output_as_uncached_writer(self):
+        expected = BytesIO()
+        write_tbx_file(expected, trados_to_tbx(self.concepts, "p"))
+
+        for _ in range(2):
+            with FragmentCache(self.cache_path) as cache:
+                actual = BytesIO()
+                count = write_cached_tbx_file(actual, self.concepts, cache,
+                                              id_prefix="p")
+
+            self.assertEqual(100, count)
+            self.assertEqual(expected.getvalue(), actual.getvalue())
+
+    def test_reuses_fragments_of_unchanged_concepts(self):
+        with FragmentCache(self.cache_path) as cache:
+            write_cached_tbx_file(BytesIO(), self.concepts, cache)
+        self.assertEqual((0, 100), (cache.hits, cache.misses))
+
+        changed = list(self.concepts)
+        changed[5] = Concept(changed[5].id, [
+            Language("english", "EN-GB", [Term("new term", [])]),
+        ], changed[5].transactions)
+
+        with FragmentCache(self.cache_path) as cache:
+            buf = BytesIO()
+            write_cached_tbx_file(buf, changed, cache)
+        self.assertEqual((99, 1), (cache.hits, cache.misses))
+        self.assertAlmostEqual(0.99, cache.hit_rate)
+        self.assertIn(b"<term>new term</term>", buf.getvalue())
+
+    def test_converts_files_reusing_unchanged_concepts(self):
+        input_path = self.cache_path.with_name("input.xml")
+        for encoding in ["utf-8", "utf-16"]:
+            with self.subTest(encoding):
+                with open(input_path, "wb") as f:
+                    generate_trados_file(f, CorpusOptions(
+                        concepts=50, encoding=encoding))
+                expected = BytesIO()
+                with open(input_path, "rb") as f:
+                    write_tbx_file(expected,
+                                   trados_to_tbx(read_trados_file(f)))
+
+                for misses in [50, 0]:
+                    with FragmentCache(self.cache_path) as cache:
+                        buf = BytesIO()
+                        count = convert_file_cached(input_path, buf, cache)
+                    self.assertEqual(50, count)
+                    self.assertEqual(misses, cache.misses)
+                    self.assertEqual(expected.getvalue(), buf.getvalue())
+
+    def test_counts_only_concepts_that_produce_entries(self):
+        input_path = self.cache_path.with_name("input.xml")
+        input_path.write_bytes(
+            b"<mtf><conceptGrp><concept/></conceptGrp>"
+            b"<conceptGrp><concept>2</concept></conceptGrp></mtf>")
+
+        for _ in range(2):
+            with FragmentCache(self.cache_path) as cache:
+                buf = BytesIO()
+                self.assertEqual(1, convert_file_cached(input_path, buf,
+                                                        cache))
+            self.assertEqual(1, buf.getvalue().count(b"<termEntry"))
+
+    def test_keys_depend_on_prefix_and_indent(self):
+        concept = self.concepts[0]
+
+        keys = {concept_key(concept),
+                concept_key(concept, id_prefix="p"),
+                concept_key(concept, indent="\t")}
+
+        self.assertEqual(3, len(keys))
+        self.assertEqual(concept_key(concept), concept_key(concept))
+
+    def test_evicts_least_recently_used_fragments(self):
+        with FragmentCache(self.cache_path) as cache:
+            cache.put(b"old", b"x" * 100)
+            cache.put(b"kept", b"x" * 100)
+
+        with FragmentCache(self.cache_path, max_bytes=250) as cache:
+            cache.get(b"kept")
+            cache.put(b"new", b"x" * 100)
+
+        self.assertEqual(1, cache.evictions)
+        with FragmentCache(self.cache_path) as cache:
+            self.assertIsNone(cache.get(b"old"))
+            self.assertIsNotNone(cache.get(b"kept"))
+            self.assertIsNotNone(cache.get(b"new"))
+            self.assertEqual(200, cache.size())
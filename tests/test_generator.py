@@ -0,0 +1,59 @@
+from unittest import TestCase
+from io import BytesIO
+
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class CorpusGeneratorTest(TestCase):
+    def test_generates_readable_utf8_export(self):
+        concepts = self.generate(CorpusOptions(concepts=50, languages=3))
+
+        self.assertEqual(list(range(1, 51)), [c.id for c in concepts])
+        for c in concepts:
+            self.assertEqual(3, len(c.languages))
+            self.assertEqual(2, len(c.transactions))
+            for lang in c.languages:
+                self.assertGreaterEqual(len(lang.terms), 1)
+
+    def test_generates_readable_utf16_export(self):
+        options = CorpusOptions(concepts=20, encoding="utf-16")
+        buf = BytesIO()
+        generate_trados_file(buf, options)
+
+        self.assertTrue(buf.getvalue().startswith(b"\xff\xfe<\x00"))
+        self.assertNotIn("\n".encode("utf-16-le"), buf.getvalue())
+        self.assertEqual(
+            self.generate(CorpusOptions(concepts=20)),
+            self.generate(options))
+
+    def test_generates_at_least_requested_size(self):
+        buf = BytesIO()
+        count = generate_trados_file(
+            buf, CorpusOptions(concepts=1, size=200_000))
+
+        self.assertGreater(count, 1)
+        self.assertGreaterEqual(len(buf.getvalue()), 200_000)
+
+    def test_controls_descriptions_and_transactions(self):
+        concepts = self.generate(CorpusOptions(
+            concepts=20, transaction_rate=0, description_rate=1))
+
+        terms = [t for c in concepts for lang in c.languages
+                 for t in lang.terms]
+        self.assertTrue(all(t.descriptions for t in terms))
+        self.assertFalse(any(t.transactions for t in terms))
+
+    def test_shares_dates_within_import_batches(self):
+        concepts = self.generate(CorpusOptions(concepts=20, import_batch=5))
+
+        dates = [{t.date for t in c.transactions} for c in concepts]
+        self.assertEqual(4, len({frozenset(d) for d in dates}))
+        self.assertEqual(dates[0], dates[4])
+        self.assertNotEqual(dates[4], dates[5])
+
+    def generate(self, options):
+        buf = BytesIO()
+        generate_trados_file(buf, options)
+        buf.seek(0)
+        return list(read_trados_file(buf))
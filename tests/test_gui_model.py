@@ -0,0 +1,377 @@
+import time
+from queue import Queue
+from threading import Event
+from unittest import TestCase
+from unittest.mock import patch
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.converter import convert_file
+from tbxconverter.gui_model import ConverterWindowModel, ConverterService
+from tbxconverter.gui_model import JobBatch, JobState, JobStatus
+from tbxconverter.gui_model import split_selection
+from tbxconverter.prescan import scan_file
+from tbxconverter.progress import CancellationToken, ConversionCancelled
+from tbxconverter.progress import Progress, track_progress
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class QueueDispatcher:
+    def __init__(self):
+        self.queue = Queue()
+
+    def submit(self, fn, *args):
+        self.queue.put((fn, args))
+
+    def run_until(self, predicate):
+        while not predicate():
+            fn, args = self.queue.get(timeout=10)
+            fn(*args)
+
+
+class FakeService:
+    def __init__(self):
+        self.token = CancellationToken()
+        self.callback = None
+        self.jobs = []
+        self.scans = []
+
+    def scan(self, input_path, callback):
+        self.scans.append((CancellationToken(), callback))
+        return self.scans[-1][0]
+
+    def convert_files(self, jobs, callback):
+        self.callback = callback
+        self.jobs = jobs
+        return JobBatch(self.token)
+
+
+class ConverterWindowModelTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+        self.input_path = self.path / "input.xml"
+        with open(self.input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(concepts=200))
+
+    def service(self, dispatcher, **kwargs):
+        service = ConverterService(dispatcher, **kwargs)
+        self.addCleanup(service.shutdown)
+        return service
+
+    def test_reports_progress_and_result(self):
+        dispatcher = QueueDispatcher()
+        model = ConverterWindowModel(self.service(dispatcher))
+        states = []
+        model.add_state_callback(states.append)
+
+        model.load_file(str(self.input_path))
+        model.convert(str(self.path / "output.tbx"))
+        self.assertTrue(states[-1].cancel_enabled)
+        dispatcher.run_until(lambda: states[-1].load_enabled)
+
+        progress = [s.progress for s in states if s.progress is not None]
+        self.assertEqual(200, progress[-1].concepts)
+        self.assertEqual(1.0, progress[-1].fraction)
+        self.assertEqual("Exporterade 200 termer till output.tbx.",
+                         states[-1].status)
+        self.assertFalse(states[-1].cancel_enabled)
+
+    def test_cancels_conversion(self):
+        service = FakeService()
+        model = ConverterWindowModel(service)
+        states = []
+        model.add_state_callback(states.append)
+        model.load_file(str(self.input_path))
+        model.convert(str(self.path / "output.tbx"))
+        [job] = service.jobs
+
+        model.cancel()
+        self.assertTrue(service.token.cancelled)
+        self.assertFalse(states[-1].cancel_enabled)
+        service.callback(JobState(job, JobStatus.RUNNING,
+                                  Progress(10, 100, 1, 1.0)))
+        self.assertEqual("Avbryter...", states[-1].status)
+
+        service.callback(JobState(job, JobStatus.CANCELLED))
+        self.assertEqual("Exporten avbröts.", states[-1].status)
+        self.assertTrue(states[-1].export_enabled)
+
+    def test_scans_opened_file(self):
+        dispatcher = QueueDispatcher()
+        model = ConverterWindowModel(self.service(dispatcher))
+        states = []
+        model.add_state_callback(states.append)
+
+        model.load_file(str(self.input_path))
+        self.assertEqual("Läser input.xml...", states[-1].status)
+        dispatcher.run_until(lambda: "Öppnad" in states[-1].status)
+
+        self.assertRegex(states[-1].status,
+                         r"^Öppnad: input.xml \(UTF-8, 200 termposter, "
+                         r"\d+ termer, 2 språk, export ca \d+ s\)$")
+        self.assertTrue(states[-1].export_enabled)
+
+    def test_reports_invalid_file_when_opened(self):
+        dispatcher = QueueDispatcher()
+        model = ConverterWindowModel(self.service(dispatcher))
+        states = []
+        alerts = []
+        model.add_state_callback(states.append)
+        model.add_alert_callback(alerts.append)
+        for data, status in [(b"<martif/>", "broken.xml kunde inte läsas."),
+                             (b"<mtf></mtf>", "Inga termer fanns i "
+                              "broken.xml.")]:
+            (self.path / "broken.xml").write_bytes(data)
+
+            model.load_file(str(self.path / "broken.xml"))
+            dispatcher.run_until(lambda: not states[-1].status.startswith(
+                "Läser"))
+
+            self.assertEqual(status, states[-1].status)
+            self.assertFalse(states[-1].export_enabled)
+        self.assertEqual(1, len(alerts))
+
+    def test_exports_from_scanned_concepts(self):
+        dispatcher = QueueDispatcher()
+        model = ConverterWindowModel(self.service(dispatcher))
+        states = []
+        model.add_state_callback(states.append)
+        model.load_file(str(self.input_path))
+        dispatcher.run_until(lambda: "Öppnad" in states[-1].status)
+        expected = self.path / "expected.tbx"
+        convert_file(self.input_path, expected)
+
+        with patch("tbxconverter.converter.convert_file") as convert:
+            model.convert(str(self.path / "output.tbx"))
+            dispatcher.run_until(lambda: states[-1].load_enabled)
+
+        convert.assert_not_called()
+        self.assertEqual("Exporterade 200 termer till output.tbx.",
+                         states[-1].status)
+        self.assertEqual(expected.read_bytes(),
+                         (self.path / "output.tbx").read_bytes())
+
+    def test_ignores_superseded_scans(self):
+        service = FakeService()
+        model = ConverterWindowModel(service)
+        states = []
+        model.add_state_callback(states.append)
+
+        model.load_file(str(self.input_path))
+        model.load_file(str(self.path / "other.xml"))
+        first, second = service.scans
+        self.assertTrue(first[0].cancelled)
+        first[1](None, ValueError("stale"))
+        self.assertEqual("Läser other.xml...", states[-1].status)
+
+        model.convert(str(self.path / "output.tbx"))
+        self.assertTrue(second[0].cancelled)
+        self.assertIsNone(service.jobs[0].scan)
+
+    def test_releases_scanned_concepts_after_export(self):
+        service = FakeService()
+        model = ConverterWindowModel(service)
+        states = []
+        model.add_state_callback(states.append)
+        model.load_file(str(self.input_path))
+        [(_, on_scanned)] = service.scans
+        on_scanned(scan_file(self.input_path), None)
+
+        model.convert(str(self.path / "output.tbx"))
+        [job] = service.jobs
+        self.assertIsNotNone(job.scan)
+        service.callback(JobState(job, JobStatus.CANCELLED))
+
+        self.assertIsNone(states[-1].jobs[0].job.scan)
+        model.convert(str(self.path / "output.tbx"))
+        self.assertIsNone(service.jobs[0].scan)
+
+    def test_shutdown_cancels_running_scans(self):
+        dispatcher = QueueDispatcher()
+        service = ConverterService(dispatcher)
+        started = Event()
+
+        def endless_scan(input_path, cancel):
+            started.set()
+            while True:
+                cancel.check()
+                time.sleep(0.01)
+
+        with patch("tbxconverter.prescan.scan_file", endless_scan):
+            service.scan(self.input_path, lambda *args: None)
+            self.assertTrue(started.wait(10))
+            service.shutdown()
+
+        fn, (result, error) = dispatcher.queue.get(timeout=10)
+        self.assertIsInstance(error, ConversionCancelled)
+
+    def write_inputs(self, count, concepts=50):
+        paths = []
+        for i in range(count):
+            paths.append(self.path / f"input{i}.xml")
+            with open(paths[-1], "wb") as f:
+                generate_trados_file(f, CorpusOptions(concepts=concepts,
+                                                      seed=i))
+        return paths
+
+    def test_exports_several_files_in_worker_processes(self):
+        dispatcher = QueueDispatcher()
+        model = ConverterWindowModel(self.service(dispatcher, workers=2))
+        states = []
+        model.add_state_callback(states.append)
+        paths = self.write_inputs(3)
+        (self.path / "out").mkdir()
+
+        model.load_files(list(map(str, paths)))
+        self.assertEqual("Läser 3 filer...", states[-1].status)
+        dispatcher.run_until(lambda: "Öppnade" in states[-1].status)
+        self.assertRegex(states[-1].status,
+                         r"^Öppnade 3 filer: 150 termposter, \d+ termer, "
+                         r"export ca \d+ s$")
+
+        model.convert(str(self.path / "out" / "chosen.tbx"))
+        self.assertFalse(states[-1].load_enabled)
+        self.assertEqual("Exporterar 0 av 3 filer...", states[-1].status)
+        dispatcher.run_until(lambda: states[-1].load_enabled)
+
+        self.assertEqual(f"Exporterade 150 termer från 3 filer till "
+                         f"{self.path / 'out'}.", states[-1].status)
+        self.assertEqual([JobStatus.DONE] * 3,
+                         [job.status for job in states[-1].jobs])
+        self.assertTrue(any(s.status.startswith("Exporterar 1 av 3 filer")
+                            for s in states))
+        for path in paths:
+            expected = self.path / "expected.tbx"
+            convert_file(path, expected)
+            self.assertEqual(
+                expected.read_bytes(),
+                (self.path / "out" / (path.stem + ".tbx")).read_bytes())
+
+    def test_reports_failed_and_cancelled_jobs(self):
+        service = FakeService()
+        model = ConverterWindowModel(service)
+        states = []
+        alerts = []
+        model.add_state_callback(states.append)
+        model.add_alert_callback(alerts.append)
+        paths = self.write_inputs(3, concepts=1)
+        model.load_files(list(map(str, paths)))
+
+        model.convert(str(self.path / "chosen.tbx"))
+        first, second, third = service.jobs
+        self.assertEqual([self.path / f"input{i}.tbx" for i in range(3)],
+                         [job.output_path for job in service.jobs])
+        service.callback(JobState(first, JobStatus.RUNNING,
+                                  Progress(100, 1000, 10, 1.0)))
+        self.assertRegex(states[-1].status,
+                         r"^Exporterar 0 av 3 filer\.\.\. \d+% "
+                         r"\(10 termer, [\d.]+ MB/s, \d+ s kvar\)$")
+        service.callback(JobState(first, JobStatus.DONE, count=20))
+        service.callback(JobState(second, JobStatus.FAILED,
+                                  error=ValueError("broken")))
+        model.cancel()
+        service.callback(JobState(third, JobStatus.CANCELLED))
+
+        self.assertEqual(f"Exporterade 20 termer från 1 av 3 filer till "
+                         f"{self.path}, 1 misslyckades.", states[-1].status)
+        self.assertTrue(states[-1].export_enabled)
+        self.assertEqual(1, len(alerts))
+        self.assertIn("input1.xml", alerts[0])
+
+    def test_refuses_clashing_output_names(self):
+        service = FakeService()
+        model = ConverterWindowModel(service)
+        alerts = []
+        model.add_alert_callback(alerts.append)
+        model.load_files([str(self.input_path),
+                          str(self.path / "input.xml.gz")])
+
+        model.convert(str(self.path / "chosen.tbx"))
+
+        self.assertEqual([], service.jobs)
+        self.assertEqual(["Mer än en fil skulle exporteras till "
+                          "input.tbx."], alerts)
+
+    def test_splits_multiple_selection(self):
+        self.assertEqual(["a.xml"], split_selection("a.xml"))
+        self.assertEqual([str(Path("dir", name)) for name in "ab"],
+                         split_selection("dir\0a\0b\0"))
+        self.assertEqual(["a.xml", "b.xml"],
+                         split_selection(["a.xml", "b.xml"]))
+
+
+class ScanTest(TestCase):
+    def test_counts_and_caches_concepts(self):
+        with TemporaryDirectory() as tmp:
+            input_path = Path(tmp) / "input.xml"
+            with open(input_path, "wb") as f:
+                generate_trados_file(f, CorpusOptions(
+                    concepts=30, languages=3, synonyms=2, encoding="utf-16"))
+            with open(input_path, "rb") as f:
+                concepts = list(read_trados_file(f))
+
+            scan = scan_file(input_path)
+            uncached = scan_file(input_path, cache_limit=0)
+
+        self.assertEqual("UTF-16", scan.encoding)
+        self.assertEqual(30, scan.concepts)
+        self.assertEqual(3, len(scan.languages))
+        self.assertEqual(sum(len(lang.terms) for c in concepts
+                             for lang in c.languages), scan.terms)
+        self.assertEqual(concepts, scan.cached)
+        self.assertIsNone(uncached.cached)
+        self.assertGreater(uncached.estimated_seconds,
+                           scan.estimated_seconds * uncached.seconds
+                           / scan.seconds)
+
+
+class ProgressTest(TestCase):
+    def test_reports_throttled_progress(self):
+        reports = []
+        items = list(track_progress(range(5), lambda: 50, 100,
+                                    reports.append, interval=0))
+
+        self.assertEqual([0, 1, 2, 3, 4], items)
+        self.assertEqual([1, 2, 3, 4, 5, 5], [p.concepts for p in reports])
+        self.assertEqual(0.5, reports[-1].fraction)
+
+        reports.clear()
+        list(track_progress(range(5), lambda: 50, 100, reports.append,
+                            interval=3600))
+        self.assertEqual([5], [p.concepts for p in reports])
+
+    def test_estimates_remaining_time(self):
+        progress = Progress(25, 100, 10, 5.0)
+
+        self.assertEqual(5.0, progress.bytes_per_second)
+        self.assertEqual(15.0, progress.eta)
+        self.assertIsNone(Progress(0, 100, 0, 0.0).eta)
+
+    def test_stops_between_concepts_when_cancelled(self):
+        token = CancellationToken()
+        seen = []
+
+        with self.assertRaises(ConversionCancelled):
+            for item in track_progress(range(5), lambda: 0, 0,
+                                       cancel=token):
+                seen.append(item)
+                if item == 1:
+                    token.cancel()
+
+        self.assertEqual([0, 1], seen)
+
+    def test_cancelled_conversion_removes_output(self):
+        with TemporaryDirectory() as tmp:
+            input_path = Path(tmp) / "input.xml"
+            output_path = Path(tmp) / "output.tbx"
+            with open(input_path, "wb") as f:
+                generate_trados_file(f, CorpusOptions(concepts=10))
+            token = CancellationToken()
+            token.cancel()
+
+            with self.assertRaises(ConversionCancelled):
+                convert_file(input_path, output_path, cancel=token)
+            self.assertFalse(output_path.exists())
@@ -0,0 +1,106 @@
+from unittest import TestCase
+from unittest.mock import patch
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.merge import MergeConflictError, merge_files
+from tbxconverter.tbx_reader import read_tbx_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+def export(*concepts):
+    return ("<mtf>" + "".join(concepts) + "</mtf>").encode("utf-8")
+
+
+def concept(concept_id, term, modified="2020-01-01T00:00:00"):
+    return (f"<conceptGrp><concept>{concept_id}</concept>"
+            f"<transacGrp><transac type=\"modification\">x</transac>"
+            f"<date>{modified}</date></transacGrp>"
+            f"<languageGrp><language type=\"English\" lang=\"EN\"/>"
+            f"<termGrp><term>{term}</term></termGrp></languageGrp>"
+            f"</conceptGrp>")
+
+
+class MergeTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+
+    def write_inputs(self, *exports):
+        paths = []
+        for i, data in enumerate(exports):
+            paths.append(self.path / f"input{i}.xml")
+            paths[-1].write_bytes(data)
+        return paths
+
+    def merge(self, paths, **kwargs):
+        buf = BytesIO()
+        stats = merge_files(paths, buf, tmp_dir=self.path, **kwargs)
+        buf.seek(0)
+        entries = [(e.descrips[0].value, e.languages[0].terms[0].value)
+                   for e in read_tbx_file(buf)]
+        return stats, entries
+
+    def test_sorts_and_deduplicates(self):
+        paths = self.write_inputs(
+            export(concept(3, "a3"), concept(1, "a1")),
+            export(concept(2, "b2"), concept(3, "b3")))
+
+        for policy, expected in [("first", "a3"), ("last", "b3")]:
+            with self.subTest(policy):
+                stats, entries = self.merge(paths, policy=policy)
+
+                self.assertEqual([("1", "a1"), ("2", "b2"), ("3", expected)],
+                                 entries)
+                self.assertEqual(4, stats.concepts_read)
+                self.assertEqual(3, stats.concepts_written)
+                self.assertEqual(1, stats.conflicts)
+
+    def test_keeps_latest_modification(self):
+        paths = self.write_inputs(
+            export(concept(1, "new", "2021-06-01T00:00:00"),
+                   concept(2, "old", "2019-01-01T00:00:00")),
+            export(concept(1, "old", "2020-01-01T00:00:00"),
+                   concept(2, "new", "2019-01-01T00:00:01")))
+
+        _, entries = self.merge(paths, policy="latest")
+
+        self.assertEqual([("1", "new"), ("2", "new")], entries)
+
+    def test_fails_on_conflict(self):
+        paths = self.write_inputs(export(concept(1, "a")),
+                                  export(concept(1, "b")))
+
+        with self.assertRaises(MergeConflictError):
+            self.merge(paths, policy="error")
+
+    def test_prefixes_ids_per_source(self):
+        paths = self.write_inputs(
+            export(concept(1, "a1"), concept(2, "a2")),
+            export(concept(1, "b1")),
+            export(concept(1, "c1")))
+
+        stats, entries = self.merge(paths, id_prefixes=["a", "b", "a"])
+
+        self.assertEqual([("a-1", "a1"), ("b-1", "b1"), ("a-2", "a2")],
+                         entries)
+        self.assertEqual(1, stats.conflicts)
+
+    def test_spills_runs_within_memory_budget(self):
+        exports = []
+        for seed in range(3):
+            buf = BytesIO()
+            generate_trados_file(buf, CorpusOptions(concepts=300, seed=seed))
+            exports.append(buf.getvalue())
+        paths = self.write_inputs(*exports)
+
+        with patch("tbxconverter.merge.MAX_OPEN_RUNS", 4):
+            stats, entries = self.merge(paths, memory_budget=20000)
+
+        self.assertGreater(stats.runs, 4)
+        self.assertEqual(900, stats.concepts_read)
+        self.assertEqual([str(i) for i in range(1, 301)],
+                         [concept_id for concept_id, _ in entries])
+        self.assertEqual([], list(self.path.glob("tbxmerge-*")))
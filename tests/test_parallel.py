@@ -0,0 +1,137 @@
+from unittest import TestCase
+from io import BytesIO
+from importlib.resources import files
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.converter import convert_file, trados_to_tbx
+from tbxconverter.fragment_cache import FragmentCache
+from tbxconverter.parallel import convert_parallel
+from tbxconverter.splitting import scan_layout, iter_chunks
+from tbxconverter.splitting import iter_concept_ranges
+from tbxconverter.tbx_writer import write_tbx_file
+from tbxconverter.trados_reader import ConceptFilter, read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class ParallelConversionTest(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name)
+
+    def test_matches_serial_output_for_example_files(self):
+        for name in ["sdl-trados-example.xml", "sdl-trados-utf16.xml"]:
+            with self.subTest(name):
+                data = files(__package__).joinpath("data/" + name)
+                input_path = self.path / name
+                input_path.write_bytes(data.read_bytes())
+                self.assert_same_output(input_path, chunk_size=1)
+
+    def test_matches_serial_output_for_generated_corpora(self):
+        for encoding in ["utf-8", "utf-16"]:
+            with self.subTest(encoding):
+                input_path = self.path / f"{encoding}.xml"
+                with open(input_path, "wb") as f:
+                    generate_trados_file(f, CorpusOptions(
+                        concepts=300, languages=3, encoding=encoding))
+                self.assert_same_output(input_path, chunk_size=4096)
+
+    def test_convert_file_accepts_jobs(self):
+        input_path = self.path / "input.xml"
+        with open(input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(concepts=50))
+
+        convert_file(input_path, self.path / "serial.tbx")
+        count = convert_file(input_path, self.path / "parallel.tbx", jobs=2)
+
+        self.assertEqual(50, count)
+        self.assertEqual((self.path / "serial.tbx").read_bytes(),
+                         (self.path / "parallel.tbx").read_bytes())
+
+    def test_applies_concept_filter_in_every_mode(self):
+        input_path = self.path / "input.xml"
+        with open(input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(concepts=100))
+        concept_filter = ConceptFilter(languages=frozenset(["sv"]),
+                                       id_ranges=((20, 60),))
+
+        expected = BytesIO()
+        with open(input_path, "rb") as f:
+            write_tbx_file(expected, trados_to_tbx(read_trados_file(
+                f, concept_filter=concept_filter)))
+
+        with FragmentCache(self.path / "cache.db") as cache:
+            for options in [{}, {"jobs": 2}, {"cache": cache}]:
+                with self.subTest(list(options)):
+                    output_path = self.path / "output.tbx"
+                    count = convert_file(input_path, output_path,
+                                         concept_filter=concept_filter,
+                                         **options)
+                    self.assertEqual(41, count)
+                    self.assertEqual(expected.getvalue(),
+                                     output_path.read_bytes())
+
+    def test_rejects_unexpected_root_element(self):
+        input_path = self.path / "input.xml"
+        input_path.write_bytes(
+            b"<other><conceptGrp><concept>1</concept></conceptGrp></other>")
+
+        with self.assertRaises(ValueError):
+            convert_parallel(input_path, BytesIO(), jobs=2)
+
+    def test_handles_files_without_concepts(self):
+        input_path = self.path / "input.xml"
+        input_path.write_bytes(b"<mtf></mtf>")
+
+        self.assertEqual(0, convert_parallel(input_path, BytesIO(), jobs=2))
+
+    def assert_same_output(self, input_path, chunk_size):
+        serial_path = self.path / "serial.tbx"
+        serial_count = convert_file(input_path, serial_path)
+
+        buf = BytesIO()
+        count = convert_parallel(input_path, buf, jobs=2,
+                                 chunk_size=chunk_size)
+
+        self.assertEqual(serial_count, count)
+        self.assertEqual(serial_path.read_bytes(), buf.getvalue())
+
+
+class SplittingTest(TestCase):
+    def test_finds_concept_ranges(self):
+        data = (b"<mtf><conceptGrps/><conceptGrp>a</conceptGrp>\n"
+                b"<conceptGrp id='2'>b</conceptGrp></mtf>")
+
+        layout = scan_layout(data)
+        ranges = list(iter_concept_ranges(data, layout))
+
+        self.assertEqual(
+            [b"<conceptGrp>a</conceptGrp>",
+             b"<conceptGrp id='2'>b</conceptGrp>"],
+            [data[start:end] for start, end in ranges])
+        self.assertEqual(b"</mtf>", data[layout.body_end:])
+
+    def test_chunks_cover_whole_body(self):
+        data = b"<mtf>" + b"<conceptGrp>x</conceptGrp>" * 10 + b"</mtf>"
+
+        layout = scan_layout(data)
+        chunks = list(iter_chunks(data, layout, 50))
+
+        self.assertEqual(layout.body_start, chunks[0][0])
+        self.assertEqual(layout.body_end, chunks[-1][1])
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+        for start, end in chunks:
+            self.assertTrue(data[start:end].endswith(b"</conceptGrp>"))
+
+    def test_ignores_misaligned_utf16_matches(self):
+        concept = "<conceptGrp>x</conceptGrp>".encode("utf-16-le")
+
+        self.assertIsNone(scan_layout(b"\xff\xfe\0" + concept + b"\0"))
+
+        data = b"\xff\xfe" + concept
+        layout = scan_layout(data)
+        self.assertEqual("utf-16-le", layout.codec)
+        self.assertEqual((2, len(data)),
+                         (layout.body_start, layout.body_end))
@@ -0,0 +1,151 @@
+import gzip
+import threading
+from datetime import datetime
+from unittest import TestCase
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.converter import TermNoteCache, convert_file
+from tbxconverter.converter import convert_to_stream
+from tbxconverter.pipeline import Pipeline
+from tbxconverter.progress import CancellationToken, ConversionCancelled
+from tbxconverter.trados_reader import ConceptFilter
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class FailingStream:
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+
+    def write(self, data):
+        self.fail_after -= 1
+        if self.fail_after < 0:
+            raise OSError("disk full")
+        return len(data)
+
+
+class PipelineTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+        self.input_path = self.path / "input.xml"
+        with open(self.input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(concepts=300))
+
+    def convert(self, input_path, pipeline=None, **kwargs):
+        buf = BytesIO()
+        count = convert_to_stream(input_path, buf, pipeline=pipeline,
+                                  **kwargs)
+        return count, buf.getvalue()
+
+    def test_matches_serial_conversion(self):
+        gz_path = self.path / "input.xml.gz"
+        gz_path.write_bytes(gzip.compress(self.input_path.read_bytes()))
+        concept_filter = ConceptFilter(languages=frozenset(["SV"]),
+                                       id_ranges=((10, 99),))
+
+        for input_path, kwargs in [
+                (self.input_path, {}),
+                (gz_path, {}),
+                (self.input_path, {"output_format": "tsv"}),
+                (self.input_path, {"concept_filter": concept_filter}),
+                (self.input_path, {"note_cache": TermNoteCache()})]:
+            with self.subTest(input_path.name, **kwargs):
+                expected = self.convert(input_path, **kwargs)
+                pipeline = Pipeline(read_size=4096, queue_size=2,
+                                    write_size=1024)
+
+                self.assertEqual(expected,
+                                 self.convert(input_path, pipeline, **kwargs))
+                self.assertGreater(pipeline.read_queue.items, 10)
+                self.assertGreater(pipeline.write_queue.items, 10)
+                self.assertLessEqual(pipeline.read_queue.max_depth, 2)
+
+    def test_matches_serial_conversion_filtered_on_transactions(self):
+        # Concept transactions on both sides of the languages.
+        input_path = self.path / "transactions.xml"
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write("<mtf>")
+            for i in range(1, 301):
+                f.write(f"<conceptGrp><concept>{i}</concept>"
+                        "<transacGrp><transac type='origination'>s"
+                        "</transac><date>2010-01-01T00:00:00</date>"
+                        "</transacGrp>"
+                        "<languageGrp><language type='a' lang='A'/>"
+                        f"<termGrp><term>term {i}</term></termGrp>"
+                        "</languageGrp>")
+                if i % 3 == 0:
+                    f.write("<transacGrp><transac type='modification'>s"
+                            f"</transac><date>2021-01-0{i % 9 + 1}T00:00:00"
+                            "</date></transacGrp>")
+                f.write("</conceptGrp>")
+            f.write("</mtf>")
+        concept_filter = ConceptFilter(modified_since=datetime(2020, 1, 1))
+
+        expected = self.convert(input_path, concept_filter=concept_filter)
+        self.assertEqual(100, expected[0])
+        self.assertEqual(expected, self.convert(
+            input_path, Pipeline(read_size=4096, queue_size=2,
+                                 write_size=1024),
+            concept_filter=concept_filter))
+
+    def test_records_stalls_when_a_stage_is_slow(self):
+        class SlowStream(BytesIO):
+            def write(self, data):
+                threading.Event().wait(0.002)
+                return super().write(data)
+
+        pipeline = Pipeline(read_size=4096, queue_size=2, write_size=1024)
+        convert_to_stream(self.input_path, SlowStream(), pipeline=pipeline)
+
+        self.assertEqual(2, pipeline.write_queue.max_depth)
+        self.assertGreater(pipeline.write_queue.put_stall, 0)
+        self.assertIn("write", pipeline.format_report())
+
+    def test_raises_write_errors_and_stops(self):
+        threads = threading.active_count()
+        pipeline = Pipeline(read_size=4096, queue_size=2, write_size=1024)
+
+        with self.assertRaisesRegex(OSError, "disk full"):
+            convert_to_stream(self.input_path, FailingStream(3),
+                              pipeline=pipeline)
+        self.assertEqual(threads, threading.active_count())
+
+    def test_raises_parse_errors(self):
+        broken = self.path / "broken.xml"
+        broken.write_bytes(self.input_path.read_bytes()[:-1000])
+
+        with self.assertRaisesRegex(SyntaxError, "no element found"):
+            self.convert(broken, Pipeline(read_size=4096))
+
+    def test_cancels_between_concepts(self):
+        token = CancellationToken()
+
+        class CancellingStream(BytesIO):
+            def write(self, data):
+                token.cancel()
+                return super().write(data)
+
+        stream = CancellingStream()
+        with self.assertRaises(ConversionCancelled):
+            convert_to_stream(self.input_path, stream, cancel=token,
+                              pipeline=Pipeline(read_size=4096,
+                                                write_size=1024))
+        self.assertLess(len(stream.getvalue()),
+                        len(self.convert(self.input_path)[1]))
+
+    def test_cancelled_conversion_removes_output(self):
+        output_path = self.path / "output.tbx"
+        token = CancellationToken()
+        token.cancel()
+
+        with self.assertRaises(ConversionCancelled):
+            convert_file(self.input_path, output_path, cancel=token,
+                         pipeline=Pipeline())
+        self.assertFalse(output_path.exists())
+
+    def test_rejects_other_modes(self):
+        with self.assertRaises(ValueError):
+            self.convert(self.input_path, Pipeline(), jobs=2)
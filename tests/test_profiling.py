@@ -0,0 +1,104 @@
+from unittest import TestCase
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.converter import convert_file
+from tbxconverter.profiling import ConversionHooks, StageProfile
+from tbxconverter.profiling import StackSampler, STAGES
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class RecordingHooks(ConversionHooks):
+    def __init__(self):
+        self.stages = []
+        self.streams = []
+        self.entries = 0
+
+    def stage(self, name, items):
+        self.stages.append(name)
+        return items
+
+    def stream(self, name, stream):
+        self.streams.append(name)
+        return stream
+
+    def entry(self, entry):
+        self.entries += 1
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+        self.input_path = self.path / "input.xml"
+        with open(self.input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(concepts=100, synonyms=2))
+        self.expected_path = self.path / "expected.tbx"
+        convert_file(self.input_path, self.expected_path)
+
+    def test_calls_hooks_for_each_stage(self):
+        hooks = RecordingHooks()
+
+        count = self.convert(hooks=hooks)
+
+        self.assertEqual(100, count)
+        self.assertEqual(100, hooks.entries)
+        self.assertEqual(["parse", "convert", "serialize"], hooks.stages)
+        self.assertEqual(["read", "write"], hooks.streams)
+
+    def test_times_stages_and_counts_content(self):
+        profile = StageProfile()
+
+        self.convert(hooks=profile)
+        profile.finish()
+
+        self.assertEqual(STAGES, list(profile.seconds))
+        self.assertTrue(all(s > 0 for s in profile.seconds.values()))
+        self.assertLessEqual(sum(profile.seconds.values()), profile.total)
+        self.assertEqual(100, profile.counts["entries"])
+        output = self.expected_path.read_bytes()
+        self.assertEqual(output.count(b"<term>"), profile.counts["terms"])
+        self.assertEqual(output.count(b"<termNote ") + output.count(b"<note>"),
+                         profile.counts["notes"])
+        self.assertEqual(self.input_path.stat().st_size,
+                         profile.counts["bytes read"])
+        self.assertEqual(self.expected_path.stat().st_size,
+                         profile.counts["bytes written"])
+
+        report = profile.format_report()
+        for name in STAGES + ["other", "total", "100 entries"]:
+            self.assertIn(name, report)
+
+    def test_rejects_hooks_with_worker_processes(self):
+        with self.assertRaises(ValueError):
+            self.convert(hooks=ConversionHooks(), jobs=2)
+
+    def convert(self, **kwargs):
+        output_path = self.path / "output.tbx"
+        count = convert_file(self.input_path, output_path, **kwargs)
+        self.assertEqual(self.expected_path.read_bytes(),
+                         output_path.read_bytes())
+        return count
+
+
+class StackSamplerTest(TestCase):
+    def test_collects_collapsed_stacks(self):
+        def busy_function():
+            total = 0
+            for i in range(2_000_000):
+                total += i
+            return total
+
+        with StackSampler(interval=0.001) as sampler:
+            busy_function()
+
+        self.assertTrue(any("busy_function" in stack
+                            for stack in sampler.stacks))
+        buf = StringIO()
+        sampler.write_collapsed(buf)
+        for line in buf.getvalue().splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+            self.assertIn(";", stack)
@@ -1,19 +1,27 @@
+import pickle
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
 from unittest import TestCase
+from io import BytesIO
 from importlib.resources import files
 
 from tbxconverter.trados_reader import read_trados_file
 from tbxconverter.trados_reader import Concept, Language, Term, Transaction
-from tbxconverter.trados_reader import TransactionType
+from tbxconverter.trados_reader import TransactionType, InternPool
+from tbxconverter.trados_reader import NO_DESCRIPTIONS, ConceptFilter
+from benchmarks.generate import CorpusOptions, generate_trados_file
 
 ORIGINATION = TransactionType.ORIGINATION
 MODIFICATION = TransactionType.MODIFICATION
 
 
 class TradosReaderTest(TestCase):
+    backend = "iterparse"
+
     @classmethod
     def setUpClass(self):
         with open_resource_file("sdl-trados-example.xml") as f:
-            self.trados_data = list(read_trados_file(f))
+            self.trados_data = list(read_trados_file(f, self.backend))
 
     def test_reads_concept_list(self):
         self.assertEqual(3, len(self.trados_data))
@@ -286,17 +294,291 @@ class TradosReaderTest(TestCase):
         self.assertEqual(expected, self.trados_data)
 
 
+class ExpatTradosReaderTest(TradosReaderTest):
+    backend = "expat"
+
+
 class FileEncodingTest(TestCase):
+    backend = "iterparse"
+
     def test_supports_utf16(self):
         # Test with an UTF-16LE encoded input file without line breaks,
         # which is how the real files are encoded.
         with open_resource_file("sdl-trados-utf16.xml") as f:
-            trados_data = list(read_trados_file(f))
+            trados_data = list(read_trados_file(f, self.backend))
 
         self.assertEqual(trados_data[0].languages[0].terms[0].text,
                          "term 100 in English")
 
 
+class ExpatFileEncodingTest(FileEncodingTest):
+    backend = "expat"
+
+
+class ReaderBackendTest(TestCase):
+    def test_backends_agree_on_generated_corpus(self):
+        for encoding in ["utf-8", "utf-16"]:
+            with self.subTest(encoding):
+                buf = BytesIO()
+                generate_trados_file(buf, CorpusOptions(
+                    concepts=200, languages=3, synonyms=2,
+                    transaction_rate=0.7, description_rate=0.5,
+                    encoding=encoding))
+                self.assert_backends_agree(buf.getvalue())
+
+    def test_backends_agree_on_irregular_structure(self):
+        self.assert_backends_agree(b"""
+        <mtf>
+          <conceptGrp><concept></concept>
+            <languageGrp><language type="a" lang="A"/></languageGrp>
+          </conceptGrp>
+          <conceptGrp><concept>2</concept><concept>3</concept>
+            <languageGrp>
+              <termGrp><term>no language element</term></termGrp>
+            </languageGrp>
+            <languageGrp>
+              <language type="a" lang="A"/>
+              <language type="b" lang="B"/>
+              <termGrp><term/></termGrp>
+              <termGrp><term>first<b>child</b>tail</term><term>x</term>
+                <transacGrp><transac type="origination">s</transac>
+                  <date></date></transacGrp>
+                <transacGrp><transac type="modification">s2</transac>
+                  <date>2001-01-01T00:00:00</date>
+                  <date>2002-01-01T00:00:00</date></transacGrp>
+                <descripGrp><descrip type="k">v1</descrip>
+                  <descrip type="e"></descrip>
+                  <descrip type="k">v2</descrip></descripGrp>
+                <descrip type="ignored">outside descripGrp</descrip>
+              </termGrp>
+            </languageGrp>
+            <other><languageGrp><language type="c" lang="C"/>
+            </languageGrp></other>
+          </conceptGrp>
+          <nested><conceptGrp><concept>4</concept></conceptGrp></nested>
+        </mtf>
+        """.strip())
+
+    def test_rejects_unexpected_root_element(self):
+        for backend in ["iterparse", "expat"]:
+            with self.subTest(backend):
+                with self.assertRaises(ValueError):
+                    list(read_trados_file(BytesIO(b"<x></x>"), backend))
+
+    def test_reports_malformed_xml_as_parse_error(self):
+        for backend in ["iterparse", "expat"]:
+            with self.subTest(backend):
+                with self.assertRaises(ET.ParseError):
+                    list(read_trados_file(BytesIO(b"<mtf><x></mtf>"),
+                                          backend))
+
+    def test_rejects_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            read_trados_file(BytesIO(b"<mtf/>"), "unknown")
+
+    def assert_backends_agree(self, data):
+        expected = list(read_trados_file(BytesIO(data), "iterparse"))
+        actual = list(read_trados_file(BytesIO(data), "expat"))
+        self.assertEqual(expected, actual)
+        return actual
+
+
+class RecordTypeTest(TestCase):
+    def test_records_have_no_instance_dict(self):
+        transaction = Transaction(ORIGINATION, "source", "date")
+        term = Term("text", [transaction])
+        language = Language("name", "code", [term])
+        concept = Concept(1, [language], [])
+
+        for record in [transaction, term, language, concept]:
+            self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_terms_share_empty_descriptions(self):
+        for backend in ["iterparse", "expat"]:
+            with self.subTest(backend):
+                with open_resource_file("sdl-trados-example.xml") as f:
+                    terms = [term for c in read_trados_file(f, backend)
+                             for lang in c.languages for term in lang.terms]
+
+                empty = [t.descriptions for t in terms if not t.descriptions]
+                self.assertGreater(len(empty), 1)
+                for descriptions in empty:
+                    self.assertIs(NO_DESCRIPTIONS, descriptions)
+                    self.assertEqual({}, descriptions)
+
+    def test_records_can_be_pickled(self):
+        with open_resource_file("sdl-trados-example.xml") as f:
+            concepts = list(read_trados_file(f))
+
+        copied = pickle.loads(pickle.dumps(concepts))
+
+        self.assertEqual(concepts, copied)
+        self.assertIs(NO_DESCRIPTIONS,
+                      copied[0].languages[0].terms[0].descriptions)
+
+
+class InternPoolTest(TestCase):
+    def test_shares_repeated_values(self):
+        for backend in ["iterparse", "expat"]:
+            with self.subTest(backend):
+                pool = InternPool()
+                with open_resource_file("sdl-trados-example.xml") as f:
+                    concepts = list(read_trados_file(f, backend, pool))
+
+                transactions = [t for c in concepts for lang in c.languages
+                                for term in lang.terms
+                                for t in term.transactions]
+                sources = {id(t.source) for t in transactions
+                           if t.source == "local"}
+                codes = {id(lang.code) for c in concepts
+                         for lang in c.languages if lang.code == "SV-SE"}
+
+                self.assertEqual(1, len(sources))
+                self.assertEqual(1, len(codes))
+                self.assertGreater(pool.hits, 0)
+                self.assertGreater(pool.misses, 0)
+                self.assertGreater(pool.hit_rate, 0.5)
+
+    def test_stops_growing_when_full(self):
+        pool = InternPool(maxsize=2)
+        for value in ["a", "b", "c", "c", "a"]:
+            pool.intern(value)
+
+        self.assertEqual(2, len(pool))
+        self.assertEqual(1, pool.hits)
+        self.assertEqual(4, pool.misses)
+        self.assertEqual("c", pool.intern("c"))
+
+
+class ConceptFilterTest(TestCase):
+    def setUp(self):
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(
+            concepts=300, languages=3, synonyms=2))
+        self.data = buf.getvalue()
+        self.concepts = list(read_trados_file(BytesIO(self.data)))
+
+    def test_backends_skip_rejected_subtrees(self):
+        filters = [
+            ConceptFilter(languages=frozenset(["sv", "EN-GB"])),
+            ConceptFilter(id_ranges=((10, 20), (100, 100), (290, 400))),
+            ConceptFilter(modified_since=datetime(2015, 1, 1)),
+            ConceptFilter(languages=frozenset(["de-de"]),
+                          id_ranges=((1, 150),),
+                          modified_since=datetime(2010, 6, 1)),
+        ]
+        for concept_filter in filters:
+            expected = self.filter_afterwards(concept_filter)
+            self.assertGreater(len(expected), 0)
+            self.assertNotEqual(self.concepts, expected)
+            for backend in ["iterparse", "expat"]:
+                with self.subTest(backend=backend, filter=concept_filter):
+                    actual = list(read_trados_file(
+                        BytesIO(self.data), backend,
+                        concept_filter=concept_filter))
+                    self.assertEqual(expected, actual)
+
+    def test_drops_concepts_without_selected_languages(self):
+        concept_filter = ConceptFilter(languages=frozenset(["fi"]))
+
+        for backend in ["iterparse", "expat"]:
+            with self.subTest(backend):
+                self.assertEqual([], list(read_trados_file(
+                    BytesIO(self.data), backend,
+                    concept_filter=concept_filter)))
+
+    def test_keeps_concepts_without_transactions(self):
+        data = (b"<mtf><conceptGrp><concept>1</concept>"
+                b"<languageGrp><language type='a' lang='A'/>"
+                b"<termGrp><term>x</term></termGrp>"
+                b"</languageGrp></conceptGrp></mtf>")
+        concept_filter = ConceptFilter(modified_since=datetime(2020, 1, 1))
+
+        for backend in ["iterparse", "expat"]:
+            with self.subTest(backend):
+                concepts = list(read_trados_file(
+                    BytesIO(data), backend, concept_filter=concept_filter))
+                self.assertEqual([1], [c.id for c in concepts])
+
+    def test_filters_on_transactions_after_languages(self):
+        data = (b"<mtf>"
+                b"<conceptGrp><concept>1</concept>"
+                b"<languageGrp><language type='a' lang='A'/>"
+                b"<termGrp><term>x</term></termGrp></languageGrp>"
+                b"<transacGrp><transac type='modification'>s</transac>"
+                b"<date>2021-01-01T00:00:00</date></transacGrp>"
+                b"</conceptGrp>"
+                b"<conceptGrp><concept>2</concept>"
+                b"<transacGrp><transac type='origination'>s</transac>"
+                b"<date>2010-01-01T00:00:00</date></transacGrp>"
+                b"<languageGrp><language type='a' lang='A'/>"
+                b"<termGrp><term>y</term></termGrp></languageGrp>"
+                b"<transacGrp><transac type='modification'>s</transac>"
+                b"<date>2021-01-01T00:00:00</date></transacGrp>"
+                b"</conceptGrp>"
+                b"<conceptGrp><concept>3</concept>"
+                b"<languageGrp><language type='a' lang='A'/>"
+                b"<termGrp><term>z</term></termGrp></languageGrp>"
+                b"<transacGrp><transac type='modification'>s</transac>"
+                b"<date>2010-01-01T00:00:00</date></transacGrp>"
+                b"</conceptGrp></mtf>")
+        concept_filter = ConceptFilter(modified_since=datetime(2020, 1, 1))
+
+        results = {}
+        for backend in ["iterparse", "expat"]:
+            results[backend] = list(read_trados_file(
+                BytesIO(data), backend, concept_filter=concept_filter))
+        self.assertEqual(results["iterparse"], results["expat"])
+        self.assertEqual([1, 2], [c.id for c in results["expat"]])
+        self.assertEqual(["x", "y"], [c.languages[0].terms[0].text
+                                      for c in results["expat"]])
+
+    def test_merges_id_ranges(self):
+        concept_filter = ConceptFilter(
+            id_ranges=((5, 7), (1, 2), (3, 3), (6, 10), (20, 20)))
+
+        self.assertEqual(((1, 3), (5, 10), (20, 20)),
+                         concept_filter.id_ranges)
+        self.assertEqual([1, 2, 3, 5, 6, 7, 8, 9, 10, 20], [
+            i for i in range(25) if concept_filter.accepts_id(i)])
+
+    def test_matches_primary_language_subtag(self):
+        concept_filter = ConceptFilter(languages=frozenset(["EN", "sv-se"]))
+
+        self.assertTrue(concept_filter.accepts_language("en-GB"))
+        self.assertTrue(concept_filter.accepts_language("EN-US"))
+        self.assertTrue(concept_filter.accepts_language("SV-SE"))
+        self.assertFalse(concept_filter.accepts_language("SV-FI"))
+
+    def test_compares_dates_in_utc_by_default(self):
+        since = datetime(2020, 1, 1, 12, tzinfo=timezone(timedelta(hours=2)))
+        concept_filter = ConceptFilter(modified_since=since)
+
+        def transaction(date):
+            return [Transaction(TransactionType.MODIFICATION, "x", date)]
+
+        self.assertTrue(concept_filter.accepts_transactions(
+            transaction("2020-01-01T10:00:00")))
+        self.assertFalse(concept_filter.accepts_transactions(
+            transaction("2020-01-01T09:59:59")))
+        self.assertTrue(concept_filter.accepts_transactions(
+            transaction("2020-01-01T12:00:00+02:00")))
+
+    def filter_afterwards(self, concept_filter):
+        result = []
+        for concept in self.concepts:
+            if not (concept_filter.accepts_id(concept.id) and
+                    concept_filter.accepts_transactions(
+                        concept.transactions)):
+                continue
+            languages = [lang for lang in concept.languages
+                         if concept_filter.accepts_language(lang.code)]
+            if languages or concept_filter.languages is None:
+                result.append(Concept(concept.id, languages,
+                                      concept.transactions))
+        return result
+
+
 def open_resource_file(filename):
     path = "data/" + filename
     return files(__package__).joinpath(path).open("rb")
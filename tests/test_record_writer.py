@@ -0,0 +1,132 @@
+import csv
+import json
+from unittest import TestCase
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.converter import convert_file, trados_to_tbx
+from tbxconverter.record_writer import write_records, TSV_COLUMNS
+from tbxconverter.tbx_writer import TermEntry, Term, TermNote
+from tbxconverter.tbx_writer import LangSet, Descrip
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+ENTRY = TermEntry(
+    [Descrip("conceptId", "7")],
+    [LangSet("EN-GB", [
+        Term("tab\there", "line one\nline two",
+             [TermNote("createdBy", "super"),
+              TermNote("createdAt", "1000")]),
+        Term("räksmörgås", None, [])]),
+     LangSet("SV-SE", [])])
+
+
+def write(entries, output_format):
+    buf = BytesIO()
+    count = write_records(buf, entries, output_format)
+    return count, buf.getvalue()
+
+
+class RecordWriterTest(TestCase):
+    def test_writes_concept_per_line(self):
+        count, data = write([ENTRY, ENTRY], "jsonl")
+
+        lines = data.decode("utf-8").splitlines()
+        self.assertEqual(2, count)
+        self.assertEqual(2, len(lines))
+        self.assertEqual({
+            "conceptId": "7",
+            "languages": [
+                {"language": "EN-GB", "terms": [
+                    {"term": "tab\there", "note": "line one\nline two",
+                     "termNotes": [
+                         {"type": "createdBy", "value": "super"},
+                         {"type": "createdAt", "value": "1000"}]},
+                    {"term": "räksmörgås", "note": None}]},
+                {"language": "SV-SE", "terms": []}]},
+            json.loads(lines[0]))
+        self.assertIn("räksmörgås", lines[0])
+
+    def test_writes_term_per_line(self):
+        count, data = write([ENTRY], "jsonl-terms")
+
+        records = [json.loads(line) for line in data.splitlines()]
+        self.assertEqual(1, count)
+        self.assertEqual([
+            {"conceptId": "7", "language": "EN-GB", "term": "tab\there",
+             "note": "line one\nline two", "termNotes": [
+                 {"type": "createdBy", "value": "super"},
+                 {"type": "createdAt", "value": "1000"}]},
+            {"conceptId": "7", "language": "EN-GB", "term": "räksmörgås",
+             "note": None}], records)
+
+    def test_writes_tsv_with_escapes(self):
+        count, data = write([ENTRY], "tsv")
+
+        self.assertEqual(1, count)
+        self.assertEqual(
+            "\t".join(TSV_COLUMNS) + "\n"
+            "7\tEN-GB\ttab\\there\tline one\\nline two\tsuper\t1000\t\t\n"
+            "7\tEN-GB\träksmörgås\t\t\t\t\t\n",
+            data.decode("utf-8"))
+
+    def test_keeps_repeated_note_types(self):
+        entry = TermEntry([Descrip("conceptId", "8")], [LangSet("EN", [
+            Term("x", None, [TermNote("lastModifiedBy", "a"),
+                             TermNote("lastModifiedAt", "1"),
+                             TermNote("lastModifiedBy", "b"),
+                             TermNote("lastModifiedAt", "2")])])])
+
+        _, data = write([entry], "jsonl-terms")
+        self.assertEqual([
+            {"type": "lastModifiedBy", "value": "a"},
+            {"type": "lastModifiedAt", "value": "1"},
+            {"type": "lastModifiedBy", "value": "b"},
+            {"type": "lastModifiedAt", "value": "2"}],
+            json.loads(data)["termNotes"])
+
+        _, data = write([entry], "tsv")
+        self.assertEqual("8\tEN\tx\t\t\t\ta\\nb\t1\\n2\n",
+                         data.decode("utf-8").splitlines(True)[1])
+
+    def test_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            write([], "xlsx")
+
+    def test_matches_tbx_content_for_generated_corpus(self):
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(concepts=100, languages=3))
+        entries = list(trados_to_tbx(read_trados_file(
+            BytesIO(buf.getvalue()))))
+
+        _, data = write(entries, "tsv")
+        rows = list(csv.reader(StringIO(data.decode("utf-8")),
+                               delimiter="\t", quoting=csv.QUOTE_NONE))
+
+        self.assertEqual(TSV_COLUMNS, rows[0])
+        self.assertEqual([(e.descrips[0].value, lang.iso_code, term.value)
+                          for e in entries
+                          for lang in e.languages
+                          for term in lang.terms],
+                         [tuple(row[:3]) for row in rows[1:]])
+
+    def test_parallel_conversion_matches_serial(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp)
+            with open(path / "input.xml", "wb") as f:
+                generate_trados_file(f, CorpusOptions(concepts=50))
+
+            for output_format in ["jsonl", "jsonl-terms", "tsv"]:
+                with self.subTest(output_format):
+                    outputs = []
+                    for jobs in [1, 2]:
+                        output_path = path / f"{jobs}.out"
+                        count = convert_file(path / "input.xml", output_path,
+                                             jobs=jobs,
+                                             output_format=output_format)
+                        self.assertEqual(50, count)
+                        outputs.append(output_path.read_bytes())
+
+                    self.assertEqual(outputs[0], outputs[1])
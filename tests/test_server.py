@@ -0,0 +1,198 @@
+import bz2
+import gzip
+import json
+import socket
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+from http.client import HTTPConnection
+from importlib.resources import files
+from io import BytesIO
+
+from tbxconverter.converter import trados_to_tbx
+from tbxconverter.server import ConversionServer, ServerLimits
+from tbxconverter.tbx_writer import write_tbx_file
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+def convert_serially(data):
+    buf = BytesIO()
+    write_tbx_file(buf, trados_to_tbx(read_trados_file(BytesIO(data))))
+    return buf.getvalue()
+
+
+class ConversionServerTest(TestCase):
+    def setUp(self):
+        self.example = files(__package__).joinpath(
+            "data/sdl-trados-example.xml").read_bytes()
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(concepts=500))
+        self.corpus = buf.getvalue()
+
+    def start_server(self, **limits):
+        server = ConversionServer(("127.0.0.1", 0), ServerLimits(**limits))
+        thread = threading.Thread(target=server.serve_forever,
+                                  args=(0.05,))
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+        self.addCleanup(stop)
+        self.server = server
+        return server
+
+    def request(self, method, path, body=None, headers={}, **kwargs):
+        conn = HTTPConnection(*self.server.server_address[:2], timeout=10)
+        self.addCleanup(conn.close)
+        conn.request(method, path, body, headers, **kwargs)
+        response = conn.getresponse()
+        return response, response.read()
+
+    def test_converts_request_body(self):
+        self.start_server()
+
+        response, body = self.request("POST", "/convert", self.example)
+
+        self.assertEqual(200, response.status)
+        self.assertEqual(convert_serially(self.example), body)
+        self.assertIsNotNone(response.getheader("Content-Length"))
+
+    def test_streams_chunked_request_and_response(self):
+        self.start_server()
+        chunks = (self.corpus[i:i + 1000]
+                  for i in range(0, len(self.corpus), 1000))
+
+        response, body = self.request("POST", "/convert", chunks,
+                                      encode_chunked=True)
+
+        self.assertEqual(200, response.status)
+        self.assertEqual("chunked", response.getheader("Transfer-Encoding"))
+        self.assertEqual(convert_serially(self.corpus), body)
+
+    def test_accepts_and_sends_compressed_bodies(self):
+        self.start_server()
+
+        response, body = self.request(
+            "POST", "/convert", gzip.compress(self.corpus),
+            {"Accept-Encoding": "gzip"})
+
+        self.assertEqual(200, response.status)
+        self.assertEqual("gzip", response.getheader("Content-Encoding"))
+        self.assertEqual(convert_serially(self.corpus),
+                         gzip.decompress(body))
+
+    def test_respects_accept_encoding_quality(self):
+        self.start_server()
+
+        for accept_encoding, expected in [
+                ("gzip;q=0", None), ("deflate, gzip; q=0.5", "gzip"),
+                ("*;q=0", None), ("br, *", "gzip"), ("gzip;q=0, *", None)]:
+            with self.subTest(accept_encoding):
+                response, _ = self.request(
+                    "POST", "/convert", self.example,
+                    {"Accept-Encoding": accept_encoding})
+                self.assertEqual(200, response.status)
+                self.assertEqual(expected,
+                                 response.getheader("Content-Encoding"))
+
+    def test_closes_idle_connections(self):
+        server = self.start_server(workers=2, idle_timeout=0.2)
+        address = server.server_address[:2]
+        idle = []
+        for _ in range(2):
+            conn = HTTPConnection(*address, timeout=10)
+            self.addCleanup(conn.close)
+            conn.request("GET", "/metrics")
+            conn.getresponse().read()
+            idle.append(conn)
+
+        conn = HTTPConnection(*address, timeout=5)
+        self.addCleanup(conn.close)
+        conn.request("GET", "/metrics")
+        self.assertEqual(200, conn.getresponse().status)
+
+    def test_rejects_invalid_input(self):
+        self.start_server()
+
+        response, body = self.request("POST", "/convert",
+                                      b"<mtf><conceptGrp></mtf>")
+
+        self.assertEqual(400, response.status)
+        self.assertIn(b"Invalid input", body)
+
+        compressed = gzip.compress(self.example)
+        for data in [b"\xfd7zXZ\x00broken",
+                     compressed[:20] + b"broken" + compressed[26:],
+                     bz2.compress(self.example)[:20] + b"broken",
+                     compressed[:-100]]:
+            with self.subTest(data[:4]):
+                response, body = self.request("POST", "/convert", data)
+
+                self.assertEqual(400, response.status)
+                self.assertIn(b"Invalid input", body)
+
+    def test_reports_other_errors_as_server_errors(self):
+        self.start_server()
+
+        with patch("tbxconverter.server.write_tbx_file",
+                   side_effect=OSError("disk full")), \
+                patch.object(self.server, "handle_error"):
+            response, body = self.request(
+                "POST", "/convert", gzip.compress(self.example))
+
+        self.assertEqual(500, response.status)
+        self.assertNotIn(b"Invalid input", body)
+
+    def test_enforces_size_limit(self):
+        self.start_server(max_request_bytes=1000)
+
+        response, _ = self.request("POST", "/convert", self.example)
+        self.assertEqual(413, response.status)
+
+        response, _ = self.request("POST", "/convert", iter([self.example]),
+                                   encode_chunked=True)
+        self.assertEqual(413, response.status)
+
+    def test_enforces_time_limit(self):
+        server = self.start_server(timeout=0.2)
+
+        for data in [b"<mtf>", gzip.compress(self.example)[:100]]:
+            with self.subTest(data[:4]), \
+                    socket.create_connection(server.server_address[:2]) as s:
+                s.sendall(b"POST /convert HTTP/1.1\r\n"
+                          b"Content-Length: 100000\r\n\r\n" + data)
+                s.settimeout(10)
+                response = s.recv(1000)
+
+            self.assertTrue(response.startswith(b"HTTP/1.1 408 "))
+
+    def test_limits_concurrent_conversions(self):
+        server = self.start_server(max_concurrent=1)
+        server.slots.acquire()
+        try:
+            response, _ = self.request("POST", "/convert", self.example)
+        finally:
+            server.slots.release()
+
+        self.assertEqual(503, response.status)
+
+    def test_reports_metrics(self):
+        self.start_server()
+        self.request("POST", "/convert", self.example)
+        self.request("POST", "/convert", b"<broken")
+
+        response, body = self.request("GET", "/metrics")
+        metrics = json.loads(body)
+
+        self.assertEqual(200, response.status)
+        self.assertEqual(2, metrics["requests"])
+        self.assertEqual({"200": 1, "400": 1}, metrics["statuses"])
+        self.assertEqual(3, metrics["concepts"])
+        self.assertEqual(len(self.example) + 7, metrics["bytes_in"])
+        self.assertGreater(metrics["concepts_per_second"], 0)
+        self.assertLessEqual(metrics["latency_seconds"]["p50"],
+                             metrics["latency_seconds"]["max"])
@@ -0,0 +1,122 @@
+import gzip
+import xml.etree.ElementTree as ET
+from contextlib import nullcontext
+from unittest import TestCase
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tbxconverter.converter import convert_file
+from tbxconverter.sharding import Shard, convert_file_sharded, shard_path
+from tbxconverter.tbx_writer import write_tbx_shards
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+def entries(data):
+    result = []
+    for entry in ET.fromstring(data).iter("termEntry"):
+        entry.tail = None
+        result.append(ET.tostring(entry))
+    return result
+
+
+class ShardedWriterTest(TestCase):
+    def write(self, fragments, **limits):
+        shards = []
+
+        def open_shard(number):
+            self.assertEqual(len(shards) + 1, number)
+            shards.append(BytesIO())
+            return nullcontext(shards[-1])
+
+        counts = write_tbx_shards(open_shard, fragments, **limits)
+        return counts, [shard.getvalue() for shard in shards]
+
+    def test_rolls_over_by_entry_count(self):
+        fragments = [b"<termEntry id=\"%d\"/>" % i for i in range(10)]
+
+        counts, shards = self.write(fragments, max_entries=3)
+
+        self.assertEqual([3, 3, 3, 1], counts)
+        self.assertEqual([len(entries(s)) for s in shards], counts)
+
+    def test_rolls_over_by_size(self):
+        fragments = [b"<termEntry>%s</termEntry>" % (b"x" * 100)] * 20
+        fragments.insert(5, b"<termEntry>%s</termEntry>" % (b"y" * 2000))
+
+        counts, shards = self.write(fragments, max_bytes=1000)
+
+        self.assertEqual(21, sum(counts))
+        for count, shard in zip(counts, shards):
+            self.assertTrue(len(shard) <= 1000 or count == 1)
+            self.assertEqual(count, len(entries(shard)))
+
+    def test_writes_single_empty_shard(self):
+        counts, shards = self.write([], max_entries=5)
+
+        self.assertEqual([0], counts)
+        self.assertEqual([], entries(shards[0]))
+
+    def test_requires_a_limit(self):
+        with self.assertRaises(ValueError):
+            self.write([b"<termEntry/>"])
+
+
+class ShardedConversionTest(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name)
+        self.input_path = self.path / "input.xml"
+        with open(self.input_path, "wb") as f:
+            generate_trados_file(f, CorpusOptions(concepts=120))
+        convert_file(self.input_path, self.path / "whole.tbx")
+        self.expected = entries((self.path / "whole.tbx").read_bytes())
+
+    def test_names_shards_predictably(self):
+        self.assertEqual(Path("out-0001.tbx"), shard_path(Path("out.tbx"), 1))
+        self.assertEqual(Path("d/out-0012.tbx.gz"),
+                         shard_path(Path("d/out.tbx.gz"), 12))
+
+    def test_matches_unsharded_output(self):
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                output_path = self.path / f"jobs{jobs}.tbx.gz"
+
+                shards = convert_file_sharded(self.input_path, output_path,
+                                              max_entries=50, jobs=jobs)
+
+                self.assertEqual(
+                    [Shard(shard_path(output_path, 1), 50),
+                     Shard(shard_path(output_path, 2), 50),
+                     Shard(shard_path(output_path, 3), 20)], shards)
+                actual = [entry for shard in shards
+                          for entry in entries(gzip.decompress(
+                              shard.path.read_bytes()))]
+                self.assertEqual(self.expected, actual)
+
+    def test_parallel_and_serial_shards_are_identical(self):
+        serial = convert_file_sharded(self.input_path,
+                                      self.path / "serial.tbx",
+                                      max_bytes=20000)
+        parallel = convert_file_sharded(self.input_path,
+                                        self.path / "parallel.tbx",
+                                        max_bytes=20000, jobs=2)
+
+        self.assertGreater(len(serial), 2)
+        self.assertEqual([s.count for s in serial],
+                         [s.count for s in parallel])
+        for a, b in zip(serial, parallel):
+            self.assertEqual(a.path.read_bytes(), b.path.read_bytes())
+
+    def test_removes_stale_shards(self):
+        output_path = self.path / "out.tbx"
+        convert_file_sharded(self.input_path, output_path, max_entries=10)
+
+        shards = convert_file_sharded(self.input_path, output_path,
+                                      max_entries=100)
+
+        self.assertEqual(2, len(shards))
+        self.assertEqual([output_path.with_name(n) for n in
+                          ["out-0001.tbx", "out-0002.tbx"]],
+                         sorted(self.path.glob("out-*.tbx")))
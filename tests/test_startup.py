@@ -0,0 +1,12 @@
+from unittest import TestCase
+
+from benchmarks.startup import BUDGETS, check_startup, measure_startup
+
+
+class StartupTest(TestCase):
+    def test_entry_points_import_within_budget(self):
+        for module in BUDGETS:
+            with self.subTest(module):
+                result = measure_startup(module, repeat=3)
+
+                self.assertEqual([], check_startup(module, result))
@@ -0,0 +1,63 @@
+from unittest import TestCase
+from io import BytesIO
+from importlib.resources import files
+
+from tbxconverter.converter import trados_to_tbx
+from tbxconverter.tbx_reader import read_tbx_file
+from tbxconverter.tbx_writer import TermEntry, Term, TermNote
+from tbxconverter.tbx_writer import LangSet, Descrip, write_tbx_file
+from tbxconverter.trados_reader import read_trados_file
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+def round_trip(entries):
+    buf = BytesIO()
+    write_tbx_file(buf, entries)
+    buf.seek(0)
+    return list(read_tbx_file(buf))
+
+
+class TbxReaderTest(TestCase):
+    def test_reads_written_entries(self):
+        entries = [
+            TermEntry([Descrip("conceptId", "1")], [
+                LangSet("EN-GB", [
+                    Term("a < b", "note\nwith lines",
+                         [TermNote("createdBy", "super"),
+                          TermNote("createdAt", "1000")]),
+                    Term("räksmörgås", None, [])]),
+                LangSet("SV-SE", [])]),
+            TermEntry([], []),
+        ]
+
+        self.assertEqual(entries, round_trip(entries))
+
+    def test_reads_converted_files(self):
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(concepts=200, languages=3,
+                                                synonyms=2))
+        sources = [buf.getvalue(), files(__package__).joinpath(
+            "data/sdl-trados-example.xml").read_bytes()]
+
+        for data in sources:
+            entries = list(trados_to_tbx(read_trados_file(BytesIO(data))))
+            self.assertEqual(entries, round_trip(entries))
+
+    def test_discards_read_entries(self):
+        entries = [TermEntry([Descrip("conceptId", str(i))], [])
+                   for i in range(100)]
+        buf = BytesIO()
+        write_tbx_file(buf, entries)
+        buf.seek(0)
+
+        reader = read_tbx_file(buf)
+        next(reader)
+        frame = reader.gi_frame
+        body = frame.f_locals["parents"][-1]
+
+        for _ in reader:
+            self.assertLessEqual(len(body), 1)
+
+    def test_rejects_other_documents(self):
+        with self.assertRaises(ValueError):
+            list(read_tbx_file(BytesIO(b"<mtf></mtf>")))
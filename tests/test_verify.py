@@ -0,0 +1,65 @@
+from unittest import TestCase
+from io import BytesIO
+
+from tbxconverter.converter import trados_to_tbx
+from tbxconverter.tbx_writer import TermNote, write_tbx_file
+from tbxconverter.trados_reader import read_trados_file
+from tbxconverter.verify import verify_conversion
+from benchmarks.generate import CorpusOptions, generate_trados_file
+
+
+class VerifyTest(TestCase):
+    def setUp(self):
+        buf = BytesIO()
+        generate_trados_file(buf, CorpusOptions(concepts=50))
+        self.source = buf.getvalue()
+        self.entries = list(trados_to_tbx(read_trados_file(
+            BytesIO(self.source))))
+
+    def verify(self, entries, **kwargs):
+        tbx = BytesIO()
+        write_tbx_file(tbx, entries)
+        tbx.seek(0)
+        return verify_conversion(BytesIO(self.source), tbx, **kwargs)
+
+    def test_accepts_matching_output(self):
+        result = self.verify(self.entries)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(50, result.concepts)
+        self.assertEqual(50, result.entries)
+
+    def test_reports_changed_terms_and_timestamps(self):
+        entry = self.entries[3]
+        term = entry.languages[0].terms[0]
+        term.term_notes[:] = [TermNote(n.type, "0")
+                              for n in term.term_notes]
+        entry.languages[1].terms.clear()
+
+        result = self.verify(self.entries)
+
+        self.assertFalse(result.ok)
+        self.assertEqual([4, 4], [m.entry for m in result.mismatches])
+        self.assertIn("term notes", result.mismatches[0].message)
+        self.assertIn(" terms: expected", result.mismatches[1].message)
+        self.assertEqual(entry.descrips[0].value,
+                         result.mismatches[0].concept_id)
+
+    def test_reports_missing_entries(self):
+        result = self.verify(self.entries[:-2])
+
+        self.assertEqual(48, result.entries)
+        self.assertEqual(["missing from the TBX"] * 2,
+                         [m.message for m in result.mismatches])
+
+    def test_limits_reported_mismatches(self):
+        result = self.verify(self.entries[1:], max_reported=5)
+
+        self.assertEqual(5, len(result.mismatches))
+        self.assertGreater(result.mismatch_count, 5)
+
+    def test_applies_id_prefix(self):
+        self.assertFalse(self.verify(self.entries, id_prefix="x").ok)
+        prefixed = list(trados_to_tbx(read_trados_file(
+            BytesIO(self.source)), "x"))
+        self.assertTrue(self.verify(prefixed, id_prefix="x").ok)
@@ -2,10 +2,14 @@ import re
 import xml.etree.ElementTree as ET
 from unittest import TestCase
 from io import BytesIO
+from importlib.resources import files
 
 from tbxconverter.tbx_writer import TermEntry, Term, TermNote
 from tbxconverter.tbx_writer import LangSet, Descrip
 from tbxconverter.tbx_writer import write_tbx_file
+from tbxconverter.trados_reader import read_trados_file
+from tbxconverter.converter import trados_to_tbx
+from benchmarks.generate import CorpusOptions, generate_trados_file
 
 
 class TbxWriterTest(TestCase):
@@ -138,6 +142,16 @@ class TbxWriterTest(TestCase):
             if is_start and not is_end:
                 expected_indent += indent_step
 
+    def test_records_have_no_instance_dict(self):
+        note = TermNote("type", "value")
+        term = Term("term", None, [note])
+        entry = TermEntry([Descrip("type", "value")],
+                          [LangSet("code", [term])])
+
+        for record in [note, term, entry, entry.descrips[0],
+                       entry.languages[0]]:
+            self.assertFalse(hasattr(record, "__dict__"))
+
     def assert_xml_equal(self, expected, actual, *, indent=True, strip=False):
         def normalize(data):
             data = ET.canonicalize(data, strip_text=strip)
@@ -147,3 +161,62 @@ class TbxWriterTest(TestCase):
             return ET.tostring(tree, encoding="unicode")
 
         self.assertEqual(normalize(expected), normalize(actual))
+
+
+class WriterEngineTest(TestCase):
+    maxDiff = None
+
+    def test_engines_write_identical_bytes(self):
+        terms = [
+            TermEntry([], []),
+            TermEntry([Descrip("conceptId", "")], [LangSet("code1", [])]),
+            TermEntry(
+                [Descrip("a\"b<c>&\r\n\td", "x & y < z > w \"q\"\r\n\t")],
+                [
+                    LangSet("sv-SE\"", [
+                        Term("räksmörgås & ö", "kommentar\nrad två", [
+                            TermNote("createdBy", "Örjan"),
+                            TermNote("empty", ""),
+                        ]),
+                        Term("", "", []),
+                        Term("  ", None, [TermNote("t", "\U0001F600")]),
+                    ]),
+                ],
+            ),
+        ]
+
+        for indent in ["  ", "\t", "", "    "]:
+            with self.subTest(indent=indent):
+                self.assertEqual(
+                    self.write(terms, indent=indent, engine="etree"),
+                    self.write(terms, indent=indent, engine="template"))
+
+    def test_engines_write_identical_bytes_for_generated_corpus(self):
+        for encoding in ["utf-8", "utf-16"]:
+            with self.subTest(encoding):
+                buf = BytesIO()
+                generate_trados_file(buf, CorpusOptions(
+                    concepts=200, languages=4, synonyms=2,
+                    description_rate=0.5, encoding=encoding))
+                buf.seek(0)
+                terms = list(trados_to_tbx(read_trados_file(buf)))
+
+                self.assertEqual(self.write(terms, engine="etree"),
+                                 self.write(terms, engine="template"))
+
+    def test_engines_write_identical_bytes_for_example_file(self):
+        with files(__package__).joinpath(
+                "data/sdl-trados-example.xml").open("rb") as f:
+            terms = list(trados_to_tbx(read_trados_file(f), "prefix"))
+
+        self.assertEqual(self.write(terms, engine="etree"),
+                         self.write(terms, engine="template"))
+
+    def test_rejects_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            self.write([], engine="unknown")
+
+    def write(self, terms, **kwargs):
+        buf = BytesIO()
+        write_tbx_file(buf, terms, **kwargs)
+        return buf.getvalue()